@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -156,6 +157,51 @@ SIMPLE_JWT = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Local memory by default; set DJANGO_CACHE_DIR to share the cache between workers without extra services
+if os.getenv("DJANGO_CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("DJANGO_CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "energoboard",
+        }
+    }
+
+# Upper bound for cached analytics responses; entries are invalidated by data versions anyway
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "3600"))
+
+# How often (seconds) a worker re-checks the shared tariff version stamp in the cache
+TARIFF_INDEX_CHECK_INTERVAL = float(os.getenv("TARIFF_INDEX_CHECK_INTERVAL", "1.0"))
+
+# "deferred" stores readings posted to /api/readings/ with a queued charge job that runchargeworker applies
+CHARGE_PROCESSING = os.getenv("CHARGE_PROCESSING", "sync")
+
+# Valid rows stored per transaction by /api/readings/import/ and importreadings
+READINGS_IMPORT_CHUNK_SIZE = int(os.getenv("READINGS_IMPORT_CHUNK_SIZE", "5000"))
+
+# Per-request timing (core.middleware.RequestTimingMiddleware): Server-Timing header, JSON log line per view,
+# and logging of queries slower than SLOW_QUERY_MS together with their call site (0 disables)
+REQUEST_TIMING_HEADER = os.getenv("REQUEST_TIMING_HEADER", "1") == "1"
+REQUEST_TIMING_LOG = os.getenv("REQUEST_TIMING_LOG", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.timing": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -22,6 +22,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from core.views import (
     AnalyticsViewSet,
+    AnomalyViewSet,
     LoginView,
     MeterViewSet,
     MonthlyChargeViewSet,
@@ -30,6 +31,7 @@ from core.views import (
     ReadingViewSet,
     RegistrationView,
     TariffViewSet,
+    async_analytics,
 )
 
 router = routers.DefaultRouter()
@@ -39,6 +41,7 @@ router.register(r"readings", ReadingViewSet, basename="reading")
 router.register(r"tariffs", TariffViewSet, basename="tariff")
 router.register(r"monthly-charges", MonthlyChargeViewSet, basename="monthlycharge")
 router.register(r"payments", PaymentViewSet, basename="payment")
+router.register(r"anomalies", AnomalyViewSet, basename="anomaly")
 router.register(r"analytics", AnalyticsViewSet, basename="analytics")
 
 urlpatterns = [
@@ -46,5 +49,6 @@ urlpatterns = [
     path("api/auth/register/", RegistrationView.as_view(), name="register"),
     path("api/auth/login/", LoginView.as_view(), name="token_obtain_pair"),
     path("api/auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/analytics/async/", async_analytics, name="analytics-async"),
     path("api/", include(router.urls)),
 ]
@@ -0,0 +1,159 @@
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable, Optional
+
+from django.db.models import F, Q, QuerySet, Sum
+
+from .models import Meter, MonthlyCharge, OwnerMonthlyRollup, OwnerPaymentRollup, Payment, Property
+from .services import summarize_charges
+
+
+@dataclass
+class AnalyticsQuery:
+    start_year: int
+    start_month: int
+    end_year: int
+    end_month: int
+    resource_type: Optional[str] = None
+    selected_ids: list[int] = field(default_factory=list)
+
+    @classmethod
+    def from_params(cls, params) -> "AnalyticsQuery":
+        today = date.today()
+        selected_ids = []
+        if params.get("properties"):
+            selected_ids = [int(p) for p in params["properties"].split(",") if p]
+        elif params.get("property"):
+            selected_ids = [int(params["property"])]
+        return cls(
+            start_year=int(params.get("start_year", today.year - 1)),
+            start_month=int(params.get("start_month", 1)),
+            end_year=int(params.get("end_year", today.year)),
+            end_month=int(params.get("end_month", 12)),
+            resource_type=params.get("resource_type") or None,
+            selected_ids=selected_ids,
+        )
+
+    @property
+    def period(self) -> Q:
+        return (Q(year__gt=self.start_year) | Q(year=self.start_year, month__gte=self.start_month)) & (
+            Q(year__lt=self.end_year) | Q(year=self.end_year, month__lte=self.end_month)
+        )
+
+    def properties(self, owner) -> QuerySet:
+        props = Property.objects.filter(owner=owner)
+        if self.selected_ids:
+            props = props.filter(id__in=self.selected_ids)
+        return props
+
+
+def analytics_sources(owner, query: AnalyticsQuery, props: list[Property]) -> dict[str, Optional[QuerySet]]:
+    """Independent querysets the analytics response is built from.
+
+    ``sections`` feeds ``summarize_charges``; ``by_property`` is ``None`` for a
+    property selection, whose totals come from the sections rows instead.
+    """
+
+    charges = MonthlyCharge.objects.filter(property__in=props).filter(query.period)
+    if query.resource_type:
+        charges = charges.filter(resource_type=query.resource_type)
+
+    if query.selected_ids:
+        sections = (
+            charges.values("year", "month", "resource_type", "property_id")
+            .annotate(total_consumption=Sum("consumption"), total_amount=Sum("amount"))
+            .order_by("year", "month", "property_id", "resource_type")
+        )
+        by_property = None
+        payments = Payment.objects.filter(property__in=props).values("year", "month").annotate(total=Sum("amount"))
+    else:
+        # all properties: monthly sections come from the owner rollup, a few rows per month
+        rollups = OwnerMonthlyRollup.objects.filter(owner=owner).filter(query.period)
+        if query.resource_type:
+            rollups = rollups.filter(resource_type=query.resource_type)
+        sections = rollups.values(
+            "year",
+            "month",
+            "resource_type",
+            "properties_count",
+            total_consumption=F("consumption"),
+            total_amount=F("amount"),
+        ).order_by("year", "month", "resource_type")
+        by_property = (
+            charges.values("property__id", "property__name")
+            .annotate(total_amount=Sum("amount"), total_consumption=Sum("consumption"))
+            .order_by("property__id")
+        )
+        payments = OwnerPaymentRollup.objects.filter(owner=owner).values("year", "month", total=F("amount"))
+
+    return {
+        "sections": sections,
+        "by_property": by_property,
+        "payments": payments,
+        "units": Meter.objects.filter(property__in=props).values("resource_type", "unit").distinct(),
+    }
+
+
+def analytics_payload(
+    query: AnalyticsQuery,
+    props: list[Property],
+    sections: Iterable[dict],
+    by_property: Optional[list[dict]],
+    payments: list[dict],
+    units: Iterable[dict],
+    forecasts: dict,
+) -> dict:
+    """The analytics response from the fetched results of ``analytics_sources`` and ``forecast_properties``."""
+
+    summary = summarize_charges(sections, {p.id: p.name for p in props})
+    if by_property is None:
+        by_property = summary["by_property"]
+    monthly = summary["monthly"]
+
+    totals_amount = sum(item["total_amount"] for item in by_property)
+    totals_consumption = sum(item["total_consumption"] for item in by_property)
+    peak_month_by_amount = max(monthly, key=lambda m: m["total_amount"], default=None)
+
+    days_count = len(monthly) * 30 or 1
+    average_daily_amount = totals_amount / days_count
+
+    forecast_value = float(sum(forecasts.values()) / len(props))
+    units_map = {item["resource_type"]: item["unit"] for item in units}
+
+    return {
+        "period": {
+            "start_year": query.start_year,
+            "start_month": query.start_month,
+            "end_year": query.end_year,
+            "end_month": query.end_month,
+        },
+        "monthly": monthly,
+        "monthly_by_resource": [
+            {
+                "month": month,
+                "resource_type": resource,
+                "consumption": values["consumption"],
+                "amount": values["amount"],
+            }
+            for month, data in sorted(summary["monthly_by_resource"].items())
+            for resource, values in data.items()
+        ],
+        "summary": {
+            "total_amount": float(totals_amount),
+            "total_consumption": float(totals_consumption),
+            "average_daily_amount": float(average_daily_amount),
+            "peak_month": peak_month_by_amount["month"] if peak_month_by_amount else None,
+            "resources": [
+                {
+                    "resource_type": resource,
+                    "total_consumption": values["total_consumption"],
+                    "total_amount": values["total_amount"],
+                    "unit": units_map.get(resource, ""),
+                }
+                for resource, values in summary["resource_totals"].items()
+            ],
+        },
+        "comparison": list(by_property),
+        "payments": list(payments),
+        "forecast_amount": forecast_value,
+    }
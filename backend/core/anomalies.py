@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from itertools import groupby
+from statistics import median
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lag
+
+from .models import Anomaly, Reading
+
+DEFAULT_THRESHOLD = 3.5
+MIN_PRIOR_YEARS = 2
+STREAM_CHUNK_SIZE = 10000
+STORE_BATCH_SIZE = 1000
+# turns the median absolute deviation into a standard deviation estimate for normal data
+MAD_SCALE = 1.4826
+# floor of the scale as a share of the baseline: two or three prior years can agree by chance,
+# and ordinary month-to-month swings of a quarter must not turn into spikes
+MIN_SCALE_SHARE = 0.25
+QUANT = Decimal("0.001")
+
+
+class _Month:
+    __slots__ = ("consumption", "negative", "last_reading", "first_negative")
+
+    def __init__(self) -> None:
+        self.consumption = Decimal("0")
+        self.negative = Decimal("0")
+        self.last_reading: Optional[int] = None
+        self.first_negative: Optional[int] = None
+
+
+def delta_rows(meters=None):
+    """Deltas of every reading against the previous one of its meter, from one query ordered by meter."""
+
+    readings = Reading.objects.all()
+    if meters is not None:
+        readings = readings.filter(meter__in=meters)
+    order = [F("reading_date").asc(), F("created_at").asc(), F("id").asc()]
+    return (
+        readings.annotate(previous=Window(Lag("value"), partition_by=F("meter_id"), order_by=order))
+        .order_by("meter_id", "reading_date", "created_at", "id")
+        .values_list("meter_id", "id", "reading_date", "value", "previous")
+    )
+
+
+def score_meter(
+    months: dict[tuple[int, int], _Month],
+    since: Optional[tuple[int, int]] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_years: int = MIN_PRIOR_YEARS,
+) -> list[dict]:
+    """Findings of one meter from its monthly consumption.
+
+    Every month is compared with the same calendar month of earlier years by a
+    robust z-score, ``(x − median) / (1.4826 · MAD)``. A month far above its
+    history is a spike, a month without consumption where the history has some
+    is a zero; negative deltas (meter replacement or a typo) are reported in
+    any month and are not counted as consumption.
+    """
+
+    history: dict[int, list[tuple[int, float]]] = defaultdict(list)
+    for (year, month), stats in sorted(months.items()):
+        history[month].append((year, float(stats.consumption)))
+
+    findings = []
+    for (year, month), stats in sorted(months.items()):
+        if since is not None and (year, month) < since:
+            continue
+        if stats.negative:
+            findings.append(
+                {
+                    "year": year,
+                    "month": month,
+                    "kind": Anomaly.NEGATIVE,
+                    "reading_id": stats.first_negative,
+                    "consumption": stats.negative,
+                }
+            )
+        prior = [value for prior_year, value in history[month] if prior_year < year]
+        if len(prior) < min_years:
+            continue
+        baseline = median(prior)
+        scale = max(MAD_SCALE * median(abs(value - baseline) for value in prior), MIN_SCALE_SHARE * baseline)
+        if scale <= 0:
+            continue
+        score = (float(stats.consumption) - baseline) / scale
+        if not stats.consumption and not stats.negative and baseline > 0:
+            kind = Anomaly.ZERO
+        elif score > threshold:
+            kind = Anomaly.SPIKE
+        else:
+            continue
+        findings.append(
+            {
+                "year": year,
+                "month": month,
+                "kind": kind,
+                "reading_id": stats.last_reading,
+                "consumption": stats.consumption,
+                "baseline": Decimal(baseline).quantize(QUANT),
+                "score": round(score, 3),
+            }
+        )
+    return findings
+
+
+def detect_anomalies(
+    meters=None,
+    since: Optional[tuple[int, int]] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_years: int = MIN_PRIOR_YEARS,
+) -> dict:
+    """Scan readings of ``meters`` (all meters by default) and replace their stored findings.
+
+    Readings are streamed once in meter order, so memory holds one meter's
+    months at a time plus the findings. With ``since`` (year, month) only later
+    months are reported and replaced; earlier months still serve as history.
+    """
+
+    found: list[Anomaly] = []
+    scanned = 0
+    readings = 0
+    rows = delta_rows(meters).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    for meter_id, group in groupby(rows, key=lambda row: row[0]):
+        months: dict[tuple[int, int], _Month] = defaultdict(_Month)
+        for _, reading_id, reading_date, value, previous in group:
+            readings += 1
+            if previous is None:
+                # the first reading only opens the series, its month has no consumption to judge
+                continue
+            stats = months[(reading_date.year, reading_date.month)]
+            stats.last_reading = reading_id
+            delta = value - previous
+            if delta > 0:
+                stats.consumption += delta
+            elif delta < 0:
+                stats.negative += delta
+                if stats.first_negative is None:
+                    stats.first_negative = reading_id
+        scanned += 1
+        found.extend(Anomaly(meter_id=meter_id, **finding) for finding in score_meter(months, since, threshold, min_years))
+
+    with transaction.atomic():
+        stale = Anomaly.objects.all()
+        if meters is not None:
+            stale = stale.filter(meter__in=meters)
+        if since is not None:
+            stale = stale.filter(Q(year__gt=since[0]) | Q(year=since[0], month__gte=since[1]))
+        stale.delete()
+        Anomaly.objects.bulk_create(found, batch_size=STORE_BATCH_SIZE)
+
+    counts = Counter(anomaly.kind for anomaly in found)
+    return {
+        "meters": scanned,
+        "readings": readings,
+        "anomalies": {kind: counts.get(kind, 0) for kind, _ in Anomaly.KIND_CHOICES},
+    }
@@ -0,0 +1,197 @@
+import hashlib
+import uuid
+from datetime import date
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Property
+from .rendering import FastJSONRenderer
+from .tariffs import VERSION_CACHE_KEY as TARIFF_VERSION_KEY
+
+OWNER_VERSION_KEY = "core:owner:{owner_id}:version"
+RESPONSE_KEY = "core:response:{namespace}:{owner_id}:{digest}"
+STATS_KEY = "core:response:{outcome}"
+
+
+def _version_stamp(key: str) -> str:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def owner_data_version(owner_id: int) -> str:
+    """Return the current data version stamp of an owner, creating it on first use."""
+
+    return _version_stamp(OWNER_VERSION_KEY.format(owner_id=owner_id))
+
+
+def tariff_data_version() -> str:
+    return _version_stamp(TARIFF_VERSION_KEY)
+
+
+def bump_owner_versions(owner_ids: Iterable[int]) -> None:
+    """Invalidate cached responses of the given owners.
+
+    Versions are random stamps rather than counters, so an evicted key can never
+    come back with a value an old cache entry was stored under. The stamp is
+    replaced again on commit, because a concurrent request may have cached data
+    read before the change became visible.
+    """
+
+    keys = [OWNER_VERSION_KEY.format(owner_id=owner_id) for owner_id in set(owner_ids)]
+    if not keys:
+        return
+
+    def bump():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_property_owners(property_ids: Iterable[int]) -> None:
+    bump_owner_versions(Property.objects.filter(id__in=set(property_ids)).values_list("owner_id", flat=True))
+
+
+def _request_params(request) -> str:
+    # plain Django requests (async views) and DRF requests alike
+    return repr(sorted((key, sorted(values)) for key, values in request.GET.lists()))
+
+
+def response_cache_key(namespace: str, request) -> str:
+    owner_id = request.user.pk
+    # defaults of the analytics views depend on the current date
+    parts = [
+        owner_data_version(owner_id),
+        tariff_data_version(),
+        date.today().isoformat(),
+        _request_params(request),
+    ]
+    digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return RESPONSE_KEY.format(namespace=namespace, owner_id=owner_id, digest=digest)
+
+
+def response_etag(namespace: str, request, owner_scoped: bool = True) -> str:
+    """Entity tag of a GET response, derived from version stamps instead of the payload.
+
+    Owner-scoped responses change with the owner's data version; all of them
+    change with the tariff version, the query parameters and the negotiated format.
+    """
+
+    parts = [
+        namespace,
+        tariff_data_version(),
+        # async views answer JSON only and share the tags of the DRF JSON responses
+        getattr(getattr(request, "accepted_renderer", None), "format", "json"),
+        _request_params(request),
+    ]
+    if owner_scoped:
+        owner_id = request.user.pk
+        parts += [str(owner_id), owner_data_version(owner_id), date.today().isoformat()]
+    return quote_etag(hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32])
+
+
+def conditional_response(request, namespace: str, build: Callable[[], Response], owner_scoped: bool = True) -> Response:
+    """Answer ``If-None-Match`` with 304 before ``build()`` runs any query.
+
+    The tag is computed before the response is built, so a change made meanwhile
+    yields a stale tag and the next request gets the full response again.
+    """
+
+    etag = response_etag(namespace, request, owner_scoped)
+    if _not_modified(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _not_modified(request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison
+    known = {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}
+    return etag in known or "*" in known
+
+
+def cached_response(request, namespace: str, build: Callable[[], Response]) -> Response:
+    """Serve ``build()`` from the cache while the owner's data version is unchanged."""
+
+    key = response_cache_key(namespace, request)
+    data = cache.get(key)
+    if data is not None:
+        _count("hits")
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    _count("misses")
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data, getattr(settings, "RESPONSE_CACHE_TIMEOUT", 3600))
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def _lookup_response(request, namespace: str) -> tuple[str, Optional[str], Optional[Any]]:
+    """ETag, cache key and cached data of a request; no key when ``If-None-Match`` already matches."""
+
+    etag = response_etag(namespace, request)
+    if _not_modified(request, etag):
+        return etag, None, None
+    key = response_cache_key(namespace, request)
+    data = cache.get(key)
+    _count("misses" if data is None else "hits")
+    return etag, key, data
+
+
+async def async_cached_response(
+    request, namespace: str, build: Callable[[], Awaitable[tuple[int, Any]]]
+) -> HttpResponse:
+    """``conditional_response`` around ``cached_response`` for plain async views answering JSON.
+
+    ``build`` returns the status and the data of a fresh response. Tags and
+    cache entries are shared with the DRF view of the same namespace, so both
+    variants of an endpoint serve each other's cached data.
+    """
+
+    etag, key, data = await sync_to_async(_lookup_response)(request, namespace)
+    if key is None:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        hit = data is not None
+        if not hit:
+            status_code, data = await build()
+            if status_code != status.HTTP_200_OK:
+                return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type="application/json")
+            await sync_to_async(cache.set)(key, data, getattr(settings, "RESPONSE_CACHE_TIMEOUT", 3600))
+        response = HttpResponse(FastJSONRenderer().render(data), content_type="application/json")
+        response["X-Cache"] = "HIT" if hit else "MISS"
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cache_stats() -> dict[str, int]:
+    return {outcome: cache.get(STATS_KEY.format(outcome=outcome), 0) for outcome in ("hits", "misses")}
+
+
+def _count(outcome: str) -> None:
+    key = STATS_KEY.format(outcome=outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
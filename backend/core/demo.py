@@ -0,0 +1,399 @@
+from calendar import monthrange
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import bump_owner_versions, tariff_data_version
+from .models import Meter, MonthlyCharge, OwnerMonthlyRollup, Property, Reading, Tariff
+from .services import BULK_BATCH_SIZE, _walk_charges
+from .tariffs import tariff_index
+
+DEMO_USERNAME = "test"
+DEMO_READY_KEY = "core:demo:ready:{user_id}"
+METER_AGE_DAYS = 420
+
+DEMO_SCENARIOS = [
+    {
+        "name": "Смарт-квартира в Москва-Сити",
+        "address": "Москва, наб. Пресненская, 8, башня Восток",
+        "meters": [
+            {
+                "resource": Meter.ELECTRICITY,
+                "serial": "ELX-93A1",
+                "unit": "кВт·ч",
+                "start": Decimal("2180.4"),
+                "plan": [
+                    Decimal("126.4"),
+                    Decimal("135.1"),
+                    Decimal("140.3"),
+                    Decimal("150.8"),
+                    Decimal("156.2"),
+                    Decimal("164.5"),
+                    Decimal("170.1"),
+                    Decimal("165.4"),
+                ],
+            },
+            {
+                "resource": Meter.COLD_WATER,
+                "serial": "CWX-55B1",
+                "unit": "м³",
+                "start": Decimal("48.2"),
+                "plan": [
+                    Decimal("3.2"),
+                    Decimal("3.8"),
+                    Decimal("4.0"),
+                    Decimal("4.4"),
+                    Decimal("4.7"),
+                    Decimal("5.1"),
+                    Decimal("4.9"),
+                    Decimal("5.4"),
+                ],
+            },
+            {
+                "resource": Meter.HEATING,
+                "serial": "HTX-31C8",
+                "unit": "Гкал",
+                "start": Decimal("18.5"),
+                "plan": [
+                    Decimal("1.6"),
+                    Decimal("1.8"),
+                    Decimal("1.9"),
+                    Decimal("2.3"),
+                    Decimal("2.4"),
+                    Decimal("2.1"),
+                    Decimal("2.0"),
+                    Decimal("1.7"),
+                ],
+            },
+        ],
+    },
+    {
+        "name": "Арт-пространство «Смена»",
+        "address": "Екатеринбург, ул. Вайнера, 12 корп. 4",
+        "meters": [
+            {
+                "resource": Meter.ELECTRICITY,
+                "serial": "ELX-45Q2",
+                "unit": "кВт·ч",
+                "start": Decimal("780.0"),
+                "plan": [
+                    Decimal("212.4"),
+                    Decimal("220.8"),
+                    Decimal("240.7"),
+                    Decimal("255.1"),
+                    Decimal("248.3"),
+                    Decimal("262.9"),
+                    Decimal("271.4"),
+                    Decimal("268.0"),
+                ],
+            },
+            {
+                "resource": Meter.GAS,
+                "serial": "GSX-77Z1",
+                "unit": "м³",
+                "start": Decimal("320.5"),
+                "plan": [
+                    Decimal("40.1"),
+                    Decimal("44.6"),
+                    Decimal("48.2"),
+                    Decimal("52.7"),
+                    Decimal("55.3"),
+                    Decimal("58.1"),
+                    Decimal("49.8"),
+                    Decimal("47.6"),
+                ],
+            },
+            {
+                "resource": Meter.COLD_WATER,
+                "serial": "CWX-73K4",
+                "unit": "м³",
+                "start": Decimal("102.1"),
+                "plan": [
+                    Decimal("6.4"),
+                    Decimal("6.8"),
+                    Decimal("7.0"),
+                    Decimal("7.5"),
+                    Decimal("7.8"),
+                    Decimal("8.1"),
+                    Decimal("8.9"),
+                    Decimal("7.7"),
+                ],
+            },
+        ],
+    },
+    {
+        "name": "Дом на склоне Янган-Тау",
+        "address": "Башкортостан, Малояз, горнолыжный склон",
+        "meters": [
+            {
+                "resource": Meter.ELECTRICITY,
+                "serial": "ELX-12M9",
+                "unit": "кВт·ч",
+                "start": Decimal("410.2"),
+                "plan": [
+                    Decimal("82.4"),
+                    Decimal("90.7"),
+                    Decimal("96.2"),
+                    Decimal("101.8"),
+                    Decimal("110.4"),
+                    Decimal("124.7"),
+                    Decimal("118.3"),
+                    Decimal("95.6"),
+                ],
+            },
+            {
+                "resource": Meter.GAS,
+                "serial": "GSX-19D5",
+                "unit": "м³",
+                "start": Decimal("210.7"),
+                "plan": [
+                    Decimal("32.1"),
+                    Decimal("35.0"),
+                    Decimal("36.4"),
+                    Decimal("38.7"),
+                    Decimal("41.3"),
+                    Decimal("43.8"),
+                    Decimal("45.9"),
+                    Decimal("39.4"),
+                ],
+            },
+            {
+                "resource": Meter.HOT_WATER,
+                "serial": "HWX-28F7",
+                "unit": "м³",
+                "start": Decimal("34.0"),
+                "plan": [
+                    Decimal("2.4"),
+                    Decimal("2.6"),
+                    Decimal("2.8"),
+                    Decimal("3.0"),
+                    Decimal("3.3"),
+                    Decimal("3.9"),
+                    Decimal("3.1"),
+                    Decimal("2.7"),
+                ],
+            },
+        ],
+    },
+]
+
+
+
+def _month_end(today: date, months_back: int) -> date:
+    year = today.year
+    month = today.month - months_back
+    while month <= 0:
+        month += 12
+        year -= 1
+    return date(year, month, monthrange(year, month)[1])
+
+
+def demo_tariff_windows(today: date) -> list[dict]:
+    today = today.replace(day=1)
+    return [
+        {
+            "valid_from": today.replace(year=today.year - 2, month=1, day=1),
+            "valid_to": today.replace(year=today.year - 1, month=8, day=31),
+            "values": {
+                Meter.ELECTRICITY: Decimal("5.65"),
+                Meter.COLD_WATER: Decimal("37.20"),
+                Meter.HOT_WATER: Decimal("176.80"),
+                Meter.GAS: Decimal("5.95"),
+                Meter.HEATING: Decimal("1505.00"),
+            },
+        },
+        {
+            "valid_from": today.replace(year=today.year - 1, month=9, day=1),
+            "valid_to": None,
+            "values": {
+                Meter.ELECTRICITY: Decimal("7.10"),
+                Meter.COLD_WATER: Decimal("46.30"),
+                Meter.HOT_WATER: Decimal("224.10"),
+                Meter.GAS: Decimal("8.05"),
+                Meter.HEATING: Decimal("1940.00"),
+            },
+        },
+    ]
+
+
+def ensure_demo_tariffs(today: date) -> None:
+    """Create or correct the demo tariffs with one query when they are already in place."""
+
+    wanted = {
+        (resource_type, window["valid_from"]): (value, window["valid_to"])
+        for window in demo_tariff_windows(today)
+        for resource_type, value in window["values"].items()
+    }
+    existing: dict[tuple[str, date], Tariff] = {}
+    for tariff in Tariff.objects.filter(
+        resource_type__in={key[0] for key in wanted}, valid_from__in={key[1] for key in wanted}
+    ).order_by("id"):
+        existing.setdefault((tariff.resource_type, tariff.valid_from), tariff)
+
+    missing = []
+    for (resource_type, valid_from), (value, valid_to) in wanted.items():
+        tariff = existing.get((resource_type, valid_from))
+        if tariff is None:
+            missing.append(
+                Tariff(resource_type=resource_type, valid_from=valid_from, value_per_unit=value, valid_to=valid_to)
+            )
+        elif (tariff.value_per_unit, tariff.valid_to) != (value, valid_to):
+            tariff.value_per_unit, tariff.valid_to = value, valid_to
+            tariff.save(update_fields=["value_per_unit", "valid_to"])
+    if missing:
+        Tariff.objects.bulk_create(missing)
+        # bulk_create sends no post_save, see signals.reset_tariff_index
+        tariff_index.changed()
+
+
+@dataclass
+class DemoTemplate:
+    """The demo data set with list positions in place of primary keys.
+
+    ``meters`` and ``charges`` refer to properties, ``readings`` to meters by
+    their index; charges and rollups are computed once with the usual charge rules.
+    """
+
+    properties: list[dict]
+    meters: list[tuple[int, dict]]
+    readings: list[tuple[int, Decimal, date]]
+    charges: dict[tuple[int, int, int, str], list[Decimal]]
+    rollups: dict[tuple[int, int, str], list]
+
+
+def build_demo_template(today: date) -> DemoTemplate:
+    properties: list[dict] = []
+    meters: list[tuple[int, dict]] = []
+    readings: list[tuple[int, Decimal, date]] = []
+    charges: dict[tuple[int, int, int, str], list[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+
+    for property_index, scenario in enumerate(DEMO_SCENARIOS):
+        properties.append({"name": scenario["name"], "address": scenario["address"]})
+        for config in scenario["meters"]:
+            meter_index = len(meters)
+            meters.append(
+                (
+                    property_index,
+                    {
+                        "resource_type": config["resource"],
+                        "serial_number": config["serial"],
+                        "unit": config["unit"],
+                        "installed_at": today - timedelta(days=METER_AGE_DAYS),
+                        "is_active": True,
+                    },
+                )
+            )
+            rows = []
+            value = config["start"]
+            periods = len(config["plan"])
+            for idx, delta in enumerate(config["plan"]):
+                value += delta
+                rows.append((_month_end(today, periods - idx), (1, idx), value.quantize(Decimal("0.001"))))
+            readings.extend((meter_index, value, reading_date) for reading_date, _, value in rows)
+
+            meter = Meter(property_id=property_index, resource_type=config["resource"])
+            for key, (consumption, amount) in _walk_charges(meter, rows, None).items():
+                charges[key][0] += consumption
+                charges[key][1] += amount
+
+    rollups: dict[tuple[int, int, str], list] = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for (_, year, month, resource_type), (consumption, amount) in charges.items():
+        totals = rollups[(year, month, resource_type)]
+        totals[0] += consumption
+        totals[1] += amount
+        totals[2] += 1
+    return DemoTemplate(properties, meters, readings, dict(charges), dict(rollups))
+
+
+_template: Optional[tuple[tuple[date, str], DemoTemplate]] = None
+
+
+def demo_template() -> DemoTemplate:
+    """The template of the current day and tariffs, built once per process."""
+
+    global _template
+    today = date.today()
+    key = (today, tariff_data_version())
+    if _template is not None and _template[0] == key:
+        return _template[1]
+    ensure_demo_tariffs(today)
+    template = build_demo_template(today)
+    # tariffs written just now may still be rolled back; the commit bumps the version anyway
+    if not tariff_index.has_pending_changes():
+        _template = ((today, tariff_data_version()), template)
+    return template
+
+
+@transaction.atomic
+def provision_demo(user) -> None:
+    """Clone the demo template into ``user``'s account with one insert per table."""
+
+    template = demo_template()
+    properties = Property.objects.bulk_create([Property(owner=user, **fields) for fields in template.properties])
+    meters = Meter.objects.bulk_create(
+        [Meter(property=properties[index], **fields) for index, fields in template.meters]
+    )
+    Reading.objects.bulk_create(
+        [
+            Reading(meter=meters[index], value=value, reading_date=reading_date)
+            for index, value, reading_date in template.readings
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    MonthlyCharge.objects.bulk_create(
+        [
+            MonthlyCharge(
+                property=properties[index],
+                year=year,
+                month=month,
+                resource_type=resource_type,
+                consumption=consumption,
+                amount=amount,
+            )
+            for (index, year, month, resource_type), (consumption, amount) in template.charges.items()
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    OwnerMonthlyRollup.objects.bulk_create(
+        [
+            OwnerMonthlyRollup(
+                owner=user,
+                year=year,
+                month=month,
+                resource_type=resource_type,
+                consumption=consumption,
+                amount=amount,
+                properties_count=count,
+            )
+            for (year, month, resource_type), (consumption, amount, count) in template.rollups.items()
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    bump_owner_versions([user.id])
+
+
+def ensure_demo_data(user) -> None:
+    """Create demo data for the test user to simplify onboarding.
+
+    The account is provisioned once; afterwards a flag in the cache answers
+    without touching the database, so logins of the demo user stay cheap.
+    """
+
+    if user.username != DEMO_USERNAME:
+        return
+    ready = DEMO_READY_KEY.format(user_id=user.pk)
+    if cache.get(ready):
+        return
+
+    with transaction.atomic():
+        # concurrent first logins wait for each other instead of cloning twice
+        get_user_model().objects.select_for_update().get(pk=user.pk)
+        if not Property.objects.filter(owner=user).exists():
+            provision_demo(user)
+        transaction.on_commit(lambda: cache.set(ready, True, None))
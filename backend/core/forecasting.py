@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import MonthlyCharge
+
+FORECAST_KEY = "core:forecast:{property_id}"
+MAX_HORIZON = 24
+# shorter histories are forecast without a trend or without seasonal factors
+MIN_TREND_MONTHS = 6
+MIN_SEASONAL_MONTHS = 12
+# weight of the neutral factor 1 against each observed year when estimating a month's factor
+SEASONAL_PRIOR = 0.25
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def _regression(points: list[tuple[int, float]]) -> tuple[float, float, float]:
+    """Least squares line through (month index, value) points as (center, level at center, slope)."""
+
+    count = len(points)
+    center = sum(index for index, _ in points) / count
+    level = sum(value for _, value in points) / count
+    if count < MIN_TREND_MONTHS:
+        return center, level, 0.0
+    spread = sum((index - center) ** 2 for index, _ in points)
+    slope = sum((index - center) * (value - level) for index, value in points) / spread if spread else 0.0
+    return center, level, slope
+
+
+def fit_series(points: list[tuple[int, float]]) -> dict:
+    """Fit ``value ≈ (level + slope · (index − center)) · factor[month of year]`` to one monthly series.
+
+    Seasonal factors are ratios of actual to trend amounts per calendar month,
+    shrunk towards 1 by the number of years seen and normalized to average 1;
+    the trend is then refitted on the deseasonalized values.
+    """
+
+    center, level, slope = _regression(points)
+    factors = [1.0] * 12
+    if len(points) >= MIN_SEASONAL_MONTHS:
+        actual = [0.0] * 12
+        expected = [0.0] * 12
+        seen = [0] * 12
+        for index, value in points:
+            month = index % 12
+            actual[month] += value
+            expected[month] += level + slope * (index - center)
+            seen[month] += 1
+        for month in range(12):
+            if seen[month] and expected[month] > 0:
+                ratio = actual[month] / expected[month]
+                factors[month] = (ratio * seen[month] + SEASONAL_PRIOR) / (seen[month] + SEASONAL_PRIOR)
+        mean = sum(factors) / 12
+        if mean > 0:
+            factors = [factor / mean for factor in factors]
+        center, level, slope = _regression([(index, value / factors[index % 12]) for index, value in points])
+    return {"center": center, "level": level, "slope": slope, "factors": factors}
+
+
+def predict(params: dict, index: int) -> float:
+    trend = params["level"] + params["slope"] * (index - params["center"])
+    return max(trend * params["factors"][index % 12], 0.0)
+
+
+def fit_properties(property_ids: Iterable[int], current_index: int) -> dict[int, dict[str, dict]]:
+    """Fit every resource series of the given properties from one query over complete months."""
+
+    before = current_index // 12, current_index % 12 + 1
+    rows = (
+        MonthlyCharge.objects.filter(property_id__in=property_ids)
+        .filter(Q(year__lt=before[0]) | Q(year=before[0], month__lt=before[1]))
+        .order_by("property_id", "resource_type", "year", "month")
+        .values_list("property_id", "resource_type", "year", "month", "amount")
+    )
+    fitted: dict[int, dict[str, dict]] = {property_id: {} for property_id in property_ids}
+    for (property_id, resource_type), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        points = [(_month_index(year, month), float(amount)) for _, _, year, month, amount in group]
+        fitted[property_id][resource_type] = fit_series(points)
+    return fitted
+
+
+def seasonal_forecasts(
+    property_ids: Iterable[int], horizon: int = 1, today: Optional[date] = None
+) -> dict[int, list[dict]]:
+    """Amounts of ``horizon`` months from the current one on, per property and resource.
+
+    Fitted parameters are cached per property for the current month and dropped
+    by ``invalidate_forecasts`` whenever the property's charges change, so only
+    the properties touched since the last request are refitted, in one batch.
+    """
+
+    today = today or date.today()
+    current = _month_index(today.year, today.month)
+    property_ids = list(property_ids)
+    keys = {property_id: FORECAST_KEY.format(property_id=property_id) for property_id in property_ids}
+    cached = cache.get_many(keys.values())
+
+    params: dict[int, dict[str, dict]] = {}
+    stale = []
+    for property_id, key in keys.items():
+        entry = cached.get(key)
+        if entry is not None and entry["month"] == current:
+            params[property_id] = entry["series"]
+        else:
+            stale.append(property_id)
+    if stale:
+        fitted = fit_properties(stale, current)
+        params.update(fitted)
+        cache.set_many(
+            {keys[property_id]: {"month": current, "series": fitted[property_id]} for property_id in stale}, None
+        )
+
+    forecasts = {}
+    for property_id in property_ids:
+        months = []
+        for index in range(current, current + horizon):
+            resources = {
+                resource_type: round(predict(series, index), 2) for resource_type, series in params[property_id].items()
+            }
+            months.append(
+                {
+                    "year": index // 12,
+                    "month": index % 12 + 1,
+                    "amount": round(sum(resources.values()), 2),
+                    "resources": resources,
+                }
+            )
+        forecasts[property_id] = months
+    return forecasts
+
+
+def invalidate_forecasts(property_ids: Iterable[int]) -> None:
+    """Drop fitted parameters of properties whose charges changed.
+
+    Repeated on commit, as a concurrent request may refit from data read before
+    the change became visible.
+    """
+
+    keys = [FORECAST_KEY.format(property_id=property_id) for property_id in set(property_ids)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def merge_months(forecasts: dict[int, list[dict]]) -> list[dict]:
+    """Month-by-month totals over several properties."""
+
+    merged: dict[tuple[int, int], dict] = {}
+    for months in forecasts.values():
+        for item in months:
+            entry = merged.setdefault(
+                (item["year"], item["month"]),
+                {"year": item["year"], "month": item["month"], "amount": 0.0, "resources": defaultdict(float)},
+            )
+            entry["amount"] = round(entry["amount"] + item["amount"], 2)
+            for resource_type, amount in item["resources"].items():
+                entry["resources"][resource_type] = round(entry["resources"][resource_type] + amount, 2)
+    return [{**entry, "resources": dict(entry["resources"])} for _, entry in sorted(merged.items())]
@@ -0,0 +1,146 @@
+import csv
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+from rest_framework import serializers
+
+from .models import Meter
+from .services import ingest_readings
+
+MAX_REPORTED_ERRORS = 1000
+VALUE_MAX_DIGITS = 12
+VALUE_DECIMAL_PLACES = 3
+# the rules of ReadingBulkSerializer.value; exponent forms such as 1e15 count all their digits
+VALUE_FIELD = serializers.DecimalField(max_digits=VALUE_MAX_DIGITS, decimal_places=VALUE_DECIMAL_PLACES)
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    rejected_count: int = 0
+    rejected: list[dict] = field(default_factory=list)
+
+    def reject(self, line: int, row: dict, error: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_ERRORS:
+            self.rejected.append({"line": line, "row": row, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "rejected_count": self.rejected_count,
+            "rejected": self.rejected,
+        }
+
+
+class MeterLookup:
+    """Meters available to the import, loaded once and resolved by id or serial number."""
+
+    def __init__(self, owner=None) -> None:
+        meters = Meter.objects.select_related("property")
+        if owner is not None:
+            meters = meters.filter(property__owner=owner)
+        self.by_id: dict[int, Meter] = {}
+        self.by_serial: dict[str, Optional[Meter]] = {}
+        for meter in meters:
+            self.by_id[meter.id] = meter
+            if meter.serial_number:
+                # a serial number used twice cannot identify a meter
+                self.by_serial[meter.serial_number] = None if meter.serial_number in self.by_serial else meter
+
+    def resolve(self, meter_id: str, serial_number: str) -> Meter:
+        if meter_id:
+            try:
+                meter = self.by_id.get(int(meter_id))
+            except ValueError:
+                raise ValueError("Некорректный ID счетчика")
+            if meter is None:
+                raise ValueError("Счетчик не найден")
+            return meter
+        if not serial_number:
+            raise ValueError("Не указан счетчик")
+        if serial_number not in self.by_serial:
+            raise ValueError("Счетчик не найден")
+        meter = self.by_serial[serial_number]
+        if meter is None:
+            raise ValueError("Серийный номер принадлежит нескольким счетчикам")
+        return meter
+
+
+def _parse_value(raw: str) -> Decimal:
+    try:
+        value = Decimal(raw.strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError("Некорректное значение показания")
+    if not value.is_finite():
+        raise ValueError("Некорректное значение показания")
+    try:
+        return VALUE_FIELD.to_internal_value(value)
+    except serializers.ValidationError:
+        raise ValueError("Значение показания вне допустимого диапазона")
+
+
+def _parse_date(raw: str) -> date:
+    try:
+        return date.fromisoformat(raw.strip())
+    except ValueError:
+        raise ValueError("Некорректная дата, ожидается YYYY-MM-DD")
+
+
+def import_readings(lines: Iterable[str], owner=None, chunk_size: Optional[int] = None) -> ImportReport:
+    """Import readings from CSV lines with columns ``meter`` or ``serial_number``, ``value``, ``reading_date``.
+
+    The file is parsed as a stream. Every ``chunk_size`` valid rows (by default
+    ``READINGS_IMPORT_CHUNK_SIZE``) are sorted by meter and date and stored by
+    ``ingest_readings`` in their own transaction, so a failing chunk does not undo
+    the earlier ones. Invalid rows are skipped and reported with their line numbers.
+    """
+
+    chunk_size = chunk_size or getattr(settings, "READINGS_IMPORT_CHUNK_SIZE", 5000)
+    reader = csv.DictReader(lines)
+    columns = {name.strip() for name in reader.fieldnames or []}
+    if not {"value", "reading_date"} <= columns or not columns & {"meter", "serial_number"}:
+        raise ImportFormatError("Нужны столбцы value, reading_date и meter или serial_number")
+
+    meters = MeterLookup(owner)
+    report = ImportReport()
+    chunk: list[tuple[int, dict, dict]] = []
+
+    def flush() -> None:
+        chunk.sort(key=lambda entry: (entry[2]["meter"].id, entry[2]["reading_date"]))
+        try:
+            report.created += len(ingest_readings(item for _, _, item in chunk))
+        except DatabaseError as exc:
+            for line, row, _ in chunk:
+                report.reject(line, row, f"Ошибка записи пакета: {exc}")
+        chunk.clear()
+
+    for row in reader:
+        report.rows += 1
+        row = {(key or "").strip(): (value or "").strip() for key, value in row.items() if key}
+        line = reader.line_num
+        try:
+            item = {
+                "meter": meters.resolve(row.get("meter", ""), row.get("serial_number", "")),
+                "value": _parse_value(row.get("value", "")),
+                "reading_date": _parse_date(row.get("reading_date", "")),
+            }
+        except ValueError as exc:
+            report.reject(line, row, str(exc))
+            continue
+        chunk.append((line, row, item))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
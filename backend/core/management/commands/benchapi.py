@@ -0,0 +1,195 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.caching import bump_owner_versions
+
+User = get_user_model()
+
+ENDPOINTS = {
+    "readings": "/api/readings/",
+    "monthly-charges": "/api/monthly-charges/",
+    "payments": "/api/payments/",
+    "analytics": "/api/analytics/",
+    "forecast": "/api/analytics/forecast/",
+}
+
+
+def _percentile(ordered: list[float], share: float) -> float:
+    """Nearest-rank percentile of an ordered sample."""
+
+    rank = max(1, round(share * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _size_list(value: str) -> list[int]:
+    try:
+        sizes = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise CommandError("Размеры наборов задаются списком чисел через запятую")
+    if not sizes or min(sizes) <= 0:
+        raise CommandError("Размеры наборов должны быть положительными")
+    return sizes
+
+
+class Command(BaseCommand):
+    help = "Измеряет задержку, число запросов и пик памяти эндпоинтов чтения на наборах данных разного размера"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="6,60", help="Объектов у пользователя в каждом наборе, через запятую")
+        parser.add_argument("--meters-per-property", type=int, default=4, help="Счётчиков на объект")
+        parser.add_argument("--months", type=int, default=36, help="Глубина истории в месяцах")
+        parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+        parser.add_argument("--requests", type=int, default=30, help="Запросов на эндпоинт после прогрева")
+        parser.add_argument("--warmup", type=int, default=3, help="Прогревочных запросов на эндпоинт")
+        parser.add_argument(
+            "--cold", action="store_true", help="Сбрасывать кэш аналитики перед каждым запросом"
+        )
+        parser.add_argument("--endpoints", help=f"Подмножество эндпоинтов: {', '.join(ENDPOINTS)}")
+        parser.add_argument("--output", help="Записать результаты в JSON-файл вместо вывода")
+        parser.add_argument("--baseline", help="JSON-файл прошлого прогона для сравнения")
+        parser.add_argument(
+            "--tolerance", type=float, default=20.0, help="Допустимый рост p95 относительно базового прогона, %%"
+        )
+
+    def handle(self, *args, **options):
+        sizes = _size_list(options["sizes"])
+        endpoints = list(ENDPOINTS)
+        if options["endpoints"]:
+            endpoints = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+            unknown = sorted(set(endpoints) - set(ENDPOINTS))
+            if unknown:
+                raise CommandError(f"Неизвестные эндпоинты: {', '.join(unknown)}")
+        if options["requests"] <= 0:
+            raise CommandError("Число запросов должно быть положительным")
+
+        report = {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "requests": options["requests"],
+                "cold": options["cold"],
+                "months": options["months"],
+                "meters_per_property": options["meters_per_property"],
+                "seed": options["seed"],
+            },
+            "results": {},
+        }
+        for size in sizes:
+            user = self._dataset(size, options)
+            client = APIClient()
+            client.force_authenticate(user)
+            property_ids = ",".join(str(pk) for pk in user.properties.order_by("id").values_list("id", flat=True))
+            params = {"forecast": {"properties": property_ids}}
+            report["results"][str(size)] = {
+                name: self._measure(client, user, ENDPOINTS[name], params.get(name, {}), options)
+                for name in endpoints
+            }
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(payload + "\n")
+            self.stderr.write(f"Результаты записаны в {options['output']}")
+        else:
+            self.stdout.write(payload)
+
+        if options["baseline"]:
+            self._compare(report, options["baseline"], options["tolerance"])
+
+    def _dataset(self, size: int, options):
+        """Seed the benchmark user of ``size`` properties, reusing it when it is already there."""
+
+        username = f"bench{size}"
+        call_command(
+            "seedtestdata",
+            prefix=username,
+            properties_per_user=size,
+            meters_per_property=options["meters_per_property"],
+            months=options["months"],
+            seed=options["seed"],
+            fast=True,
+            stdout=self.stderr,
+        )
+        return User.objects.get(username=username)
+
+    def _measure(self, client, user, path: str, params: dict, options) -> dict:
+        def request():
+            if options["cold"]:
+                bump_owner_versions([user.id])
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise CommandError(f"{path} вернул {response.status_code}")
+            return response
+
+        for _ in range(options["warmup"]):
+            request()
+
+        timings = []
+        queries = []
+        for _ in range(options["requests"]):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+
+        # tracing slows every allocation down, so memory is measured in a separate request
+        tracemalloc.start()
+        try:
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            "p50_ms": round(_percentile(timings, 0.50), 3),
+            "p95_ms": round(_percentile(timings, 0.95), 3),
+            "p99_ms": round(_percentile(timings, 0.99), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": max(queries),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "response_bytes": len(response.content),
+        }
+
+    def _compare(self, report: dict, path: str, tolerance: float) -> None:
+        try:
+            with open(path, encoding="utf-8") as handle:
+                baseline = json.load(handle)["results"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Не удалось прочитать базовый прогон {path}: {exc}")
+
+        regressions = []
+        for size, endpoints in report["results"].items():
+            for name, current in endpoints.items():
+                previous = baseline.get(size, {}).get(name)
+                if previous is None:
+                    continue
+                limit = previous["p95_ms"] * (1 + tolerance / 100)
+                line = (
+                    f"{size}/{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс, "
+                    f"запросов {previous['queries']} -> {current['queries']}"
+                )
+                if current["p95_ms"] > limit or current["queries"] > previous["queries"]:
+                    regressions.append(line)
+                    self.stderr.write(self.style.ERROR(line))
+                else:
+                    self.stderr.write(line)
+
+        if regressions:
+            raise CommandError(f"Регрессии относительно {path}: {len(regressions)}")
+        self.stderr.write(self.style.SUCCESS("Регрессий относительно базового прогона нет"))
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import count
+from urllib.parse import urlencode
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.management.commands.benchapi import _percentile
+
+User = get_user_model()
+
+# mode: (handler, path)
+MODES = {
+    "wsgi": ("wsgi", "/api/analytics/"),
+    "asgi-sync": ("asgi", "/api/analytics/"),
+    "asgi": ("asgi", "/api/analytics/async/"),
+}
+
+
+def _wsgi_get(application, path: str, query: str, token: str) -> int:
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_AUTHORIZATION": f"Bearer {token}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(int(status.split()[0])))
+    try:
+        for _ in response:
+            pass
+    finally:
+        # fires request_finished, as a WSGI server does
+        response.close()
+    return statuses[0]
+
+
+async def _asgi_get(application, path: str, query: str, token: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    finished = asyncio.Event()
+    requested = False
+    status_code = 0
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the handler listens for a disconnect while the view runs
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    await application(scope, receive, send)
+    finished.set()
+    return status_code
+
+
+class Command(BaseCommand):
+    help = "Сравнивает хвостовые задержки аналитики под WSGI и ASGI при параллельных запросах"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=60, help="Объектов у пользователя")
+        parser.add_argument("--meters-per-property", type=int, default=4, help="Счётчиков на объект")
+        parser.add_argument("--months", type=int, default=36, help="Глубина истории в месяцах")
+        parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на режим после прогрева")
+        parser.add_argument("--warmup", type=int, default=10, help="Прогревочных запросов на режим")
+        parser.add_argument("--concurrency", type=int, default=8, help="Одновременных клиентов")
+        parser.add_argument("--cold", action="store_true", help="Обходить кэш ответов: уникальный параметр в каждом запросе")
+        parser.add_argument("--modes", help=f"Подмножество режимов: {', '.join(MODES)}")
+        parser.add_argument("--output", help="Записать результаты в JSON-файл вместо вывода")
+
+    def handle(self, *args, **options):
+        modes = list(MODES)
+        if options["modes"]:
+            modes = [name.strip() for name in options["modes"].split(",") if name.strip()]
+            unknown = sorted(set(modes) - set(MODES))
+            if unknown:
+                raise CommandError(f"Неизвестные режимы: {', '.join(unknown)}")
+        if min(options["size"], options["requests"], options["concurrency"]) <= 0 or options["warmup"] < 0:
+            raise CommandError("Размер набора, число запросов и клиентов должны быть положительными")
+
+        username = f"bench{options['size']}"
+        call_command(
+            "seedtestdata",
+            prefix=username,
+            properties_per_user=options["size"],
+            meters_per_property=options["meters_per_property"],
+            months=options["months"],
+            seed=options["seed"],
+            fast=True,
+            stdout=self.stderr,
+        )
+        token = str(RefreshToken.for_user(User.objects.get(username=username)).access_token)
+        self.nonce = count()
+
+        report = {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "size": options["size"],
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "cold": options["cold"],
+            },
+            "results": {},
+        }
+        for mode in modes:
+            handler, path = MODES[mode]
+            run = self._run_wsgi if handler == "wsgi" else self._run_asgi
+            run(path, token, options["warmup"], options)
+            timings, elapsed = run(path, token, options["requests"], options)
+            timings.sort()
+            report["results"][mode] = {
+                "path": path,
+                "p50_ms": round(_percentile(timings, 0.50), 3),
+                "p95_ms": round(_percentile(timings, 0.95), 3),
+                "p99_ms": round(_percentile(timings, 0.99), 3),
+                "mean_ms": round(statistics.fmean(timings), 3),
+                "throughput_rps": round(len(timings) / elapsed, 1),
+            }
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(payload + "\n")
+            self.stderr.write(f"Результаты записаны в {options['output']}")
+        else:
+            self.stdout.write(payload)
+
+    def _query(self, options) -> str:
+        params = {}
+        if options["cold"]:
+            params["nocache"] = next(self.nonce)
+        return urlencode(params)
+
+    def _check(self, path: str, status_code: int) -> None:
+        if status_code != 200:
+            raise CommandError(f"{path} вернул {status_code}")
+
+    def _run_wsgi(self, path: str, token: str, total: int, options) -> tuple[list[float], float]:
+        """``total`` requests from ``concurrency`` threads, like a threaded WSGI server."""
+
+        if not total:
+            return [], 0.0
+        application = get_wsgi_application()
+
+        def request(_):
+            started = time.perf_counter()
+            self._check(path, _wsgi_get(application, path, self._query(options), token))
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            timings = list(executor.map(request, range(total)))
+        return timings, time.perf_counter() - started
+
+    def _run_asgi(self, path: str, token: str, total: int, options) -> tuple[list[float], float]:
+        """``total`` requests from ``concurrency`` clients on one event loop, like an ASGI server worker."""
+
+        if not total:
+            return [], 0.0
+        application = get_asgi_application()
+        timings = []
+
+        async def client(share: int):
+            for _ in range(share):
+                started = time.perf_counter()
+                self._check(path, await _asgi_get(application, path, self._query(options), token))
+                timings.append((time.perf_counter() - started) * 1000)
+
+        async def main():
+            clients = options["concurrency"]
+            await asyncio.gather(*(client(total // clients + (idx < total % clients)) for idx in range(clients)))
+
+        started = time.perf_counter()
+        asyncio.run(main())
+        return timings, time.perf_counter() - started
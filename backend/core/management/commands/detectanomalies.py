@@ -0,0 +1,50 @@
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.anomalies import DEFAULT_THRESHOLD, MIN_PRIOR_YEARS, detect_anomalies
+from core.models import Anomaly, Meter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Ищет аномалии потребления: всплески, нулевые месяцы и отрицательные приращения показаний"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Имя пользователя; по умолчанию все счётчики")
+        parser.add_argument(
+            "--since", type=date.fromisoformat, help="Обновить находки начиная с месяца даты YYYY-MM-DD"
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Порог робастной z-оценки для всплеска"
+        )
+        parser.add_argument(
+            "--min-years", type=int, default=MIN_PRIOR_YEARS, help="Лет истории того же месяца для оценки"
+        )
+
+    def handle(self, *args, **options):
+        meters = None
+        if options["owner"]:
+            try:
+                owner = User.objects.get(username=options["owner"])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+            meters = Meter.objects.filter(property__owner=owner)
+        if options["threshold"] <= 0 or options["min_years"] < 1:
+            raise CommandError("Порог и число лет должны быть положительными")
+        since = (options["since"].year, options["since"].month) if options["since"] else None
+
+        started = time.perf_counter()
+        result = detect_anomalies(meters, since=since, threshold=options["threshold"], min_years=options["min_years"])
+        elapsed = time.perf_counter() - started
+
+        labels = dict(Anomaly.KIND_CHOICES)
+        found = ", ".join(f"{labels[kind].lower()}: {count}" for kind, count in result["anomalies"].items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Счётчиков: {result['meters']}, показаний: {result['readings']}; {found} ({elapsed:.1f} с)"
+            )
+        )
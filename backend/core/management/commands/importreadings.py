@@ -0,0 +1,56 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import ImportFormatError, import_readings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Импортирует показания из CSV (meter или serial_number, value, reading_date) пакетами по транзакциям"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV-файл с показаниями, «-» — стандартный ввод")
+        parser.add_argument("--owner", help="Имя пользователя: принимать показания только его счётчиков")
+        parser.add_argument(
+            "--chunk-size", type=int, help="Строк на транзакцию (по умолчанию READINGS_IMPORT_CHUNK_SIZE)"
+        )
+        parser.add_argument("--encoding", default="utf-8-sig", help="Кодировка файла")
+        parser.add_argument("--report", help="Записать отчёт с отклонёнными строками в JSON-файл")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+        if options["chunk_size"] is not None and options["chunk_size"] <= 0:
+            raise CommandError("Размер пакета должен быть положительным")
+
+        try:
+            if options["path"] == "-":
+                sys.stdin.reconfigure(encoding=options["encoding"], errors="replace", newline="")
+                report = import_readings(sys.stdin, owner=owner, chunk_size=options["chunk_size"])
+            else:
+                with open(options["path"], encoding=options["encoding"], errors="replace", newline="") as handle:
+                    report = import_readings(handle, owner=owner, chunk_size=options["chunk_size"])
+        except OSError as exc:
+            raise CommandError(f"Не удалось прочитать {options['path']}: {exc}")
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+
+        if options["report"]:
+            with open(options["report"], "w", encoding="utf-8") as handle:
+                json.dump(report.as_dict(), handle, ensure_ascii=False, indent=2)
+        elif options["verbosity"] >= 1:
+            for rejected in report.rejected:
+                self.stderr.write(f"Строка {rejected['line']}: {rejected['error']}")
+
+        message = f"Строк: {report.rows}, добавлено показаний: {report.created}, отклонено: {report.rejected_count}"
+        if report.rejected_count:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Пересобирает помесячные сводки владельцев по начислениям и платежам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Имя пользователя; по умолчанию все владельцы")
+
+    def handle(self, *args, **options):
+        owner_ids = None
+        if options["owner"]:
+            try:
+                owner_ids = [User.objects.get(username=options["owner"]).pk]
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        count = rebuild_rollups(owner_ids)
+        self.stdout.write(self.style.SUCCESS(f"Сводки пересобраны: {count} строк начислений"))
@@ -0,0 +1,103 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core.models import Meter, Property
+from core.services import compute_charges, flush_charge_jobs, replace_charges
+
+User = get_user_model()
+
+
+def _scope(owner_id: Optional[int], property_id: Optional[int]):
+    properties = Property.objects.all()
+    if owner_id is not None:
+        properties = properties.filter(owner_id=owner_id)
+    if property_id is not None:
+        properties = properties.filter(id=property_id)
+    return properties
+
+
+# connections inherited from the parent, which is inside a transaction while the workers run
+_inherited = []
+
+
+def _init_worker():
+    django.setup()
+    # closing them here would end the parent's session; workers exit without finalizers, so keeping them is enough
+    for connection in connections.all(initialized_only=True):
+        _inherited.append(connection)
+        del connections[connection.alias]
+
+
+def _compute_shard(owner_id, property_id, low, high, since):
+    meters = Meter.objects.filter(property__in=_scope(owner_id, property_id), id__gte=low, id__lte=high)
+    try:
+        return compute_charges(meters, since)
+    finally:
+        connections.close_all()
+
+
+def _shards(meter_ids: list[int], count: int) -> list[tuple[int, int]]:
+    """Split sorted meter ids into ``count`` contiguous id ranges of similar size."""
+
+    size = -(-len(meter_ids) // count)
+    return [(meter_ids[i], meter_ids[min(i + size, len(meter_ids)) - 1]) for i in range(0, len(meter_ids), size)]
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает MonthlyCharge по показаниям счётчиков (например, после исправления тарифов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Имя пользователя, чьи объекты пересчитываются")
+        parser.add_argument("--property", type=int, help="ID объекта")
+        parser.add_argument("--since", type=date.fromisoformat, help="Пересчитать месяцы начиная с даты YYYY-MM-DD")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Число процессов")
+
+    def handle(self, *args, **options):
+        owner_id = None
+        if options["owner"]:
+            try:
+                owner_id = User.objects.get(username=options["owner"]).pk
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+        since = options["since"].replace(day=1) if options["since"] else None
+        workers = max(1, options["workers"])
+
+        properties = _scope(owner_id, options["property"])
+        totals = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        with transaction.atomic():
+            # readings of the scope stay as they are until their charges are replaced, see apply_reading_change
+            meter_ids = list(
+                Meter.objects.select_for_update()
+                .filter(property__in=properties)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            if meter_ids:
+                # queued readings are about to be counted, their jobs must not apply them again
+                flush_charge_jobs(meter_ids)
+                shards = _shards(meter_ids, workers)
+                jobs = [(owner_id, options["property"], low, high, since) for low, high in shards]
+                if workers == 1:
+                    results = [compute_charges(Meter.objects.filter(id__in=meter_ids), since)]
+                else:
+                    with ProcessPoolExecutor(max_workers=len(shards), initializer=_init_worker) as pool:
+                        results = list(pool.map(_compute_shard, *zip(*jobs)))
+                # several meters of one property may land in different shards
+                for result in results:
+                    for key, (consumption, amount) in result.items():
+                        totals[key][0] += consumption
+                        totals[key][1] += amount
+
+            count = replace_charges(dict(totals), properties, since)
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано счётчиков: {len(meter_ids)}, строк начислений: {count}")
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import charge_queue_stats, process_charge_jobs
+
+
+class Command(BaseCommand):
+    help = "Применяет отложенные начисления по показаниям из очереди ChargeJob"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Заданий, просматриваемых за одну транзакцию")
+        parser.add_argument("--interval", type=float, default=1.0, help="Пауза при пустой очереди, секунд")
+        parser.add_argument("--once", action="store_true", help="Завершиться, когда очередь опустеет")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        processed = 0
+        try:
+            while True:
+                done = process_charge_jobs(batch_size)
+                processed += done
+                if done:
+                    if options["verbosity"] >= 2:
+                        stats = charge_queue_stats()
+                        self.stdout.write(
+                            f"Обработано заданий: {done}, в очереди: {stats['pending']}, "
+                            f"задержка: {stats['lag_seconds']} с"
+                        )
+                    continue
+                if options["once"] and not charge_queue_stats()["pending"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Обработано заданий: {processed}"))
@@ -4,11 +4,13 @@ from datetime import date, timedelta
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.db.models import Sum
 
 from core.models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
-from core.services import process_reading
+from core.services import BULK_BATCH_SIZE, ingest_readings, process_reading, rebuild_rollups
 
 User = get_user_model()
 
@@ -21,21 +23,93 @@ RESOURCE_UNIT_MAP = {
     Meter.HEATING: "Гкал",
 }
 
+METER_PREFIXES = {
+    Meter.ELECTRICITY: "ELX",
+    Meter.COLD_WATER: "CWX",
+    Meter.HOT_WATER: "HWX",
+    Meter.GAS: "GSX",
+    Meter.HEATING: "HTX",
+}
+
+# readings passed to ingest_readings at once in fast mode
+FAST_CHUNK_SIZE = 20000
+
 
 class Command(BaseCommand):
     help = "Создает тестовые данные с пользователем 'test' и реалистичными сценариями"
 
     def add_arguments(self, parser):
         parser.add_argument("--months", type=int, default=36, help="Глубина истории в месяцах")
+        parser.add_argument("--users", type=int, default=1, help="Количество пользователей: test, test2, test3, ...")
+        parser.add_argument("--prefix", default="test", help="Имя первого пользователя и префикс остальных")
+        parser.add_argument(
+            "--properties-per-user", type=int, help="Объектов на пользователя (по умолчанию 6 демонстрационных)"
+        )
+        parser.add_argument(
+            "--meters-per-property", type=int, help="Счётчиков на объект (по умолчанию набор ресурсов объекта)"
+        )
+        parser.add_argument("--seed", type=int, help="Начальное значение генератора для воспроизводимых данных")
+        parser.add_argument(
+            "--fast", action="store_true", help="Сгенерировать историю в памяти и записать её пакетами"
+        )
 
     def handle(self, *args, **options):
         months = options["months"]
-        user, _ = User.objects.get_or_create(username="test", defaults={"email": "test@example.com"})
-        user.set_password("test1234")
-        user.save()
+        self.rng = random.Random(options["seed"])
+        users = self._ensure_users(options["prefix"], max(1, options["users"]))
+        names = ", ".join(user.username for user in users[:3]) + (" ..." if len(users) > 3 else "")
+        self.stdout.write(self.style.SUCCESS(f"Пользователи готовы: {names}"))
+
+        profiles = self._property_profiles(months, options["properties_per_user"], options["meters_per_property"])
+        self._ensure_tariffs()
+
+        if options["fast"]:
+            self._seed_fast(users, profiles)
+            return
 
-        self.stdout.write(self.style.SUCCESS("Пользователь test готов"))
+        property_objects = []
+        for user in users:
+            for payload in profiles:
+                prop, _ = Property.objects.get_or_create(
+                    owner=user,
+                    name=payload["name"],
+                    defaults={"address": payload["address"]},
+                )
+                prop.address = payload["address"]
+                prop.save()
+                property_objects.append({**payload, "instance": prop})
+
+        for profile in property_objects:
+            for meter in self._ensure_meters(profile):
+                if meter.readings.exists():
+                    continue
+                self._seed_readings_for_meter(meter, profile["history_months"], profile["usage_factor"])
 
+        self.stdout.write(self.style.SUCCESS("История показаний и начислений создана"))
+
+        for profile in property_objects:
+            self._ensure_payments(profile["instance"])
+
+        self.stdout.write(self.style.SUCCESS("Платежи созданы"))
+
+    def _ensure_users(self, prefix: str, count: int) -> list:
+        usernames = [prefix] + [f"{prefix}{number}" for number in range(2, count + 1)]
+        # hashing is deliberately slow, so all test users share one hash
+        password = make_password("test1234")
+        existing = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        User.objects.filter(username__in=existing).update(password=password)
+        User.objects.bulk_create(
+            [
+                User(username=username, email=f"{username}@example.com", password=password)
+                for username in usernames
+                if username not in existing
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        return [users[username] for username in usernames]
+
+    def _property_profiles(self, months: int, count=None, meters_per_property=None) -> list[dict]:
         property_payloads = [
             {
                 "name": "Эко-лофт у канала",
@@ -87,25 +161,29 @@ class Command(BaseCommand):
             },
         ]
 
-        property_objects = []
-        for payload in property_payloads:
-            prop, _ = Property.objects.get_or_create(
-                owner=user,
-                name=payload["name"],
-                defaults={"address": payload["address"]},
-            )
-            prop.address = payload["address"]
-            prop.save()
-            property_objects.append(
+        profiles = []
+        for number in range(len(property_payloads) if count is None else count):
+            payload = property_payloads[number % len(property_payloads)]
+            name = payload["name"]
+            if number >= len(property_payloads):
+                name = f"{name} №{number // len(property_payloads) + 1}"
+            resources = payload["resources"]
+            if meters_per_property is not None:
+                pool = resources + [resource for resource in METER_PREFIXES if resource not in resources]
+                resources = [pool[idx % len(pool)] for idx in range(meters_per_property)]
+            profiles.append(
                 {
-                    "instance": prop,
-                    "resources": payload["resources"],
+                    "name": name,
+                    "address": payload["address"],
+                    "resources": resources,
                     "usage_factor": payload.get("usage_factor", Decimal("1")),
                     "history_months": max(payload.get("history_months", months), 12),
                     "installed_days_ago": payload.get("installed_days_ago", 365),
                 }
             )
+        return profiles
 
+    def _ensure_tariffs(self) -> None:
         today = date.today()
         tariff_schedule = [
             {
@@ -140,42 +218,109 @@ class Command(BaseCommand):
                     defaults={"value_per_unit": value, "valid_to": snapshot["valid_to"]},
                 )
 
-        meter_sets = {
-            Meter.ELECTRICITY: "ELX",
-            Meter.COLD_WATER: "CWX",
-            Meter.HOT_WATER: "HWX",
-            Meter.GAS: "GSX",
-            Meter.HEATING: "HTX",
-        }
+    def _meter_defaults(self, prop: Property, profile: dict) -> list[tuple[str, dict]]:
+        """Serial numbers and field values of the meters of ``prop``."""
 
-        for profile in property_objects:
-            prop = profile["instance"]
-            meters = []
-            for idx, resource in enumerate(profile["resources"], start=1):
-                prefix = meter_sets[resource]
-                meter, _ = Meter.objects.get_or_create(
-                    property=prop,
-                    resource_type=resource,
-                    defaults={
-                        "unit": RESOURCE_UNIT_MAP[resource],
-                        "serial_number": f"{prefix}-{prop.id:02d}-{idx:02d}",
-                        "installed_at": date.today() - timedelta(days=profile["installed_days_ago"] + idx * 11),
-                        "is_active": True,
-                    },
-                )
-                meters.append(meter)
+        meters = []
+        for idx, resource in enumerate(profile["resources"], start=1):
+            serial_number = f"{METER_PREFIXES[resource]}-{prop.id:02d}-{idx:02d}"
+            defaults = {
+                "resource_type": resource,
+                "unit": RESOURCE_UNIT_MAP[resource],
+                "installed_at": date.today() - timedelta(days=profile["installed_days_ago"] + idx * 11),
+                "is_active": True,
+            }
+            meters.append((serial_number, defaults))
+        return meters
 
-            for meter in meters:
-                if meter.readings.exists():
-                    continue
-                self._seed_readings_for_meter(meter, profile["history_months"], profile["usage_factor"])
+    def _ensure_meters(self, profile: dict) -> list[Meter]:
+        prop = profile["instance"]
+        return [
+            Meter.objects.get_or_create(property=prop, serial_number=serial_number, defaults=defaults)[0]
+            for serial_number, defaults in self._meter_defaults(prop, profile)
+        ]
 
-        self.stdout.write(self.style.SUCCESS("История показаний и начислений создана"))
+    def _seed_fast(self, users: list, profiles: list[dict]) -> None:
+        """Create the same data set as the regular mode with bulk writes.
 
-        for profile in property_objects:
-            self._ensure_payments(profile["instance"])
+        Properties and meters are inserted in batches, the reading history is
+        generated in memory and stored through ``ingest_readings`` in large chunks,
+        so charges follow the usual rules. Payments are inserted in bulk and the
+        owner rollups are rebuilt once at the end.
+        """
 
-        self.stdout.write(self.style.SUCCESS("Платежи созданы"))
+        existing = {
+            (prop.owner_id, prop.name): prop for prop in Property.objects.filter(owner__in=users).order_by("id")
+        }
+        missing = [
+            Property(owner=user, name=profile["name"], address=profile["address"])
+            for user in users
+            for profile in profiles
+            if (user.id, profile["name"]) not in existing
+        ]
+        Property.objects.bulk_create(missing, batch_size=BULK_BATCH_SIZE)
+        existing.update({(prop.owner_id, prop.name): prop for prop in missing})
+        plan = [(existing[(user.id, profile["name"])], profile) for user in users for profile in profiles]
+
+        meters = {
+            (meter.property_id, meter.serial_number): meter
+            for meter in Meter.objects.filter(property__owner__in=users)
+        }
+        missing = [
+            Meter(property=prop, serial_number=serial_number, **defaults)
+            for prop, profile in plan
+            for serial_number, defaults in self._meter_defaults(prop, profile)
+            if (prop.id, serial_number) not in meters
+        ]
+        Meter.objects.bulk_create(missing, batch_size=BULK_BATCH_SIZE)
+        meters.update({(meter.property_id, meter.serial_number): meter for meter in missing})
+        seeded = set(
+            Reading.objects.filter(meter__property__owner__in=users).values_list("meter_id", flat=True).distinct()
+        )
+
+        created = 0
+        items = []
+        for prop, profile in plan:
+            for serial_number, _ in self._meter_defaults(prop, profile):
+                meter = meters[(prop.id, serial_number)]
+                if meter.id in seeded:
+                    continue
+                meter.property = prop
+                items.extend(
+                    {"meter": meter, "value": value, "reading_date": reading_date}
+                    for reading_date, value in self._history(
+                        profile["history_months"], profile["usage_factor"], meter.resource_type
+                    )
+                )
+                if len(items) >= FAST_CHUNK_SIZE:
+                    created += len(ingest_readings(items))
+                    items = []
+        created += len(ingest_readings(items))
+        self.stdout.write(self.style.SUCCESS(f"История показаний и начислений создана: {created} показаний"))
+
+        with transaction.atomic():
+            paid = set(Payment.objects.filter(property__owner__in=users).values_list("property_id", "year", "month"))
+            charges = (
+                MonthlyCharge.objects.filter(property__owner__in=users)
+                .values("property_id", "year", "month")
+                .annotate(total_amount=Sum("amount"))
+                .order_by("property_id", "year", "month")
+            )
+            payments = [
+                Payment(
+                    property_id=charge["property_id"],
+                    year=charge["year"],
+                    month=charge["month"],
+                    amount=Decimal(charge["total_amount"]) * Decimal("0.95"),
+                    paid_at=date(charge["year"], charge["month"], 10),
+                    comment="Автогенерация демо-платежей",
+                )
+                for charge in charges.iterator()
+                if (charge["property_id"], charge["year"], charge["month"]) not in paid
+            ]
+            Payment.objects.bulk_create(payments, batch_size=BULK_BATCH_SIZE)
+            rebuild_rollups([user.id for user in users])
+        self.stdout.write(self.style.SUCCESS(f"Платежи созданы: {len(payments)}"))
 
     def _monthly_usage(self, resource_type: str, month: int, usage_factor: Decimal) -> Decimal:
         winter = {12, 1, 2}
@@ -197,7 +342,7 @@ class Command(BaseCommand):
             Meter.HEATING: Decimal("1.3"),
         }.get(resource_type, Decimal("12"))
 
-        jitter = Decimal(str(random.uniform(-0.25, 0.3)))
+        jitter = Decimal(str(self.rng.uniform(-0.25, 0.3)))
         return (base * seasonal_multiplier * (Decimal("1") + jitter)) * usage_factor
 
     def _shift_month(self, year: int, month: int, delta: int) -> tuple[int, int]:
@@ -206,26 +351,29 @@ class Command(BaseCommand):
         new_month = (new_month_index % 12) + 1
         return new_year, new_month
 
-    def _seed_readings_for_meter(self, meter: Meter, months: int, usage_factor: Decimal) -> None:
+    def _history(self, months: int, usage_factor: Decimal, resource_type: str) -> list[tuple[date, Decimal]]:
+        """Monthly end-of-month readings of one meter for the last ``months`` months."""
+
         today = date.today().replace(day=1)
         start_year, start_month = self._shift_month(today.year, today.month, -months)
-        reading_value = (Decimal(random.uniform(18, 140)) * usage_factor).quantize(Decimal("0.001"))
+        reading_value = (Decimal(self.rng.uniform(18, 140)) * usage_factor).quantize(Decimal("0.001"))
 
+        history = []
         current_year = start_year
         current_month = start_month
         for _ in range(months):
-            monthly_delta = self._monthly_usage(meter.resource_type, current_month, usage_factor)
+            monthly_delta = self._monthly_usage(resource_type, current_month, usage_factor)
             reading_value += monthly_delta
             last_day = monthrange(current_year, current_month)[1]
-            reading_date = date(current_year, current_month, last_day)
-            reading = Reading.objects.create(
-                meter=meter,
-                value=reading_value.quantize(Decimal("0.001")),
-                reading_date=reading_date,
-            )
-            process_reading(reading)
+            history.append((date(current_year, current_month, last_day), reading_value.quantize(Decimal("0.001"))))
 
             current_year, current_month = self._shift_month(current_year, current_month, 1)
+        return history
+
+    def _seed_readings_for_meter(self, meter: Meter, months: int, usage_factor: Decimal) -> None:
+        for reading_date, value in self._history(months, usage_factor, meter.resource_type):
+            reading = Reading.objects.create(meter=meter, value=value, reading_date=reading_date)
+            process_reading(reading)
 
     def _ensure_payments(self, property_obj: Property) -> None:
         charges = (
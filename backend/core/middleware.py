@@ -0,0 +1,164 @@
+import json
+import logging
+import time
+import traceback
+from contextlib import ExitStack
+from pathlib import Path
+
+import django
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("core.timing")
+
+_THIS_FILE = str(Path(__file__).resolve())
+_DJANGO_DIR = str(Path(django.__file__).resolve().parent)
+_BASE_DIR = str(Path(settings.BASE_DIR).resolve())
+
+
+class QueryStats:
+    """``execute_wrapper`` hook counting queries and their time for one request."""
+
+    def __init__(self, slow_threshold_ms: float) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.slow_threshold_ms = slow_threshold_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.slow_threshold_ms and elapsed * 1000 >= self.slow_threshold_ms:
+                logger.warning(
+                    "slow query %.1f ms at %s: %s", elapsed * 1000, _call_site(), sql, extra={"params": params}
+                )
+
+
+def _call_site() -> str:
+    """Innermost frame outside Django itself and this module, e.g. a service or a DRF mixin."""
+
+    for frame in reversed(traceback.extract_stack()):
+        filename = str(Path(frame.filename).resolve())
+        if filename == _THIS_FILE or filename.startswith(_DJANGO_DIR):
+            continue
+        # a virtualenv may live inside the project directory
+        if "site-packages" in filename:
+            filename = filename.rsplit("site-packages", 1)[1].lstrip("/\\")
+        elif filename.startswith(_BASE_DIR):
+            filename = str(Path(filename).relative_to(_BASE_DIR))
+        return f"{filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def _view_name(view_func) -> str:
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if view_class is None:
+        return getattr(view_func, "__qualname__", repr(view_func))
+    return view_class.__name__
+
+
+class RequestTimingMiddleware:
+    """Measure DB, view and render time of every request.
+
+    Queries on all connections are counted through ``execute_wrapper``. The totals
+    go to a ``Server-Timing`` header (``REQUEST_TIMING_HEADER``) and, with
+    ``REQUEST_TIMING_LOG``, to one JSON line per request in the ``core.timing``
+    logger. Queries slower than ``SLOW_QUERY_MS`` are logged with their call site.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = self._start(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self._wrap_queries(stack, stats)
+            response = self.get_response(request)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = self._start(request)
+        started = time.perf_counter()
+        # the async ORM runs queries in the request's sync thread, so the hooks go on its connections
+        with ExitStack() as stack:
+            await sync_to_async(self._wrap_queries)(stack, stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _start(self, request) -> QueryStats:
+        request._timing = {"view": None, "action": None, "view_done": None, "render_done": None}
+        return QueryStats(getattr(settings, "SLOW_QUERY_MS", 0))
+
+    @staticmethod
+    def _wrap_queries(stack: ExitStack, stats: QueryStats) -> None:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def _finish(self, request, response, stats: QueryStats, total: float):
+        timing = request._timing
+        render = 0.0
+        if timing["view_done"] is not None and timing["render_done"] is not None:
+            render = timing["render_done"] - timing["view_done"]
+        app = max(total - render - stats.duration, 0.0)
+
+        if getattr(settings, "REQUEST_TIMING_HEADER", True):
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                    f"app;dur={app * 1000:.1f}",
+                    f"render;dur={render * 1000:.1f}",
+                    f"total;dur={total * 1000:.1f}",
+                ]
+            )
+        if getattr(settings, "REQUEST_TIMING_LOG", False) and timing["view"] is not None:
+            logger.info(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": timing["view"],
+                        "action": timing["action"],
+                        "status": response.status_code,
+                        "queries": stats.count,
+                        "db_ms": round(stats.duration * 1000, 1),
+                        "app_ms": round(app * 1000, 1),
+                        "render_ms": round(render * 1000, 1),
+                        "total_ms": round(total * 1000, 1),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing["view"] = _view_name(view_func)
+        actions = getattr(view_func, "actions", None)
+        if actions:
+            request._timing["action"] = actions.get(request.method.lower())
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns
+        timing = request._timing
+        timing["view_done"] = time.perf_counter()
+
+        def rendered(response):
+            timing["render_done"] = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["property", "year", "month"], name="payment_property_period_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reading",
+            index=models.Index(fields=["meter", "reading_date", "created_at", "value"], name="reading_meter_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tariff",
+            index=models.Index(fields=["resource_type", "valid_from"], name="tariff_resource_from_idx"),
+        ),
+    ]
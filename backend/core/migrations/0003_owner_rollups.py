@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rollups(apps, schema_editor):
+    # same grouping as core.services.rebuild_rollups, with the historical models
+    MonthlyCharge = apps.get_model("core", "MonthlyCharge")
+    Payment = apps.get_model("core", "Payment")
+    OwnerMonthlyRollup = apps.get_model("core", "OwnerMonthlyRollup")
+    OwnerPaymentRollup = apps.get_model("core", "OwnerPaymentRollup")
+
+    OwnerMonthlyRollup.objects.bulk_create(
+        [
+            OwnerMonthlyRollup(
+                owner_id=row["property__owner_id"],
+                year=row["year"],
+                month=row["month"],
+                resource_type=row["resource_type"],
+                consumption=row["total_consumption"],
+                amount=row["total_amount"],
+                properties_count=row["properties_count"],
+            )
+            for row in MonthlyCharge.objects.values("property__owner_id", "year", "month", "resource_type")
+            .annotate(
+                total_consumption=Sum("consumption"),
+                total_amount=Sum("amount"),
+                properties_count=Count("property_id", distinct=True),
+            )
+            .order_by()
+        ],
+        batch_size=1000,
+    )
+    OwnerPaymentRollup.objects.bulk_create(
+        [
+            OwnerPaymentRollup(
+                owner_id=row["property__owner_id"], year=row["year"], month=row["month"], amount=row["total"]
+            )
+            for row in Payment.objects.values("property__owner_id", "year", "month")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_composite_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OwnerMonthlyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("year", models.IntegerField()),
+                ("month", models.IntegerField()),
+                ("resource_type", models.CharField(choices=[("electricity", "Электричество"), ("cold_water", "Холодная вода"), ("hot_water", "Горячая вода"), ("gas", "Газ"), ("heating", "Отопление")], max_length=50)),
+                ("consumption", models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ("amount", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("properties_count", models.PositiveIntegerField(default=0)),
+                ("owner", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="monthly_rollups", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "ordering": ["year", "month"],
+                "unique_together": {("owner", "year", "month", "resource_type")},
+            },
+        ),
+        migrations.CreateModel(
+            name="OwnerPaymentRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("year", models.IntegerField()),
+                ("month", models.IntegerField()),
+                ("amount", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("owner", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="payment_rollups", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "ordering": ["year", "month"],
+                "unique_together": {("owner", "year", "month")},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_owner_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChargeJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("meter", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="charge_jobs", to="core.meter")),
+                ("reading", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="charge_job", to="core.reading")),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_charge_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Anomaly",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("year", models.IntegerField()),
+                ("month", models.IntegerField()),
+                ("kind", models.CharField(choices=[("spike", "Всплеск потребления"), ("zero", "Нулевое потребление"), ("negative", "Отрицательная дельта")], max_length=20)),
+                ("consumption", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("baseline", models.DecimalField(blank=True, decimal_places=3, max_digits=14, null=True)),
+                ("score", models.FloatField(blank=True, null=True)),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+                ("meter", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="anomalies", to="core.meter")),
+                ("reading", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="anomalies", to="core.reading")),
+            ],
+            options={
+                "ordering": ["-year", "-month", "id"],
+                "unique_together": {("meter", "year", "month", "kind")},
+            },
+        ),
+    ]
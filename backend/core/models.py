@@ -46,6 +46,9 @@ class Tariff(models.Model):
 
     class Meta:
         ordering = ["-valid_from"]
+        indexes = [
+            models.Index(fields=["resource_type", "valid_from"], name="tariff_resource_from_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.get_resource_type_display()} ({self.valid_from} - {self.valid_to or '∞'})"
@@ -59,6 +62,10 @@ class Reading(models.Model):
 
     class Meta:
         ordering = ["-reading_date", "-created_at"]
+        indexes = [
+            # previous-reading lookups scan it backwards; value makes it covering
+            models.Index(fields=["meter", "reading_date", "created_at", "value"], name="reading_meter_date_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.meter} {self.value} ({self.reading_date})"
@@ -92,6 +99,81 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ["-paid_at", "-created_at"]
+        indexes = [
+            models.Index(fields=["property", "year", "month"], name="payment_property_period_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.property} платеж за {self.month}.{self.year}"
+
+
+class OwnerMonthlyRollup(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="monthly_rollups")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    resource_type = models.CharField(max_length=50, choices=Meter.RESOURCE_CHOICES)
+    consumption = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    properties_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("owner", "year", "month", "resource_type")
+        ordering = ["year", "month"]
+
+    def __str__(self) -> str:
+        return f"{self.owner} {self.month}.{self.year} {self.get_resource_type_display()}"
+
+
+class OwnerPaymentRollup(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="payment_rollups")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("owner", "year", "month")
+        ordering = ["year", "month"]
+
+    def __str__(self) -> str:
+        return f"{self.owner} платежи за {self.month}.{self.year}"
+
+
+class ChargeJob(models.Model):
+    reading = models.OneToOneField(Reading, on_delete=models.CASCADE, related_name="charge_job")
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name="charge_jobs")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"Начисление по показанию {self.reading_id}"
+
+
+class Anomaly(models.Model):
+    SPIKE = "spike"
+    ZERO = "zero"
+    NEGATIVE = "negative"
+
+    KIND_CHOICES = [
+        (SPIKE, "Всплеск потребления"),
+        (ZERO, "Нулевое потребление"),
+        (NEGATIVE, "Отрицательная дельта"),
+    ]
+
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name="anomalies")
+    reading = models.ForeignKey(Reading, on_delete=models.CASCADE, related_name="anomalies")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    consumption = models.DecimalField(max_digits=14, decimal_places=3)
+    baseline = models.DecimalField(max_digits=14, decimal_places=3, null=True, blank=True)
+    score = models.FloatField(null=True, blank=True)
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("meter", "year", "month", "kind")
+        ordering = ["-year", "-month", "id"]
+
+    def __str__(self) -> str:
+        return f"{self.meter} {self.month}.{self.year}: {self.get_kind_display()}"
@@ -0,0 +1,147 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a composite, unique ordering.
+
+    The cursor stores the ordering values of the boundary row, and every page is
+    fetched with a lexicographic ``WHERE`` on those values, so deep pages cost the
+    same as the first one. Pagination is opt-in: without ``cursor`` or
+    ``page_size`` in the query string the whole list is returned as before.
+    """
+
+    ordering: tuple[str, ...] = ()
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Некорректный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.model = queryset.model
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(queryset.model, params.get(self.cursor_query_param))
+
+        ordering = self._ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        return self._link(False, self.last_row)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_row is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(True, self.first_row)
+
+    def decode_cursor(self, model, encoded):
+        if not encoded:
+            return False, None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            reverse = bool(payload["r"])
+            raw_values = payload["p"]
+            if len(raw_values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(name.lstrip("-")).to_python(raw)
+                for name, raw in zip(self.ordering, raw_values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, reverse, row):
+        values = []
+        for name in self.ordering:
+            field = self.model._meta.get_field(name.lstrip("-"))
+            # pages of a .values() queryset hold dicts
+            value = row[field.name] if isinstance(row, dict) else getattr(row, field.attname)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        payload = json.dumps({"r": int(reverse), "p": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+
+    def _link(self, reverse, row):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(reverse, row))
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return list(self.ordering)
+        return [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+
+    def _after(self, ordering, position):
+        conditions = []
+        for idx, name in enumerate(ordering):
+            field = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") else "gt"
+            equal = {ordering[i].lstrip("-"): position[i] for i in range(idx)}
+            conditions.append(Q(**equal, **{f"{field}__{lookup}": position[idx]}))
+        return reduce(or_, conditions)
+
+
+class ReadingPagination(KeysetPagination):
+    ordering = ("-reading_date", "-created_at", "id")
+
+
+class MonthlyChargePagination(KeysetPagination):
+    ordering = ("year", "month", "id")
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ("-paid_at", "-created_at", "id")
+
+
+class AnomalyPagination(KeysetPagination):
+    ordering = ("-year", "-month", "id")
@@ -0,0 +1,150 @@
+from datetime import date
+from decimal import Context, Decimal
+from typing import Callable, Iterable, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib renderer is used without it
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` producing the same bytes through ``orjson`` when it is installed.
+
+    Indented output (browsable API, ``indent=`` in Accept), non-default JSON
+    settings and data ``orjson`` refuses fall back to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # datetimes go through the DRF encoder, which trims microseconds to milliseconds
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+FAST_RENDERERS = [
+    FastJSONRenderer if renderer is JSONRenderer else renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+]
+
+
+def _decimal_converter(field: serializers.DecimalField) -> Optional[Callable]:
+    if not getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING):
+        return None
+    if field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    quantum = Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+    context = Context(prec=field.max_digits) if field.max_digits is not None else None
+
+    def convert(value):
+        return f"{value.quantize(quantum, rounding=rounding, context=context):f}"
+
+    return convert
+
+
+def _datetime_converter(field: serializers.DateTimeField) -> Optional[Callable]:
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return None
+    # resolved per response, like DateTimeField.enforce_timezone does
+    field_timezone = getattr(field, "timezone", None) or timezone.get_current_timezone()
+
+    def convert(value):
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith("+00:00"):
+            return value[:-6] + "Z"
+        return value
+
+    return convert
+
+
+def _converter(field: serializers.Field) -> Optional[Callable]:
+    """Plain function equivalent to ``field.to_representation`` for a non-null value; ``None`` keeps the value."""
+
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field) or field.to_representation
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field) or field.to_representation
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+        if output_format is not None and output_format.lower() == ISO_8601:
+            return date.isoformat
+        return field.to_representation
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: choices.get(str(value), value)
+    if type(field) in (serializers.IntegerField, serializers.ReadOnlyField):
+        return None
+    if type(field) is serializers.CharField:
+        return str
+    return field.to_representation
+
+
+class ValuesRepresentation:
+    """Serializer output computed from ``.values()`` rows instead of model instances.
+
+    Only fields backed by a plain model column are supported. Converters are
+    built once per list response, so each value costs a single function call.
+    """
+
+    def __init__(self, serializer_class: type[serializers.Serializer]) -> None:
+        self.fields = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField) or field.source == "*" or "." in field.source:
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} is not a model column")
+            self.fields.append((name, field.source, field))
+        self.lookups = [source for _, source, _ in self.fields]
+
+    def dump(self, rows: Iterable[dict]) -> list[dict]:
+        plan = [(name, source, _converter(field)) for name, source, field in self.fields]
+        result = []
+        for row in rows:
+            item = {}
+            for name, source, convert in plan:
+                value = row[source]
+                item[name] = value if convert is None or value is None else convert(value)
+            result.append(item)
+        return result
+
+
+class FastListMixin:
+    """``list`` for read-heavy endpoints: ``.values()`` rows, precompiled converters, ``FastJSONRenderer``.
+
+    The response is byte-for-byte the one ``ModelSerializer`` and ``JSONRenderer`` produce.
+    """
+
+    renderer_classes = FAST_RENDERERS
+    _representations: dict[type, ValuesRepresentation] = {}
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        representation = self._representations.get(serializer_class)
+        if representation is None:
+            representation = self._representations[serializer_class] = ValuesRepresentation(serializer_class)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*representation.lookups)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(representation.dump(page))
+        return Response(representation.dump(queryset.iterator(chunk_size=2000)))
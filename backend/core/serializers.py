@@ -1,11 +1,21 @@
 from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from .models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
-from .services import ensure_demo_data, find_tariff, get_previous_reading, process_reading
+from .demo import ensure_demo_data
+from .models import Anomaly, ChargeJob, Meter, MonthlyCharge, Payment, Property, Reading, Tariff
+from .services import (
+    ReadingState,
+    create_reading,
+    enqueue_reading,
+    find_tariff,
+    get_previous_reading,
+    ingest_readings,
+    update_reading,
+)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -68,6 +78,7 @@ class ReadingSerializer(serializers.ModelSerializer):
     unit = serializers.SerializerMethodField()
     consumption_delta = serializers.SerializerMethodField()
     amount_value = serializers.SerializerMethodField()
+    charge_pending = serializers.SerializerMethodField()
 
     class Meta:
         model = Reading
@@ -82,8 +93,17 @@ class ReadingSerializer(serializers.ModelSerializer):
             "unit",
             "consumption_delta",
             "amount_value",
+            "charge_pending",
+        ]
+        read_only_fields = [
+            "id",
+            "created_at",
+            "consumption_delta",
+            "amount_value",
+            "resource_label",
+            "unit",
+            "charge_pending",
         ]
-        read_only_fields = ["id", "created_at", "consumption_delta", "amount_value", "resource_label", "unit"]
 
     def validate_meter(self, value):
         request = self.context["request"]
@@ -92,21 +112,46 @@ class ReadingSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        reading = super().create(validated_data)
-        process_reading(reading)
+        if getattr(settings, "CHARGE_PROCESSING", "sync") == "deferred":
+            reading = enqueue_reading(validated_data)
+            reading.charge_pending = True
+        else:
+            reading = create_reading(validated_data)
+            reading.charge_pending = False
         return reading
 
+    def update(self, instance, validated_data):
+        previous = ReadingState.of(instance)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # the annotation describes the reading before the update
+        instance.__dict__.pop("previous_value", None)
+        reading = update_reading(instance, previous)
+        reading.charge_pending = False
+        return reading
+
+    def get_charge_pending(self, obj):
+        if hasattr(obj, "charge_pending"):
+            return obj.charge_pending
+        return ChargeJob.objects.filter(reading_id=obj.pk).exists()
+
     def get_unit(self, obj):
         return obj.meter.unit
 
     def get_resource_label(self, obj):
         return obj.meter.get_resource_type_display()
 
-    def get_consumption_delta(self, obj):
+    def _previous_value(self, obj):
+        if hasattr(obj, "previous_value"):
+            return obj.previous_value
         previous = get_previous_reading(obj.meter, obj.reading_date)
-        if not previous:
+        return previous.value if previous else None
+
+    def get_consumption_delta(self, obj):
+        previous_value = self._previous_value(obj)
+        if previous_value is None:
             return None
-        delta = obj.value - previous.value
+        delta = obj.value - previous_value
         if delta <= 0:
             return None
         return float(delta)
@@ -121,6 +166,35 @@ class ReadingSerializer(serializers.ModelSerializer):
         return float(tariff.value_per_unit * Decimal(str(delta)))
 
 
+class ReadingBulkListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        request = self.context["request"]
+        meter_ids = {item["meter"] for item in attrs}
+        meters = (
+            Meter.objects.select_related("property").filter(id__in=meter_ids, property__owner=request.user).in_bulk()
+        )
+        foreign = sorted(meter_ids - meters.keys())
+        if foreign:
+            raise serializers.ValidationError(
+                f"Нельзя добавлять показания к чужому счетчику: {', '.join(map(str, foreign))}"
+            )
+        for item in attrs:
+            item["meter"] = meters[item["meter"]]
+        return attrs
+
+    def create(self, validated_data):
+        return ingest_readings(validated_data)
+
+
+class ReadingBulkSerializer(serializers.Serializer):
+    meter = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=12, decimal_places=3)
+    reading_date = serializers.DateField()
+
+    class Meta:
+        list_serializer_class = ReadingBulkListSerializer
+
+
 class MonthlyChargeSerializer(serializers.ModelSerializer):
     class Meta:
         model = MonthlyCharge
@@ -150,6 +224,13 @@ class PaymentSerializer(serializers.ModelSerializer):
         return value
 
 
+class AnomalySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Anomaly
+        fields = ["id", "meter", "reading", "year", "month", "kind", "consumption", "baseline", "score", "detected_at"]
+        read_only_fields = fields
+
+
 class LoginSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -1,12 +1,33 @@
-from calendar import monthrange
-from datetime import date, timedelta
+from collections import defaultdict
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Iterable, NamedTuple, Optional
 
-from django.db import transaction
-from django.db.models import Q, Sum
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, DenseRank
+from django.utils import timezone
 
-from .models import Meter, MonthlyCharge, Property, Reading, Tariff
+from .caching import bump_owner_versions, bump_property_owners
+from .forecasting import invalidate_forecasts
+from .models import (
+    ChargeJob,
+    Meter,
+    MonthlyCharge,
+    OwnerMonthlyRollup,
+    OwnerPaymentRollup,
+    Payment,
+    Property,
+    Reading,
+    Tariff,
+)
+from .tariffs import tariff_index
+
+BULK_BATCH_SIZE = 1000
+AMOUNT_QUANTUM = Decimal("0.01")
+
+ChargeKey = tuple[int, int, int, str]
+RollupKey = tuple[int, int, int, str]
 
 
 def get_previous_reading(meter: Meter, reading_date: date) -> Optional[Reading]:
@@ -17,316 +38,683 @@ def get_previous_reading(meter: Meter, reading_date: date) -> Optional[Reading]:
     )
 
 
-def find_tariff(resource_type: str, target_date: date) -> Optional[Tariff]:
-    return (
-        Tariff.objects.filter(
-            resource_type=resource_type,
-            valid_from__lte=target_date,
-        )
-        .filter(Q(valid_to__isnull=True) | Q(valid_to__gte=target_date))
-        .order_by("-valid_from")
-        .first()
+def with_charge_details(queryset):
+    """Annotate readings with the previous value and pending charges, and join their meters.
+
+    The previous value is a correlated subquery evaluated per returned row, so it
+    stays correct for filtered or paginated querysets and needs no extra queries.
+    Tariffs are resolved in memory through the tariff index.
+    """
+
+    previous = Reading.objects.filter(
+        meter=OuterRef("meter"),
+        reading_date__lt=OuterRef("reading_date"),
+    ).order_by("-reading_date", "-created_at")
+    return queryset.select_related("meter").annotate(
+        previous_value=Subquery(previous.values("value")[:1]),
+        charge_pending=Exists(ChargeJob.objects.filter(reading=OuterRef("pk"))),
     )
 
 
+def find_tariff(resource_type: str, target_date: date) -> Optional[Tariff]:
+    return tariff_index.lookup(resource_type, target_date)
+
+
+class ReadingState(NamedTuple):
+    """Snapshot of the fields of a reading that charges depend on."""
+
+    pk: int
+    meter_id: int
+    reading_date: date
+    created_at: datetime
+    value: Decimal
+
+    @classmethod
+    def of(cls, reading: Reading) -> "ReadingState":
+        return cls(reading.pk, reading.meter_id, reading.reading_date, reading.created_at, reading.value)
+
+    @property
+    def order(self) -> tuple:
+        return (self.reading_date, self.created_at, self.pk)
+
+
+def _walk_charges(meter: Meter, rows: list[tuple[date, tuple, Decimal]], anchor: Optional[Decimal]) -> dict:
+    """Charge contributions of ``rows`` (date, order key, value) of one meter sorted by date and order key.
+
+    Each reading is charged for the growth since the latest reading of an earlier
+    date; ``anchor`` is the value of the latest reading before the first row.
+    """
+
+    contributions: dict[ChargeKey, list[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    previous_value = anchor
+    current_date = None
+    last_value = None
+    for reading_date, _, value in rows:
+        if reading_date != current_date:
+            if current_date is not None:
+                previous_value = last_value
+            current_date = reading_date
+        last_value = value
+        if previous_value is None:
+            continue
+
+        delta = value - previous_value
+        if delta <= 0:
+            continue
+        tariff = find_tariff(meter.resource_type, reading_date)
+        if tariff is None:
+            continue
+
+        totals = contributions[(meter.property_id, reading_date.year, reading_date.month, meter.resource_type)]
+        totals[0] += delta
+        # the stored amount is rounded after every reading
+        totals[1] += (delta * tariff.value_per_unit).quantize(AMOUNT_QUANTUM)
+    return contributions
+
+
+def _subtract(after: dict, before: dict) -> dict[ChargeKey, list[Decimal]]:
+    increments = {}
+    for key in after.keys() | before.keys():
+        new = after.get(key, (Decimal("0"), Decimal("0")))
+        old = before.get(key, (Decimal("0"), Decimal("0")))
+        diff = [new[0] - old[0], new[1] - old[1]]
+        if diff[0] or diff[1]:
+            increments[key] = diff
+    return increments
+
+
 @transaction.atomic
-def process_reading(reading: Reading) -> None:
-    previous = get_previous_reading(reading.meter, reading.reading_date)
-    delta = Decimal("0")
-    if previous:
-        delta = reading.value - previous.value
-        if delta < 0:
-            delta = Decimal("0")
-
-    tariff = find_tariff(reading.meter.resource_type, reading.reading_date)
-    if tariff is None or delta <= 0:
+def apply_reading_change(old: Optional[ReadingState], new: Optional[ReadingState]) -> None:
+    """Correct MonthlyCharge after a reading was created (``old`` is None), updated or deleted (``new`` is None).
+
+    Only the readings whose delta can change are recomputed: those on the changed
+    dates, everything stored between them and the first date after them. Their
+    contributions before and after the change are diffed and applied as signed
+    increments.
+    """
+
+    if old and new and old.meter_id != new.meter_id:
+        apply_reading_change(old, None)
+        apply_reading_change(None, new)
         return
 
-    year = reading.reading_date.year
-    month = reading.reading_date.month
+    changed = [state for state in (old, new) if state is not None]
+    # serializes concurrent corrections of the same meter
+    meter = Meter.objects.select_for_update().select_related("property").get(pk=changed[0].meter_id)
+    pk = changed[0].pk
+    low = min(state.reading_date for state in changed)
+    high = max(state.reading_date for state in changed)
+
+    others = meter.readings.exclude(pk=pk)
+    anchor = others.filter(reading_date__lt=low).order_by("-reading_date", "-created_at").values_list(
+        "value", flat=True
+    ).first()
+    next_date = others.filter(reading_date__gt=high).order_by("reading_date").values("reading_date")[:1]
+    stored = [
+        (reading_date, (reading_date, created_at, row_pk), value)
+        for row_pk, reading_date, created_at, value in others.filter(
+            reading_date__gte=low,
+            reading_date__lte=Coalesce(Subquery(next_date), Value(high)),
+        ).values_list("pk", "reading_date", "created_at", "value")
+    ]
+
+    def contributions(state: Optional[ReadingState]) -> dict:
+        rows = stored + ([(state.reading_date, state.order, state.value)] if state else [])
+        rows.sort(key=lambda row: row[:2])
+        return _walk_charges(meter, rows, anchor)
+
+    _apply_charge_increments(_subtract(contributions(new), contributions(old)))
+    bump_owner_versions([meter.property.owner_id])
+
+
+def process_reading(reading: Reading) -> None:
+    apply_reading_change(None, ReadingState.of(reading))
+
+
+@transaction.atomic
+def create_reading(data: dict) -> Reading:
+    flush_charge_jobs([data["meter"].id])
+    reading = Reading.objects.create(**data)
+    process_reading(reading)
+    return reading
+
+
+@transaction.atomic
+def update_reading(reading: Reading, previous: ReadingState) -> Reading:
+    flush_charge_jobs({previous.meter_id, reading.meter_id})
+    reading.save()
+    apply_reading_change(previous, ReadingState.of(reading))
+    return reading
+
+
+@transaction.atomic
+def delete_reading(reading: Reading) -> None:
+    flush_charge_jobs([reading.meter_id])
+    previous = ReadingState.of(reading)
+    reading.delete()
+    apply_reading_change(previous, None)
+
+
+@transaction.atomic
+def enqueue_reading(data: dict) -> Reading:
+    """Store a reading and leave its charges to ``runchargeworker``."""
+
+    # waits for a worker busy with the meter, so it never misses a queued reading
+    Meter.objects.select_for_update().filter(pk=data["meter"].pk).exists()
+    reading = Reading.objects.create(**data)
+    ChargeJob.objects.create(reading=reading, meter_id=reading.meter_id)
+    # the reading is listed right away, before its charges are applied
+    meter = data["meter"]
+    if Meter.property.is_cached(meter):
+        bump_owner_versions([meter.property.owner_id])
+    else:
+        bump_property_owners([meter.property_id])
+    return reading
+
+
+def flush_charge_jobs(meter_ids: Iterable[int]) -> int:
+    """Lock meters for the current transaction and apply their queued readings first.
+
+    Synchronous changes compute deltas against the stored readings, which must
+    all be reflected in MonthlyCharge already.
+    """
+
+    meter_ids = sorted(set(meter_ids))
+    list(Meter.objects.select_for_update().filter(id__in=meter_ids).order_by("id").values_list("id", flat=True))
+    return _drain_charge_jobs(meter_ids)
+
+
+@transaction.atomic
+def process_charge_jobs(limit: int = BULK_BATCH_SIZE) -> int:
+    """Apply the queued readings of the meters behind the oldest ``limit`` jobs.
 
-    charge, _ = MonthlyCharge.objects.get_or_create(
-        property=reading.meter.property,
-        year=year,
-        month=month,
-        resource_type=reading.meter.resource_type,
-        defaults={"consumption": Decimal("0"), "amount": Decimal("0")},
+    All queued readings of a meter are walked together, so jobs are coalesced
+    per meter and month into one upsert per charge row. Meters locked by another
+    worker or a synchronous change are skipped. Returns the number of jobs done.
+    """
+
+    meter_ids = set(ChargeJob.objects.order_by("id").values_list("meter_id", flat=True)[:limit])
+    if not meter_ids:
+        return 0
+    locked = list(
+        Meter.objects.select_for_update(skip_locked=True)
+        .filter(id__in=meter_ids)
+        .order_by("id")
+        .values_list("id", flat=True)
     )
+    return _drain_charge_jobs(locked)
 
-    charge.consumption += delta
-    charge.amount += delta * tariff.value_per_unit
-    charge.save()
 
+def _drain_charge_jobs(meter_ids: list[int]) -> int:
+    jobs = dict(ChargeJob.objects.filter(meter_id__in=meter_ids).values_list("id", "reading_id"))
+    if not jobs:
+        return 0
+    readings = list(Reading.objects.select_related("meter__property").filter(id__in=jobs.values()))
+    _apply_charge_increments(_batch_charge_increments(readings, saved=True))
+    ChargeJob.objects.filter(id__in=jobs).delete()
+    bump_owner_versions(reading.meter.property.owner_id for reading in readings)
+    return len(jobs)
 
-def forecast_property(property_obj: Property, months: int = 3) -> Decimal:
-    today = date.today()
-    # exclude current month
-    charges = (
-        MonthlyCharge.objects.filter(property=property_obj)
-        .exclude(year=today.year, month=today.month)
-        .values("year", "month")
-        .annotate(total_amount=Sum("amount"))
-        .order_by("-year", "-month")
+
+def charge_queue_stats(owner_id: Optional[int] = None) -> dict:
+    """Queue length and age of the oldest job, for all meters or the meters of one owner."""
+
+    jobs = ChargeJob.objects.all()
+    if owner_id is not None:
+        jobs = jobs.filter(meter__property__owner_id=owner_id)
+    stats = jobs.aggregate(pending=Count("id"), oldest=Min("created_at"))
+    oldest = stats["oldest"]
+    return {
+        "pending": stats["pending"],
+        "oldest_pending_at": oldest,
+        "lag_seconds": round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
+
+
+def _batch_charge_increments(readings: list[Reading], saved: bool = False) -> dict[ChargeKey, list[Decimal]]:
+    """Compute MonthlyCharge increments for a batch of readings.
+
+    Same rules as ``apply_reading_change``, set-based over all meters: one query
+    loads the value before the batch window per meter, one more the stored
+    readings inside the window plus the first date after it, whose deltas
+    change when back-dated readings are inserted. With ``saved`` the readings
+    are already stored (queued jobs) and keep their own position among the
+    other readings of the day; otherwise they are new and go last.
+    """
+
+    by_meter: dict[int, list[Reading]] = defaultdict(list)
+    for reading in readings:
+        by_meter[reading.meter_id].append(reading)
+
+    start = min(reading.reading_date for reading in readings)
+    end = max(reading.reading_date for reading in readings)
+
+    latest_before = Reading.objects.filter(meter=OuterRef("pk"), reading_date__lt=start).order_by(
+        "-reading_date", "-created_at"
+    )
+    anchors = dict(
+        Meter.objects.filter(id__in=by_meter)
+        .annotate(previous_value=Subquery(latest_before.values("value")[:1]))
+        .values_list("id", "previous_value")
     )
-    totals = [c["total_amount"] for c in charges[:months]]
-    if not totals:
-        return Decimal("0")
-    return sum(totals) / len(totals)
 
+    next_date = (
+        Reading.objects.filter(meter=OuterRef("meter"), reading_date__gt=end)
+        .order_by("reading_date")
+        .values("reading_date")[:1]
+    )
+    stored_rows = Reading.objects.filter(
+        meter_id__in=by_meter,
+        reading_date__gte=start,
+        reading_date__lte=Coalesce(Subquery(next_date), Value(end)),
+    )
+    if saved:
+        stored_rows = stored_rows.exclude(pk__in=[reading.pk for reading in readings])
+    stored: dict[int, list[tuple[date, tuple, Decimal]]] = defaultdict(list)
+    for meter_id, reading_date, created_at, pk, value in stored_rows.values_list(
+        "meter_id", "reading_date", "created_at", "pk", "value"
+    ):
+        # stored rows go first within a day: they were created before the batch
+        stored[meter_id].append((reading_date, (0, created_at, pk), value))
 
-def ensure_demo_data(user) -> None:
-    """Create demo data for the test user to simplify onboarding."""
+    increments: dict[ChargeKey, list[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    for meter_id, batch in by_meter.items():
+        meter = batch[0].meter
+        before = sorted(stored[meter_id], key=lambda row: row[:2])
+        after = before + [
+            (reading.reading_date, (0, reading.created_at, reading.pk) if saved else (1, idx), reading.value)
+            for idx, reading in enumerate(batch)
+        ]
+        after.sort(key=lambda row: row[:2])
+        anchor = anchors.get(meter_id)
+        # several meters of a property can share a charge row
+        for key, (consumption, amount) in _subtract(
+            _walk_charges(meter, after, anchor), _walk_charges(meter, before, anchor)
+        ).items():
+            increments[key][0] += consumption
+            increments[key][1] += amount
+    return increments
 
-    if user.username != "test":
-        return
 
-    if Property.objects.filter(owner=user).exists():
+def _apply_increments(model, key_fields: tuple[str, ...], value_fields: tuple[str, ...], increments: dict) -> set:
+    """Add ``increments`` (key tuple -> list of values) to rows of ``model``, creating missing rows.
+
+    Every batch is a single ``INSERT ... ON CONFLICT DO UPDATE`` that adds the
+    values inside the database, so concurrent writers neither lose updates nor
+    fail on the unique constraint, and no row is locked before the write. Rows are
+    sent in key order to keep the lock order of overlapping batches stable.
+    Returns the keys of the rows that had to be created.
+    """
+
+    if not increments:
+        return set()
+
+    meta = model._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    key_columns = [meta.get_field(name).column for name in key_fields]
+    assignments = []
+    for name in value_fields:
+        field = meta.get_field(name)
+        column = quote(field.column)
+        total = f"{table}.{column} + excluded.{column}"
+        if field.get_internal_type() == "DecimalField":
+            # SQLite adds NUMERIC values as floats
+            total = f"ROUND({total}, {field.decimal_places})"
+        assignments.append(f"{column} = {total}")
+
+    if connection.vendor == "postgresql":
+        inserted = "xmax = 0"
+    else:
+        # writers are serialized on SQLite, so a row carrying the timestamp of this
+        # statement was created by it
+        stamped = any(field.name == "generated_at" for field in fields)
+        inserted = f"{quote(meta.get_field('generated_at').column)} = %s" if stamped else "0"
+    sql_head = f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) VALUES "
+    sql_tail = (
+        f" ON CONFLICT ({', '.join(quote(column) for column in key_columns)}) DO UPDATE SET {', '.join(assignments)}"
+        f" RETURNING {', '.join(quote(column) for column in key_columns)}, {inserted}"
+    )
+
+    created = set()
+    rows = sorted(increments.items())
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    for offset in range(0, len(rows), BULK_BATCH_SIZE):
+        batch = rows[offset : offset + BULK_BATCH_SIZE]
+        params = []
+        # one timestamp for the whole statement; pre_save would stamp every row anew
+        stamp = timezone.now()
+        for key, values in batch:
+            instance = model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values)))
+            for field in fields:
+                value = stamp if field.name == "generated_at" else field.pre_save(instance, True)
+                params.append(field.get_db_prep_save(value, connection))
+        if "%s" in inserted:
+            params.append(meta.get_field("generated_at").get_db_prep_save(stamp, connection))
+        with connection.cursor() as cursor:
+            cursor.execute(sql_head + ", ".join([placeholders] * len(batch)) + sql_tail, params)
+            for *key, was_inserted in cursor.fetchall():
+                if was_inserted:
+                    created.add(tuple(key))
+    return created
+
+
+def _apply_charge_increments(increments: dict[ChargeKey, list[Decimal]]) -> None:
+    """Apply signed MonthlyCharge increments and keep the owner rollups in step."""
+
+    if not increments:
         return
+    created = _apply_increments(
+        MonthlyCharge, ("property_id", "year", "month", "resource_type"), ("consumption", "amount"), increments
+    )
+    invalidate_forecasts({key[0] for key in increments})
+
+    owners = dict(Property.objects.filter(id__in={key[0] for key in increments}).values_list("id", "owner_id"))
+    rollups: dict[RollupKey, list] = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for key, (consumption, amount) in increments.items():
+        property_id, year, month, resource_type = key
+        totals = rollups[(owners[property_id], year, month, resource_type)]
+        totals[0] += consumption
+        totals[1] += amount
+        totals[2] += int(key in created)
+    _apply_increments(
+        OwnerMonthlyRollup,
+        ("owner_id", "year", "month", "resource_type"),
+        ("consumption", "amount", "properties_count"),
+        rollups,
+    )
+
+
+def refresh_payment_rollups(keys: Iterable[tuple[int, int, int]]) -> None:
+    """Recount OwnerPaymentRollup cells for (owner_id, year, month) keys after payment writes."""
 
-    today = date.today().replace(day=1)
-
-    def month_end(months_back: int) -> date:
-        year = today.year
-        month = today.month - months_back
-        while month <= 0:
-            month += 12
-            year -= 1
-        last_day = monthrange(year, month)[1]
-        return date(year, month, last_day)
-
-    def emit_history(meter: Meter, start_value: Decimal, plan: list[Decimal]) -> None:
-        value = start_value
-        periods = len(plan)
-        for idx, delta in enumerate(plan):
-            value += delta
-            reading_date = month_end(periods - idx)
-            reading = Reading.objects.create(
-                meter=meter,
-                value=value.quantize(Decimal("0.001")),
-                reading_date=reading_date,
+    for owner_id, year, month in set(keys):
+        total = Payment.objects.filter(property__owner_id=owner_id, year=year, month=month).aggregate(
+            total=Sum("amount")
+        )["total"]
+        if total is None:
+            OwnerPaymentRollup.objects.filter(owner_id=owner_id, year=year, month=month).delete()
+        else:
+            OwnerPaymentRollup.objects.update_or_create(
+                owner_id=owner_id, year=year, month=month, defaults={"amount": total}
             )
-            process_reading(reading)
-
-    tariff_windows = [
-        {
-            "valid_from": today.replace(year=today.year - 2, month=1, day=1),
-            "valid_to": today.replace(year=today.year - 1, month=8, day=31),
-            "values": {
-                Meter.ELECTRICITY: Decimal("5.65"),
-                Meter.COLD_WATER: Decimal("37.20"),
-                Meter.HOT_WATER: Decimal("176.80"),
-                Meter.GAS: Decimal("5.95"),
-                Meter.HEATING: Decimal("1505.00"),
-            },
-        },
-        {
-            "valid_from": today.replace(year=today.year - 1, month=9, day=1),
-            "valid_to": None,
-            "values": {
-                Meter.ELECTRICITY: Decimal("7.10"),
-                Meter.COLD_WATER: Decimal("46.30"),
-                Meter.HOT_WATER: Decimal("224.10"),
-                Meter.GAS: Decimal("8.05"),
-                Meter.HEATING: Decimal("1940.00"),
-            },
-        },
+
+
+@transaction.atomic
+def rebuild_rollups(owner_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild owner rollups from MonthlyCharge and Payment; all owners when ``owner_ids`` is None."""
+
+    charges = MonthlyCharge.objects.all()
+    payments = Payment.objects.all()
+    monthly = OwnerMonthlyRollup.objects.all()
+    paid = OwnerPaymentRollup.objects.all()
+    if owner_ids is not None:
+        owner_ids = set(owner_ids)
+        charges = charges.filter(property__owner_id__in=owner_ids)
+        payments = payments.filter(property__owner_id__in=owner_ids)
+        monthly = monthly.filter(owner_id__in=owner_ids)
+        paid = paid.filter(owner_id__in=owner_ids)
+
+    monthly.delete()
+    paid.delete()
+    rollups = [
+        OwnerMonthlyRollup(
+            owner_id=row["property__owner_id"],
+            year=row["year"],
+            month=row["month"],
+            resource_type=row["resource_type"],
+            consumption=row["total_consumption"],
+            amount=row["total_amount"],
+            properties_count=row["properties_count"],
+        )
+        for row in charges.values("property__owner_id", "year", "month", "resource_type")
+        .annotate(
+            total_consumption=Sum("consumption"),
+            total_amount=Sum("amount"),
+            properties_count=Count("property_id", distinct=True),
+        )
+        .order_by()
     ]
+    OwnerMonthlyRollup.objects.bulk_create(rollups, batch_size=BULK_BATCH_SIZE)
+    OwnerPaymentRollup.objects.bulk_create(
+        [
+            OwnerPaymentRollup(
+                owner_id=row["property__owner_id"], year=row["year"], month=row["month"], amount=row["total"]
+            )
+            for row in payments.values("property__owner_id", "year", "month").annotate(total=Sum("amount")).order_by()
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    bump_owner_versions({rollup.owner_id for rollup in rollups} | (owner_ids or set()))
+    return len(rollups)
 
-    for window in tariff_windows:
-        for resource, value in window["values"].items():
-            Tariff.objects.update_or_create(
-                resource_type=resource,
-                valid_from=window["valid_from"],
-                defaults={"value_per_unit": value, "valid_to": window["valid_to"]},
+
+def compute_charges(meters, since: Optional[date] = None, chunk_size: int = 5000) -> dict[ChargeKey, list[Decimal]]:
+    """Rebuild charge totals of ``meters`` from their readings with the rules of ``apply_reading_change``.
+
+    Readings are streamed in (meter, reading_date, created_at) order and walked one
+    meter at a time. With ``since`` only readings from that date on are charged;
+    the latest earlier reading of every meter serves as the starting value.
+    """
+
+    readings = Reading.objects.filter(meter__in=meters)
+    anchors = {}
+    if since is not None:
+        readings = readings.filter(reading_date__gte=since)
+        latest_before = Reading.objects.filter(meter=OuterRef("pk"), reading_date__lt=since).order_by(
+            "-reading_date", "-created_at"
+        )
+        anchors = dict(
+            meters.annotate(previous_value=Subquery(latest_before.values("value")[:1])).values_list(
+                "id", "previous_value"
             )
+        )
 
-    scenarios = [
-        {
-            "name": "Смарт-квартира в Москва-Сити",
-            "address": "Москва, наб. Пресненская, 8, башня Восток",
-            "meters": [
-                {
-                    "resource": Meter.ELECTRICITY,
-                    "serial": "ELX-93A1",
-                    "unit": "кВт·ч",
-                    "start": Decimal("2180.4"),
-                    "plan": [
-                        Decimal("126.4"),
-                        Decimal("135.1"),
-                        Decimal("140.3"),
-                        Decimal("150.8"),
-                        Decimal("156.2"),
-                        Decimal("164.5"),
-                        Decimal("170.1"),
-                        Decimal("165.4"),
-                    ],
-                },
-                {
-                    "resource": Meter.COLD_WATER,
-                    "serial": "CWX-55B1",
-                    "unit": "м³",
-                    "start": Decimal("48.2"),
-                    "plan": [
-                        Decimal("3.2"),
-                        Decimal("3.8"),
-                        Decimal("4.0"),
-                        Decimal("4.4"),
-                        Decimal("4.7"),
-                        Decimal("5.1"),
-                        Decimal("4.9"),
-                        Decimal("5.4"),
-                    ],
-                },
-                {
-                    "resource": Meter.HEATING,
-                    "serial": "HTX-31C8",
-                    "unit": "Гкал",
-                    "start": Decimal("18.5"),
-                    "plan": [
-                        Decimal("1.6"),
-                        Decimal("1.8"),
-                        Decimal("1.9"),
-                        Decimal("2.3"),
-                        Decimal("2.4"),
-                        Decimal("2.1"),
-                        Decimal("2.0"),
-                        Decimal("1.7"),
-                    ],
-                },
-            ],
-        },
-        {
-            "name": "Арт-пространство «Смена»",
-            "address": "Екатеринбург, ул. Вайнера, 12 корп. 4",
-            "meters": [
-                {
-                    "resource": Meter.ELECTRICITY,
-                    "serial": "ELX-45Q2",
-                    "unit": "кВт·ч",
-                    "start": Decimal("780.0"),
-                    "plan": [
-                        Decimal("212.4"),
-                        Decimal("220.8"),
-                        Decimal("240.7"),
-                        Decimal("255.1"),
-                        Decimal("248.3"),
-                        Decimal("262.9"),
-                        Decimal("271.4"),
-                        Decimal("268.0"),
-                    ],
-                },
-                {
-                    "resource": Meter.GAS,
-                    "serial": "GSX-77Z1",
-                    "unit": "м³",
-                    "start": Decimal("320.5"),
-                    "plan": [
-                        Decimal("40.1"),
-                        Decimal("44.6"),
-                        Decimal("48.2"),
-                        Decimal("52.7"),
-                        Decimal("55.3"),
-                        Decimal("58.1"),
-                        Decimal("49.8"),
-                        Decimal("47.6"),
-                    ],
-                },
-                {
-                    "resource": Meter.COLD_WATER,
-                    "serial": "CWX-73K4",
-                    "unit": "м³",
-                    "start": Decimal("102.1"),
-                    "plan": [
-                        Decimal("6.4"),
-                        Decimal("6.8"),
-                        Decimal("7.0"),
-                        Decimal("7.5"),
-                        Decimal("7.8"),
-                        Decimal("8.1"),
-                        Decimal("8.9"),
-                        Decimal("7.7"),
-                    ],
-                },
-            ],
-        },
-        {
-            "name": "Дом на склоне Янган-Тау",
-            "address": "Башкортостан, Малояз, горнолыжный склон",
-            "meters": [
-                {
-                    "resource": Meter.ELECTRICITY,
-                    "serial": "ELX-12M9",
-                    "unit": "кВт·ч",
-                    "start": Decimal("410.2"),
-                    "plan": [
-                        Decimal("82.4"),
-                        Decimal("90.7"),
-                        Decimal("96.2"),
-                        Decimal("101.8"),
-                        Decimal("110.4"),
-                        Decimal("124.7"),
-                        Decimal("118.3"),
-                        Decimal("95.6"),
-                    ],
-                },
-                {
-                    "resource": Meter.GAS,
-                    "serial": "GSX-19D5",
-                    "unit": "м³",
-                    "start": Decimal("210.7"),
-                    "plan": [
-                        Decimal("32.1"),
-                        Decimal("35.0"),
-                        Decimal("36.4"),
-                        Decimal("38.7"),
-                        Decimal("41.3"),
-                        Decimal("43.8"),
-                        Decimal("45.9"),
-                        Decimal("39.4"),
-                    ],
-                },
-                {
-                    "resource": Meter.HOT_WATER,
-                    "serial": "HWX-28F7",
-                    "unit": "м³",
-                    "start": Decimal("34.0"),
-                    "plan": [
-                        Decimal("2.4"),
-                        Decimal("2.6"),
-                        Decimal("2.8"),
-                        Decimal("3.0"),
-                        Decimal("3.3"),
-                        Decimal("3.9"),
-                        Decimal("3.1"),
-                        Decimal("2.7"),
-                    ],
-                },
-            ],
-        },
+    totals: dict[ChargeKey, list[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+
+    def flush(meter: Meter, rows: list) -> None:
+        for key, (consumption, amount) in _walk_charges(meter, rows, anchors.get(meter.id)).items():
+            totals[key][0] += consumption
+            totals[key][1] += amount
+
+    meter = None
+    rows: list[tuple[date, tuple, Decimal]] = []
+    stream = (
+        readings.order_by("meter_id", "reading_date", "created_at", "pk")
+        .values_list(
+            "meter_id", "meter__property_id", "meter__resource_type", "reading_date", "created_at", "pk", "value"
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for meter_id, property_id, resource_type, reading_date, created_at, pk, value in stream:
+        if meter is None or meter.id != meter_id:
+            if meter is not None:
+                flush(meter, rows)
+            meter = Meter(id=meter_id, property_id=property_id, resource_type=resource_type)
+            rows = []
+        rows.append((reading_date, (created_at, pk), value))
+    if meter is not None:
+        flush(meter, rows)
+    return dict(totals)
+
+
+@transaction.atomic
+def replace_charges(totals: dict[ChargeKey, list[Decimal]], properties, since: Optional[date] = None) -> int:
+    """Make MonthlyCharge of ``properties`` (from the month of ``since`` on) equal to ``totals``."""
+
+    scope = MonthlyCharge.objects.filter(property__in=properties)
+    if since is not None:
+        scope = scope.filter(Q(year__gt=since.year) | Q(year=since.year, month__gte=since.month))
+    stale = [
+        pk
+        for pk, *key in scope.values_list("pk", "property_id", "year", "month", "resource_type").iterator()
+        if tuple(key) not in totals
+    ]
+    for offset in range(0, len(stale), BULK_BATCH_SIZE):
+        MonthlyCharge.objects.filter(pk__in=stale[offset : offset + BULK_BATCH_SIZE]).delete()
+
+    MonthlyCharge.objects.bulk_create(
+        [
+            MonthlyCharge(
+                property_id=property_id,
+                year=year,
+                month=month,
+                resource_type=resource_type,
+                consumption=consumption,
+                amount=amount,
+            )
+            for (property_id, year, month, resource_type), (consumption, amount) in totals.items()
+        ],
+        batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["property", "year", "month", "resource_type"],
+        update_fields=["consumption", "amount"],
+    )
+    invalidate_forecasts(properties.values_list("id", flat=True))
+    rebuild_rollups(properties.values_list("owner_id", flat=True))
+    return len(totals)
+
+
+@transaction.atomic
+def ingest_readings(items: Iterable[dict]) -> list[Reading]:
+    """Store a batch of readings and update MonthlyCharge in a fixed number of queries."""
+
+    readings = [
+        Reading(meter=item["meter"], value=item["value"], reading_date=item["reading_date"]) for item in items
     ]
+    if not readings:
+        return []
+
+    flush_charge_jobs(reading.meter_id for reading in readings)
+    increments = _batch_charge_increments(readings)
+    Reading.objects.bulk_create(readings, batch_size=BULK_BATCH_SIZE)
+    _apply_charge_increments(increments)
+    bump_owner_versions(reading.meter.property.owner_id for reading in readings)
+    return readings
+
+
+def summarize_charges(rows: Iterable[dict], property_names: dict[int, str]) -> dict:
+    """Build the analytics sections from charge totals grouped by month, resource and property.
+
+    ``rows`` must be ordered by year and month and carry ``year``, ``month``,
+    ``resource_type``, ``total_consumption`` and ``total_amount``. Rows without a
+    ``property_id`` (owner rollups) are left out of the per-property totals and
+    report their ``properties_count`` instead.
+    """
+
+    monthly_map: dict[str, dict] = {}
+    resource_totals: dict[str, dict[str, Decimal]] = {}
+    monthly_by_resource: dict[str, dict[str, dict[str, Decimal]]] = {}
+    property_totals: dict[int, dict[str, Decimal]] = {}
+
+    for row in rows:
+        key = f"{row['year']}-{row['month']:02d}"
+        consumption = row["total_consumption"]
+        amount = row["total_amount"]
+
+        month = monthly_map.setdefault(
+            key, {"month": key, "items": [], "total_amount": Decimal("0"), "total_consumption": Decimal("0")}
+        )
+        property_id = row.get("property_id")
+        item = {
+            "property": property_id,
+            "resource_type": row["resource_type"],
+            "consumption": float(consumption),
+            "amount": float(amount),
+        }
+        if "properties_count" in row:
+            item["properties_count"] = row["properties_count"]
+        month["items"].append(item)
+        month["total_amount"] += amount
+        month["total_consumption"] += consumption
+
+        resource = resource_totals.setdefault(
+            row["resource_type"], {"total_consumption": Decimal("0"), "total_amount": Decimal("0")}
+        )
+        resource["total_consumption"] += consumption
+        resource["total_amount"] += amount
 
-    for scenario in scenarios:
-        property_obj, _ = Property.objects.get_or_create(
-            owner=user,
-            name=scenario["name"],
-            defaults={"address": scenario["address"]},
+        by_resource = monthly_by_resource.setdefault(key, {}).setdefault(
+            row["resource_type"], {"consumption": Decimal("0"), "amount": Decimal("0")}
         )
-        property_obj.address = scenario["address"]
-        property_obj.save()
-
-        for meter_config in scenario["meters"]:
-            meter, _ = Meter.objects.get_or_create(
-                property=property_obj,
-                resource_type=meter_config["resource"],
-                defaults={
-                    "serial_number": meter_config["serial"],
-                    "unit": meter_config["unit"],
-                    "installed_at": date.today() - timedelta(days=420),
-                    "is_active": True,
-                },
+        by_resource["consumption"] += consumption
+        by_resource["amount"] += amount
+
+        if property_id is not None:
+            by_property = property_totals.setdefault(
+                property_id, {"total_amount": Decimal("0"), "total_consumption": Decimal("0")}
             )
+            by_property["total_amount"] += amount
+            by_property["total_consumption"] += consumption
+
+    monthly = []
+    running = 0.0
+    for key in sorted(monthly_map):
+        month = monthly_map[key]
+        month["total_amount"] = float(month["total_amount"])
+        month["total_consumption"] = float(month["total_consumption"])
+        running += month["total_amount"]
+        month["cumulative_amount"] = running
+        monthly.append(month)
+
+    return {
+        "monthly": monthly,
+        "resource_totals": {
+            resource: {key: float(value) for key, value in totals.items()}
+            for resource, totals in resource_totals.items()
+        },
+        "monthly_by_resource": {
+            key: {resource: {name: float(value) for name, value in values.items()} for resource, values in data.items()}
+            for key, data in monthly_by_resource.items()
+        },
+        "by_property": [
+            {
+                "property__id": property_id,
+                "property__name": property_names.get(property_id, ""),
+                "total_amount": totals["total_amount"],
+                "total_consumption": totals["total_consumption"],
+            }
+            for property_id, totals in sorted(property_totals.items())
+        ],
+    }
+
 
-            if meter.readings.exists():
-                continue
+def forecast_properties(property_ids: Iterable[int], months: int = 3) -> dict[int, Decimal]:
+    """Average monthly amount over the last ``months`` complete months for every property.
 
-            emit_history(meter, meter_config["start"], meter_config["plan"])
+    One query ranks each property's charge months with DENSE_RANK and keeps the
+    latest ``months`` of them; properties without charges forecast zero.
+    """
+
+    property_ids = list(property_ids)
+    today = date.today()
+    # exclude current month; charges are ranked per row because Django would put
+    # a window over an aggregate into GROUP BY
+    ranked = (
+        MonthlyCharge.objects.filter(property_id__in=property_ids)
+        .exclude(year=today.year, month=today.month)
+        .annotate(
+            position=Window(
+                DenseRank(),
+                partition_by=F("property_id"),
+                order_by=[F("year").desc(), F("month").desc()],
+            ),
+        )
+        .filter(position__lte=months)
+        .values_list("property_id", "year", "month", "amount")
+    )
+
+    totals: dict[int, dict[tuple[int, int], Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+    for property_id, year, month, amount in ranked:
+        totals[property_id][(year, month)] += amount
+    return {
+        property_id: sum(totals[property_id].values()) / len(totals[property_id])
+        if totals[property_id]
+        else Decimal("0")
+        for property_id in property_ids
+    }
+
+
+def forecast_property(property_obj: Property, months: int = 3) -> Decimal:
+    return forecast_properties([property_obj.id], months)[property_obj.id]
@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_owner_versions, bump_property_owners
+from .forecasting import invalidate_forecasts
+from .models import Meter, MonthlyCharge, Payment, Property, Tariff
+from .services import rebuild_rollups, refresh_payment_rollups
+from .tariffs import tariff_index
+
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+def reset_tariff_index(sender, **kwargs):
+    tariff_index.changed()
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def bump_property_owner(sender, instance, **kwargs):
+    bump_owner_versions([instance.owner_id])
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def reset_property_forecast(sender, instance, **kwargs):
+    invalidate_forecasts([instance.pk])
+
+
+@receiver(post_save, sender=MonthlyCharge)
+@receiver(post_delete, sender=MonthlyCharge)
+def reset_charge_forecast(sender, instance, origin=None, **kwargs):
+    # services write charges in bulk and reset forecasts themselves
+    if isinstance(origin, Property):
+        return
+    invalidate_forecasts([instance.property_id])
+
+
+@receiver(post_delete, sender=Property)
+def rebuild_property_owner_rollups(sender, instance, **kwargs):
+    # charges and payments of the property are gone through the cascade
+    rebuild_rollups([instance.owner_id])
+
+
+@receiver(post_save, sender=Meter)
+@receiver(post_delete, sender=Meter)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def bump_related_property_owner(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Property):
+        # cascades from a property are covered by its own handler
+        return
+    if sender.property.is_cached(instance):
+        bump_owner_versions([instance.property.owner_id])
+    else:
+        bump_property_owners([instance.property_id])
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_period(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = (
+            Payment.objects.filter(pk=instance.pk).values_list("property__owner_id", "year", "month").first()
+        )
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def update_payment_rollups(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Property):
+        return
+    keys = [(instance.property.owner_id, instance.year, instance.month)]
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous:
+        keys.append(previous)
+    refresh_payment_rollups(keys)
@@ -0,0 +1,117 @@
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from functools import partial
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Tariff
+
+VERSION_CACHE_KEY = "core:tariffs:version"
+
+
+class TariffIndex:
+    """In-process copy of the Tariff table answering lookups by bisect.
+
+    Tariffs are kept per resource type sorted by ``valid_from``. Local changes
+    reset the index through model signals once they are committed; other
+    processes notice them through a version stamp stored in the Django cache,
+    which is re-read at most once per ``TARIFF_INDEX_CHECK_INTERVAL`` seconds.
+    A transaction with uncommitted tariff writes is answered from its own copy.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._intervals: Optional[dict[str, tuple[list[date], list[Tariff]]]] = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+
+    def lookup(self, resource_type: str, target_date: date) -> Optional[Tariff]:
+        entry = self._current().get(resource_type)
+        if entry is None:
+            return None
+        starts, tariffs = entry
+        for pos in range(bisect_right(starts, target_date) - 1, -1, -1):
+            tariff = tariffs[pos]
+            if tariff.valid_to is None or tariff.valid_to >= target_date:
+                return tariff
+        return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._intervals = None
+        self._local.__dict__.pop("writes", None)
+        self._local.__dict__.pop("pending", None)
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    def changed(self) -> None:
+        """Record a tariff write of the current transaction; the index is reset when it commits.
+
+        A rollback drops the on-commit hook along with the write, so the shared
+        copy and the version stamp never see a tariff that was not committed.
+        """
+
+        # a distinct callable per write, to tell the writes of one transaction from another's
+        write = partial(self.invalidate)
+        self._local.__dict__.setdefault("writes", []).append(write)
+        transaction.on_commit(write)
+
+    def has_pending_changes(self) -> bool:
+        return bool(self._pending_writes())
+
+    def _pending_writes(self) -> tuple:
+        writes = getattr(self._local, "writes", None)
+        if not writes:
+            return ()
+        hooks = transaction.get_connection().run_on_commit
+        pending = tuple(func for _, func, *_ in hooks if any(func is write for write in writes))
+        if not pending:
+            # rolled back
+            self._local.writes = []
+        return pending
+
+    def _current(self) -> dict[str, tuple[list[date], list[Tariff]]]:
+        writes = self._pending_writes() if getattr(self._local, "writes", None) else ()
+        if writes:
+            # uncommitted rows are visible to this transaction only; savepoint rollbacks change ``writes``
+            pending = getattr(self._local, "pending", None)
+            if pending is None or pending[0] != writes:
+                pending = self._local.pending = (writes, self._load())
+            return pending[1]
+
+        intervals = self._intervals
+        now = time.monotonic()
+        interval = getattr(settings, "TARIFF_INDEX_CHECK_INTERVAL", 1.0)
+        if intervals is not None and now - self._checked_at < interval:
+            return intervals
+
+        with self._lock:
+            version = cache.get(VERSION_CACHE_KEY)
+            if version is None:
+                version = uuid.uuid4().hex
+                cache.add(VERSION_CACHE_KEY, version, None)
+                version = cache.get(VERSION_CACHE_KEY, version)
+            if self._intervals is None or version != self._version:
+                self._intervals = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._intervals
+
+    def _load(self) -> dict[str, tuple[list[date], list[Tariff]]]:
+        grouped: dict[str, list[Tariff]] = defaultdict(list)
+        for tariff in Tariff.objects.order_by("valid_from", "id"):
+            grouped[tariff.resource_type].append(tariff)
+        return {
+            resource_type: ([tariff.valid_from for tariff in tariffs], tariffs)
+            for resource_type, tariffs in grouped.items()
+        }
+
+
+tariff_index = TariffIndex()
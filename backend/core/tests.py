@@ -1,11 +1,61 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time
 from datetime import date
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
+from .anomalies import detect_anomalies
+from .caching import cache_stats
+from .demo import DEMO_SCENARIOS, DEMO_USERNAME, ensure_demo_data
+from .forecasting import FORECAST_KEY, fit_series, predict, seasonal_forecasts
+from .management.commands.recomputecharges import _shards
+from .models import (
+    Anomaly,
+    ChargeJob,
+    Meter,
+    MonthlyCharge,
+    OwnerMonthlyRollup,
+    OwnerPaymentRollup,
+    Payment,
+    Property,
+    Reading,
+    Tariff,
+)
+from .serializers import MonthlyChargeSerializer, PaymentSerializer, TariffSerializer
+from .services import (
+    find_tariff,
+    forecast_properties,
+    forecast_property,
+    get_previous_reading,
+    process_charge_jobs,
+    process_reading,
+    rebuild_rollups,
+)
+from .tariffs import VERSION_CACHE_KEY, TariffIndex
+from .timeseries import lttb, minmax
 
 
 class AuthFlowTests(APITestCase):
@@ -89,6 +139,30 @@ class ReadingChargeTests(APITestCase):
         self.assertEqual(charge.consumption, Decimal("25.500"))
         self.assertEqual(charge.amount, Decimal("25.500") * self.tariff.value_per_unit)
 
+    def test_reading_list_runs_constant_queries(self):
+        for day, value in enumerate(["100.000", "110.000", "108.000", "130.500"], start=1):
+            Reading.objects.create(meter=self.meter, value=Decimal(value), reading_date=date(2024, 4, day))
+        find_tariff(Meter.ELECTRICITY, date(2024, 4, 1))
+
+        with self.assertNumQueries(1):
+            resp = self.client.get("/api/readings/", {"meter": self.meter.id})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        deltas = [(item["consumption_delta"], item["amount_value"]) for item in resp.data]
+        self.assertEqual(deltas, [(22.5, 146.25), (None, None), (10.0, 65.0), (None, None)])
+        self.assertEqual(resp.data[0]["meter_detail"]["id"], self.meter.id)
+        self.assertEqual(resp.data[0]["resource_label"], "Электричество")
+
+    def test_update_response_reports_new_delta(self):
+        Reading.objects.create(meter=self.meter, value=Decimal("100.000"), reading_date=date(2024, 1, 1))
+        Reading.objects.create(meter=self.meter, value=Decimal("150.000"), reading_date=date(2024, 2, 1))
+        moved = Reading.objects.create(meter=self.meter, value=Decimal("200.000"), reading_date=date(2024, 3, 1))
+
+        resp = self.client.patch(f"/api/readings/{moved.id}/", {"reading_date": "2024-01-15"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data["consumption_delta"], resp.data["amount_value"]), (100.0, 650.0))
+        detail = self.client.get(f"/api/readings/{moved.id}/")
+        self.assertEqual(detail.data["consumption_delta"], resp.data["consumption_delta"])
+
     def test_reading_validation_blocks_foreign_meter(self):
         stranger = User.objects.create_user(username="stranger", password="pass12345")
         foreign_property = Property.objects.create(owner=stranger, name="Чужой объект", address="Секрет")
@@ -103,6 +177,494 @@ class ReadingChargeTests(APITestCase):
         self.assertIn("meter", resp.data)
 
 
+class ConcurrentIngestionTests(TransactionTestCase):
+    """Parallel writers of one property and month must not lose charge increments."""
+
+    threads = 8
+    days = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="parallel", password="pass12345")
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.00"), valid_from=date(2024, 1, 1))
+        self.meters = [
+            Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+            for _ in range(self.threads)
+        ]
+
+    def _ingest(self, meter, barrier, errors):
+        try:
+            barrier.wait()
+            for day in range(1, self.days + 1):
+                for _ in range(200):
+                    try:
+                        with transaction.atomic():
+                            reading = Reading.objects.create(
+                                meter=meter, value=Decimal("1.5") * day, reading_date=date(2024, 1, day)
+                            )
+                            process_reading(reading)
+                        break
+                    except OperationalError:
+                        # SQLite admits one writer at a time and reports the others as locked
+                        time.sleep(0.005)
+                else:
+                    errors.append(f"meter {meter.id}: database stayed locked")
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_parallel_readings_keep_exact_totals(self):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+        workers = [threading.Thread(target=self._ingest, args=(meter, barrier, errors)) for meter in self.meters]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+        expected_consumption = Decimal("1.5") * (self.days - 1) * self.threads
+        charge = MonthlyCharge.objects.get(property=self.property, year=2024, month=1)
+        self.assertEqual((charge.consumption, charge.amount), (expected_consumption, expected_consumption * 2))
+        rollup = OwnerMonthlyRollup.objects.get(owner=self.user, year=2024, month=1)
+        self.assertEqual(
+            (rollup.consumption, rollup.amount, rollup.properties_count),
+            (expected_consumption, expected_consumption * 2, 1),
+        )
+
+
+class TariffIndexTests(TestCase):
+    def setUp(self):
+        self.old = Tariff.objects.create(
+            resource_type=Meter.GAS,
+            value_per_unit=Decimal("5.00"),
+            valid_from=date(2023, 1, 1),
+            valid_to=date(2023, 12, 31),
+        )
+        self.current = Tariff.objects.create(
+            resource_type=Meter.GAS,
+            value_per_unit=Decimal("6.00"),
+            valid_from=date(2024, 1, 1),
+        )
+        self.promo = Tariff.objects.create(
+            resource_type=Meter.GAS,
+            value_per_unit=Decimal("4.00"),
+            valid_from=date(2024, 6, 1),
+            valid_to=date(2024, 6, 30),
+        )
+
+    def test_lookup_matches_validity_intervals(self):
+        self.assertIsNone(find_tariff(Meter.GAS, date(2022, 12, 31)))
+        self.assertEqual(find_tariff(Meter.GAS, date(2023, 12, 31)), self.old)
+        self.assertEqual(find_tariff(Meter.GAS, date(2024, 6, 15)), self.promo)
+        self.assertEqual(find_tariff(Meter.GAS, date(2024, 7, 1)), self.current)
+        self.assertIsNone(find_tariff(Meter.HEATING, date(2024, 7, 1)))
+
+    def test_lookup_is_served_from_memory(self):
+        find_tariff(Meter.GAS, date(2024, 1, 1))
+        with self.assertNumQueries(0):
+            for day in range(1, 29):
+                find_tariff(Meter.GAS, date(2024, 2, day))
+
+    def test_signals_reset_index(self):
+        self.assertEqual(find_tariff(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("6.00"))
+        self.current.value_per_unit = Decimal("7.00")
+        self.current.save()
+        self.assertEqual(find_tariff(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("7.00"))
+        self.promo.delete()
+        self.assertEqual(find_tariff(Meter.GAS, date(2024, 6, 15)).value_per_unit, Decimal("7.00"))
+
+    def test_version_stamp_reloads_other_processes(self):
+        index = TariffIndex()
+        self.assertEqual(index.lookup(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("6.00"))
+        # a queryset update bypasses signals, like a change made by another worker
+        Tariff.objects.filter(pk=self.current.pk).update(value_per_unit=Decimal("8.00"))
+
+        with override_settings(TARIFF_INDEX_CHECK_INTERVAL=0):
+            self.assertEqual(index.lookup(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("6.00"))
+            cache.set(VERSION_CACHE_KEY, "bumped-elsewhere", None)
+            self.assertEqual(index.lookup(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("8.00"))
+
+    def test_rolled_back_tariff_is_not_served(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Tariff.objects.all().delete()
+        self.assertIsNone(find_tariff(Meter.GAS, date(2024, 7, 1)))
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Tariff.objects.create(resource_type=Meter.GAS, value_per_unit=Decimal("9.00"), valid_from=date(2024, 1, 1))
+            # the writing transaction sees its own tariff
+            self.assertEqual(find_tariff(Meter.GAS, date(2024, 7, 1)).value_per_unit, Decimal("9.00"))
+            raise RuntimeError
+        self.assertEqual(Tariff.objects.count(), 0)
+        self.assertIsNone(find_tariff(Meter.GAS, date(2024, 7, 1)))
+
+
+class QueryPlanTests(TestCase):
+    """Hot query shapes must be answered by the composite indexes, not by table scans."""
+
+    def setUp(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("EXPLAIN format is only checked on SQLite and PostgreSQL")
+        if connection.vendor == "postgresql":
+            # tiny test tables would otherwise always be scanned sequentially
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        user = User.objects.create_user(username="planner", password="pass12345")
+        self.property = Property.objects.create(owner=user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r"(SCAN|Seq Scan on) core_")
+
+    def test_previous_reading_uses_covering_index(self):
+        queryset = (
+            self.meter.readings.filter(reading_date__lt=date(2024, 5, 1))
+            .order_by("-reading_date", "-created_at")
+            .values("value")[:1]
+        )
+        self.assertUsesIndex(queryset, "reading_meter_date_idx")
+        self.assertIsNone(get_previous_reading(self.meter, date(2024, 5, 1)))
+
+    def test_tariff_lookup_uses_resource_index(self):
+        queryset = (
+            Tariff.objects.filter(resource_type=Meter.GAS, valid_from__lte=date(2024, 5, 1))
+            .filter(Q(valid_to__isnull=True) | Q(valid_to__gte=date(2024, 5, 1)))
+            .order_by("-valid_from")
+        )
+        self.assertUsesIndex(queryset, "tariff_resource_from_idx")
+
+    def test_payment_period_filter_uses_index(self):
+        queryset = Payment.objects.filter(property=self.property, year=2024, month__gte=3).values("year", "month")
+        self.assertUsesIndex(queryset, "payment_property_period_idx")
+
+    def test_analytics_charge_range_uses_unique_index(self):
+        queryset = MonthlyCharge.objects.filter(property__in=[self.property.id]).filter(
+            Q(year__gt=2023) | Q(year=2023, month__gte=6)
+        )
+        # the unique (property, year, month, resource_type) constraint already matches this shape
+        self.assertUsesIndex(queryset, "_uniq")
+
+
+class BulkReadingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="gateway", password="pass12345")
+        self.property = Property.objects.create(owner=self.user, name="Склад", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        self.water = Meter.objects.create(property=self.property, resource_type=Meter.COLD_WATER, unit="м3")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("6.50"), valid_from=date(2024, 1, 1))
+        Tariff.objects.create(resource_type=Meter.COLD_WATER, value_per_unit=Decimal("40.00"), valid_from=date(2024, 1, 1))
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_matches_sequential_processing(self):
+        Reading.objects.create(meter=self.meter, value=Decimal("100.000"), reading_date=date(2024, 1, 31))
+        payload = [
+            {"meter": self.meter.id, "value": "150.250", "reading_date": "2024-03-31"},
+            {"meter": self.water.id, "value": "10.000", "reading_date": "2024-01-31"},
+            {"meter": self.meter.id, "value": "120.125", "reading_date": "2024-02-29"},
+            {"meter": self.water.id, "value": "14.500", "reading_date": "2024-02-29"},
+            {"meter": self.meter.id, "value": "149.000", "reading_date": "2024-04-30"},
+        ]
+
+        resp = self.client.post("/api/readings/bulk/", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["created"], 5)
+        self.assertEqual(Reading.objects.filter(meter__property=self.property).count(), 6)
+
+        charges = {
+            (c.month, c.resource_type): (c.consumption, c.amount)
+            for c in MonthlyCharge.objects.filter(property=self.property)
+        }
+        self.assertEqual(
+            charges,
+            {
+                (2, Meter.ELECTRICITY): (Decimal("20.125"), Decimal("130.81")),
+                (3, Meter.ELECTRICITY): (Decimal("30.125"), Decimal("195.81")),
+                (2, Meter.COLD_WATER): (Decimal("4.500"), Decimal("180.00")),
+            },
+        )
+
+    def test_bulk_adds_to_existing_charge(self):
+        Reading.objects.create(meter=self.meter, value=Decimal("100.000"), reading_date=date(2024, 3, 1))
+        self.client.post(
+            "/api/readings/",
+            {"meter": self.meter.id, "value": "110.000", "reading_date": "2024-03-10"},
+            format="json",
+        )
+
+        resp = self.client.post(
+            "/api/readings/bulk/",
+            [{"meter": self.meter.id, "value": "115.000", "reading_date": "2024-03-20"}],
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        charge = MonthlyCharge.objects.get(property=self.property, year=2024, month=3)
+        self.assertEqual(charge.consumption, Decimal("15.000"))
+        self.assertEqual(charge.amount, Decimal("97.50"))
+
+    def test_bulk_rejects_batch_with_foreign_meter(self):
+        stranger = User.objects.create_user(username="stranger3", password="pass12345")
+        foreign_property = Property.objects.create(owner=stranger, name="Чужой", address="Секрет")
+        foreign_meter = Meter.objects.create(property=foreign_property, resource_type=Meter.GAS, unit="м3")
+
+        resp = self.client.post(
+            "/api/readings/bulk/",
+            [
+                {"meter": self.meter.id, "value": "10", "reading_date": "2024-02-01"},
+                {"meter": foreign_meter.id, "value": "10", "reading_date": "2024-02-01"},
+            ],
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Reading.objects.exists())
+
+    def test_bulk_query_count_does_not_grow_with_batch(self):
+        payload = [
+            {"meter": self.meter.id, "value": str(100 + i), "reading_date": date(2024, 1, 1 + i).isoformat()}
+            for i in range(25)
+        ]
+        with self.assertNumQueries(12):
+            resp = self.client.post("/api/readings/bulk/", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(MonthlyCharge.objects.get(property=self.property).consumption, Decimal("24.000"))
+
+
+class IncrementalRecalculationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="corrector", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        self.second = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.50"), valid_from=date(2024, 1, 1))
+        self.january = self._post(self.meter, "100", "2024-01-31")
+        self.march = self._post(self.meter, "200", "2024-03-31")
+
+    def _post(self, meter, value, reading_date):
+        resp = self.client.post(
+            "/api/readings/", {"meter": meter.id, "value": value, "reading_date": reading_date}, format="json"
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.data["id"]
+
+    def _charges(self):
+        return {
+            charge.month: charge.consumption
+            for charge in MonthlyCharge.objects.filter(property=self.property)
+            if charge.consumption
+        }
+
+    def _expected(self):
+        """Full recompute of the current readings, used as the reference."""
+        expected = {}
+        for meter in (self.meter, self.second):
+            readings = list(meter.readings.order_by("reading_date", "created_at", "pk"))
+            for reading in readings:
+                earlier = [r for r in readings if r.reading_date < reading.reading_date]
+                if earlier and reading.value > earlier[-1].value:
+                    month = reading.reading_date.month
+                    expected[month] = expected.get(month, Decimal("0")) + reading.value - earlier[-1].value
+        return expected
+
+    def test_back_dated_insert_adjusts_following_reading(self):
+        self.assertEqual(self._charges(), {3: Decimal("100.000")})
+        self._post(self.meter, "150", "2024-02-29")
+        self.assertEqual(self._charges(), {2: Decimal("50.000"), 3: Decimal("50.000")})
+        charge = MonthlyCharge.objects.get(property=self.property, month=3)
+        self.assertEqual(charge.amount, Decimal("125.00"))
+
+    def test_update_value_and_date(self):
+        february = self._post(self.meter, "150", "2024-02-29")
+        resp = self.client.patch(f"/api/readings/{february}/", {"value": "170"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._charges(), {2: Decimal("70.000"), 3: Decimal("30.000")})
+
+        self.client.patch(f"/api/readings/{february}/", {"reading_date": "2024-03-15"}, format="json")
+        self.assertEqual(self._charges(), {3: Decimal("100.000")})
+
+    def test_delete_restores_neighbour_delta(self):
+        february = self._post(self.meter, "150", "2024-02-29")
+        resp = self.client.delete(f"/api/readings/{february}/")
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._charges(), {3: Decimal("100.000")})
+
+        self.client.delete(f"/api/readings/{self.january}/")
+        self.assertEqual(self._charges(), {})
+        self.assertEqual(OwnerMonthlyRollup.objects.get(owner=self.user, month=3).consumption, Decimal("0"))
+
+    def test_random_changes_match_full_recompute(self):
+        rng = random.Random(7)
+        ids = {self.meter: [self.january, self.march], self.second: []}
+        for _ in range(40):
+            meter = rng.choice([self.meter, self.second])
+            action = rng.choice(["create", "create", "update", "delete"])
+            reading_date = date(2024, rng.randint(1, 6), rng.randint(1, 28)).isoformat()
+            value = str(rng.randint(0, 500))
+            if action == "create" or not ids[meter]:
+                ids[meter].append(self._post(meter, value, reading_date))
+            elif action == "update":
+                target = rng.choice(ids[meter])
+                self.client.patch(
+                    f"/api/readings/{target}/", {"value": value, "reading_date": reading_date}, format="json"
+                )
+            else:
+                target = ids[meter].pop(rng.randrange(len(ids[meter])))
+                self.client.delete(f"/api/readings/{target}/")
+            self.assertEqual(self._charges(), self._expected())
+
+    def test_bulk_back_dated_batch_adjusts_stored_readings(self):
+        resp = self.client.post(
+            "/api/readings/bulk/",
+            [
+                {"meter": self.meter.id, "value": "120", "reading_date": "2024-02-10"},
+                {"meter": self.meter.id, "value": "160", "reading_date": "2024-02-20"},
+            ],
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._charges(), self._expected())
+        self.assertEqual(self._charges(), {2: Decimal("60.000"), 3: Decimal("40.000")})
+
+
+class RecomputeChargesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="recompute", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.50"), valid_from=date(2024, 1, 1))
+        Tariff.objects.create(resource_type=Meter.COLD_WATER, value_per_unit=Decimal("40.00"), valid_from=date(2024, 1, 1))
+        rng = random.Random(11)
+        for resource_type in (Meter.ELECTRICITY, Meter.ELECTRICITY, Meter.COLD_WATER):
+            meter = Meter.objects.create(property=self.property, resource_type=resource_type, unit="u")
+            for _ in range(12):
+                reading_date = date(2024, rng.randint(1, 6), rng.randint(1, 28)).isoformat()
+                self.client.post(
+                    "/api/readings/",
+                    {"meter": meter.id, "value": str(rng.randint(0, 300)), "reading_date": reading_date},
+                    format="json",
+                )
+
+    def _state(self):
+        return {
+            "charges": sorted(
+                MonthlyCharge.objects.filter(property=self.property)
+                .exclude(consumption=0)
+                .values_list("year", "month", "resource_type", "consumption", "amount")
+            ),
+            "rollups": sorted(
+                OwnerMonthlyRollup.objects.filter(owner=self.user)
+                .exclude(consumption=0)
+                .values_list("year", "month", "resource_type", "consumption", "amount")
+            ),
+        }
+
+    def test_full_recompute_matches_incremental_state(self):
+        incremental = self._state()
+        MonthlyCharge.objects.filter(property=self.property, month=2).update(consumption=999, amount=1)
+        MonthlyCharge.objects.create(
+            property=self.property, year=2023, month=12, resource_type=Meter.GAS, consumption=5, amount=5
+        )
+
+        call_command("recomputecharges", owner=self.user.username, workers=1, stdout=StringIO())
+        self.assertEqual(self._state(), incremental)
+        self.assertFalse(MonthlyCharge.objects.filter(year=2023).exists())
+
+    def test_since_keeps_earlier_months(self):
+        incremental = self._state()
+        MonthlyCharge.objects.filter(property=self.property, month__gte=3).update(consumption=999, amount=1)
+        MonthlyCharge.objects.filter(property=self.property, month=1).update(amount=7)
+        earlier = [row for row in self._state()["charges"] if row[1] < 3]
+
+        call_command("recomputecharges", "--since=2024-03-10", property=self.property.id, workers=1, stdout=StringIO())
+        charges = self._state()["charges"]
+        self.assertEqual([row for row in charges if row[1] < 3], earlier)
+        self.assertEqual(
+            [row for row in charges if row[1] >= 3], [row for row in incremental["charges"] if row[1] >= 3]
+        )
+
+    def test_meter_ids_are_split_into_contiguous_shards(self):
+        self.assertEqual(_shards([1, 2, 5, 7, 9], 2), [(1, 5), (7, 9)])
+        self.assertEqual(_shards([3], 4), [(3, 3)])
+
+
+class ParallelRecomputeTests(APITransactionTestCase):
+    """Worker processes read the committed readings while the command holds the meter locks."""
+
+    setUp = RecomputeChargesTests.setUp
+    _state = RecomputeChargesTests._state
+
+    def test_workers_match_single_process(self):
+        call_command("recomputecharges", owner=self.user.username, workers=1, stdout=StringIO())
+        single = self._state()
+        MonthlyCharge.objects.filter(property=self.property).update(consumption=999, amount=1)
+
+        out = StringIO()
+        call_command("recomputecharges", owner=self.user.username, workers=2, stdout=out)
+        self.assertEqual(self._state(), single)
+        self.assertIn("счётчиков: 3", out.getvalue())
+
+
+@override_settings(CHARGE_PROCESSING="deferred")
+class DeferredChargeTests(IncrementalRecalculationTests):
+    """Readings posted in deferred mode are charged by the worker with the same result."""
+
+    def _drain(self):
+        call_command("runchargeworker", "--once", stdout=StringIO())
+        self.assertFalse(ChargeJob.objects.exists())
+
+    def _charges(self):
+        while process_charge_jobs():
+            pass
+        return super()._charges()
+
+    def test_posted_reading_is_pending_until_worker_runs(self):
+        resp = self.client.post(
+            "/api/readings/", {"meter": self.meter.id, "value": "260", "reading_date": "2024-04-30"}, format="json"
+        )
+        self.assertTrue(resp.data["charge_pending"])
+        self.assertFalse(MonthlyCharge.objects.filter(property=self.property).exists())
+        queue = self.client.get("/api/monthly-charges/pending/").data
+        self.assertEqual(queue["pending"], 3)
+        self.assertGreaterEqual(queue["lag_seconds"], 0)
+
+        self._drain()
+        self.assertEqual(self._charges(), {3: Decimal("100.000"), 4: Decimal("60.000")})
+        self.assertEqual(self.client.get("/api/monthly-charges/pending/").data["pending"], 0)
+        listed = self.client.get("/api/readings/", {"meter": self.meter.id}).data
+        self.assertFalse(any(item["charge_pending"] for item in listed))
+
+    def test_jobs_of_a_meter_are_coalesced(self):
+        self._post(self.meter, "150", "2024-02-29")
+        self.assertEqual(process_charge_jobs(limit=1), 3)
+        self.assertEqual(self._charges(), self._expected())
+
+    def test_random_changes_match_full_recompute(self):
+        rng = random.Random(11)
+        ids = {self.meter: [self.january, self.march], self.second: []}
+        for step in range(40):
+            meter = rng.choice([self.meter, self.second])
+            action = rng.choice(["create", "create", "update", "delete"])
+            reading_date = date(2024, rng.randint(1, 6), rng.randint(1, 28)).isoformat()
+            value = str(rng.randint(0, 500))
+            if action == "create" or not ids[meter]:
+                ids[meter].append(self._post(meter, value, reading_date))
+            elif action == "update":
+                target = rng.choice(ids[meter])
+                self.client.patch(
+                    f"/api/readings/{target}/", {"value": value, "reading_date": reading_date}, format="json"
+                )
+            else:
+                target = ids[meter].pop(rng.randrange(len(ids[meter])))
+                self.client.delete(f"/api/readings/{target}/")
+            if step % 7 == 0:
+                process_charge_jobs(limit=1)
+        self._drain()
+        self.assertEqual(super()._charges(), self._expected())
+
+
 class AnalyticsViewTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="analyst", password="pass12345")
@@ -144,6 +706,70 @@ class AnalyticsViewTests(APITestCase):
         self.assertAlmostEqual(summary["total_amount"], 1430.0)
         self.assertIn(summary["peak_month"], {"2024-01", "2024-02"})
 
+    def test_analytics_sections_derived_from_grouped_totals(self):
+        warehouse = Property.objects.create(owner=self.user, name="Склад", address="Трасса")
+        MonthlyCharge.objects.create(
+            property=warehouse,
+            year=2024,
+            month=1,
+            resource_type=Meter.ELECTRICITY,
+            consumption=Decimal("30.0"),
+            amount=Decimal("195.50"),
+        )
+        MonthlyCharge.objects.create(
+            property=warehouse,
+            year=2024,
+            month=2,
+            resource_type=Meter.ELECTRICITY,
+            consumption=Decimal("10.0"),
+            amount=Decimal("65.00"),
+        )
+        # charges were written directly, bypassing the incremental rollup maintenance
+        rebuild_rollups([self.user.id])
+
+        resp = self.client.get("/api/analytics/", {"start_year": 2024, "end_year": 2024})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        january, february = resp.data["monthly"]
+        self.assertEqual(january["month"], "2024-01")
+        self.assertAlmostEqual(january["total_amount"], 975.5)
+        self.assertEqual(
+            january["items"],
+            [
+                {
+                    "property": None,
+                    "resource_type": Meter.ELECTRICITY,
+                    "consumption": 150.5,
+                    "amount": 975.5,
+                    "properties_count": 2,
+                }
+            ],
+        )
+        self.assertAlmostEqual(february["cumulative_amount"], 1690.5)
+        self.assertEqual(
+            [(row["month"], row["resource_type"], row["amount"]) for row in resp.data["monthly_by_resource"]],
+            [
+                ("2024-01", Meter.ELECTRICITY, 975.5),
+                ("2024-02", Meter.COLD_WATER, 650.0),
+                ("2024-02", Meter.ELECTRICITY, 65.0),
+            ],
+        )
+        resources = {row["resource_type"]: row["total_consumption"] for row in resp.data["summary"]["resources"]}
+        self.assertEqual(resources, {Meter.ELECTRICITY: 160.5, Meter.COLD_WATER: 15.0})
+        self.assertEqual(
+            [(row["property__name"], row["total_amount"]) for row in resp.data["comparison"]],
+            [("Офис", Decimal("1430.00")), ("Склад", Decimal("260.50"))],
+        )
+        self.assertEqual(resp.data["summary"]["peak_month"], "2024-01")
+
+        filtered = self.client.get(
+            "/api/analytics/",
+            {"properties": f"{self.property.id},{warehouse.id}", "start_year": 2024, "end_year": 2024},
+        )
+        self.assertEqual(len(filtered.data["monthly"][0]["items"]), 2)
+        self.assertEqual(filtered.data["summary"], resp.data["summary"])
+        self.assertEqual(filtered.data["comparison"], resp.data["comparison"])
+
     def test_forecast_endpoint_requires_owned_property(self):
         other_user = User.objects.create_user(username="outsider", password="pass12345")
         foreign_property = Property.objects.create(owner=other_user, name="Чужой", address="Секрет")
@@ -159,6 +785,846 @@ class AnalyticsViewTests(APITestCase):
         self.assertIn("forecast_amount", resp_owned.data)
 
 
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pager", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        for day in (1, 2, 2, 3, 5, 5, 5):
+            Reading.objects.create(meter=self.meter, value=Decimal(day), reading_date=date(2024, 1, day))
+        for month in range(1, 6):
+            for resource in (Meter.ELECTRICITY, Meter.GAS):
+                MonthlyCharge.objects.create(
+                    property=self.property, year=2024, month=month, resource_type=resource, amount=Decimal(month)
+                )
+
+    def _walk(self, url, params):
+        ids = []
+        resp = self.client.get(url, params)
+        while True:
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            ids.extend(item["id"] for item in resp.data["results"])
+            if not resp.data["next"]:
+                return ids, resp
+            resp = self.client.get(resp.data["next"])
+
+    def test_unpaginated_list_is_kept_without_params(self):
+        resp = self.client.get("/api/readings/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(resp.data, list)
+        self.assertEqual(len(resp.data), 7)
+
+    def test_reading_pages_cover_list_in_order(self):
+        expected = [item["id"] for item in self.client.get("/api/readings/").data]
+        ids, last_page = self._walk("/api/readings/", {"page_size": 2})
+        self.assertEqual(ids, expected)
+
+        previous = self.client.get(last_page.data["previous"])
+        self.assertEqual([item["id"] for item in previous.data["results"]], expected[4:6])
+
+    def test_charge_pages_follow_year_month_order(self):
+        ids, _ = self._walk("/api/monthly-charges/", {"page_size": 3})
+        expected = list(MonthlyCharge.objects.order_by("year", "month", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_capped_and_cursor_validated(self):
+        resp = self.client.get("/api/readings/", {"page_size": 100000})
+        self.assertEqual(len(resp.data["results"]), 7)
+        self.assertIsNone(resp.data["next"])
+
+        resp = self.client.get("/api/readings/", {"cursor": "garbage"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="accountant", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        other = Meter.objects.create(property=self.property, resource_type=Meter.GAS, unit="m3")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.00"), valid_from=date(2024, 1, 1))
+        for month in range(1, 6):
+            for meter in (self.meter, other):
+                self.client.post(
+                    "/api/readings/",
+                    {"meter": meter.id, "value": str(month * 10), "reading_date": f"2024-0{month}-28"},
+                    format="json",
+                )
+        Payment.objects.create(property=self.property, year=2024, month=2, amount=Decimal("20.00"), paid_at=date(2024, 3, 1))
+        stranger = User.objects.create_user(username="stranger", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Адрес")
+        Payment.objects.create(property=foreign, year=2024, month=2, amount=Decimal("5.00"), paid_at=date(2024, 3, 1))
+
+    def _content(self, resp):
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return b"".join(resp.streaming_content).decode("utf-8")
+
+    def test_readings_csv_respects_meter_filter(self):
+        resp = self.client.get("/api/readings/export/", {"meter": self.meter.id})
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="readings.csv"', resp["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(self._content(resp))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row["meter"] for row in rows}, {str(self.meter.id)})
+        self.assertEqual(rows[0]["reading_date"], "2024-05-28")
+        self.assertEqual(rows[0]["consumption_delta"], "10.000")
+        self.assertEqual(rows[-1]["consumption_delta"], "")
+
+    def test_fractional_readings_are_exported_with_three_decimals(self):
+        meter = Meter.objects.create(property=self.property, resource_type=Meter.COLD_WATER, unit="m3")
+        for value, day in (("3937.358", "2024-06-01"), ("4089.764", "2024-06-28")):
+            self.client.post("/api/readings/", {"meter": meter.id, "value": value, "reading_date": day}, format="json")
+
+        resp = self.client.get("/api/readings/export/", {"meter": meter.id})
+        rows = list(csv.DictReader(StringIO(self._content(resp))))
+        self.assertEqual(
+            [(row["value"], row["previous_value"], row["consumption_delta"]) for row in rows],
+            [("4089.764", "3937.358", "152.406"), ("3937.358", "", "")],
+        )
+        lines = self._content(self.client.get("/api/readings/export/", {"meter": meter.id, "format": "ndjson"}))
+        self.assertEqual(
+            {key: json.loads(lines.splitlines()[0])[key] for key in ("previous_value", "consumption_delta")},
+            {"previous_value": "3937.358", "consumption_delta": "152.406"},
+        )
+
+    def test_charges_ndjson_respects_period_filter(self):
+        resp = self.client.get("/api/monthly-charges/export/", {"format": "ndjson", "month": 3})
+        lines = [json.loads(line) for line in self._content(resp).splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(
+            {key: lines[0][key] for key in ("month", "resource_type", "consumption", "amount")},
+            {"month": 3, "resource_type": Meter.ELECTRICITY, "consumption": "10.000", "amount": "20.00"},
+        )
+
+    def test_payments_export_is_scoped_to_owner(self):
+        rows = list(csv.DictReader(StringIO(self._content(self.client.get("/api/payments/export/")))))
+        self.assertEqual([(row["property_name"], row["amount"]) for row in rows], [("Дом", "20.00")])
+
+
+class ReadingImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="importer", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(
+            property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh", serial_number="E-1"
+        )
+        self.gas = Meter.objects.create(property=self.property, resource_type=Meter.GAS, unit="m3", serial_number="G-1")
+        Meter.objects.create(property=self.property, resource_type=Meter.GAS, unit="m3", serial_number="DUP")
+        Meter.objects.create(property=self.property, resource_type=Meter.GAS, unit="m3", serial_number="DUP")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.00"), valid_from=date(2024, 1, 1))
+        stranger = User.objects.create_user(username="stranger", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Адрес")
+        self.foreign_meter = Meter.objects.create(property=foreign, resource_type=Meter.GAS, unit="m3")
+
+    def _upload(self, text, **data):
+        upload = SimpleUploadedFile("readings.csv", text.encode("utf-8"), content_type="text/csv")
+        return self.client.post("/api/readings/import/", {"file": upload, **data}, format="multipart")
+
+    def test_import_stores_valid_rows_and_reports_rejected(self):
+        text = (
+            "meter,serial_number,value,reading_date\n"
+            ",E-1,30,2024-03-28\n"
+            f"{self.meter.id},,10,2024-01-28\n"
+            f"{self.foreign_meter.id},,5,2024-01-28\n"
+            ",DUP,5,2024-01-28\n"
+            ",E-1,abc,2024-02-28\n"
+            ",E-1,15,28.02.2024\n"
+            ",E-1,\"20,5\",2024-02-28\n"
+            f"{self.gas.id},,7,2024-01-28\n"
+        )
+        resp = self._upload(text, chunk_size=2)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data["rows"], resp.data["created"], resp.data["rejected_count"]), (8, 4, 4))
+        self.assertEqual([item["line"] for item in resp.data["rejected"]], [4, 5, 6, 7])
+        self.assertEqual(resp.data["rejected"][0]["error"], "Счетчик не найден")
+        self.assertEqual(resp.data["rejected"][1]["error"], "Серийный номер принадлежит нескольким счетчикам")
+
+        values = list(self.meter.readings.order_by("reading_date").values_list("value", flat=True))
+        self.assertEqual(values, [Decimal("10"), Decimal("20.5"), Decimal("30")])
+        self.assertFalse(Reading.objects.filter(meter=self.foreign_meter).exists())
+        charges = {
+            charge.month: charge.amount
+            for charge in MonthlyCharge.objects.filter(property=self.property, resource_type=Meter.ELECTRICITY)
+        }
+        self.assertEqual(charges, {2: Decimal("21.00"), 3: Decimal("19.00")})
+
+    def test_import_rejects_values_out_of_range(self):
+        text = "serial_number,value,reading_date\n" + "".join(
+            f"E-1,{value},2024-0{idx}-28\n"
+            for idx, value in enumerate(["1e15", "1E+10", "1234567890", "0.0001", "1.5e2", "123456789.125"], start=1)
+        )
+        resp = self._upload(text)
+        self.assertEqual((resp.data["created"], resp.data["rejected_count"]), (2, 4))
+        self.assertEqual(
+            {item["error"] for item in resp.data["rejected"]}, {"Значение показания вне допустимого диапазона"}
+        )
+        self.assertEqual(
+            list(self.meter.readings.order_by("reading_date").values_list("value", flat=True)),
+            [Decimal("150"), Decimal("123456789.125")],
+        )
+        self.assertEqual(self.client.get("/api/readings/", {"meter": self.meter.id}).status_code, 200)
+
+    def test_import_requires_known_columns(self):
+        resp = self._upload("id,amount\n1,2\n")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post("/api/readings/import/", {}, format="multipart").status_code, 400)
+
+    def test_command_imports_file_and_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "readings.csv")
+            report_path = os.path.join(directory, "report.json")
+            with open(source, "w", encoding="utf-8") as handle:
+                handle.write("serial_number,value,reading_date\nE-1,10,2024-01-28\nE-1,25,2024-02-28\nX,1,2024-02-28\n")
+            out = StringIO()
+            call_command(
+                "importreadings", source, "--owner=importer", "--chunk-size=1", f"--report={report_path}", stdout=out
+            )
+            with open(report_path, encoding="utf-8") as handle:
+                report = json.load(handle)
+        self.assertIn("добавлено показаний: 2", out.getvalue())
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            report["rejected"],
+            [
+                {
+                    "line": 4,
+                    "row": {"serial_number": "X", "value": "1", "reading_date": "2024-02-28"},
+                    "error": "Счетчик не найден",
+                }
+            ],
+        )
+        charge = MonthlyCharge.objects.get(property=self.property, year=2024, month=2)
+        self.assertEqual(charge.amount, Decimal("30.00"))
+        with self.assertRaises(CommandError):
+            call_command("importreadings", source, "--owner=nobody")
+
+
+class AnalyticsCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cached", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("5.00"), valid_from=date(2024, 1, 1))
+        Reading.objects.create(meter=self.meter, value=Decimal("10.000"), reading_date=date(2024, 3, 1))
+        self.params = {"start_year": 2024, "start_month": 1, "end_year": 2024, "end_month": 12}
+
+    def test_repeat_request_is_served_without_queries(self):
+        stats_before = cache_stats()
+        first = self.client.get("/api/analytics/", self.params)
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/analytics/", dict(reversed(list(self.params.items()))))
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+
+        stats = cache_stats()
+        self.assertEqual(stats["hits"] - stats_before["hits"], 1)
+        self.assertEqual(stats["misses"] - stats_before["misses"], 1)
+
+    def test_reading_payment_and_tariff_changes_invalidate(self):
+        self.client.get("/api/analytics/", self.params)
+
+        self.client.post(
+            "/api/readings/",
+            {"meter": self.meter.id, "value": "30.000", "reading_date": "2024-03-31"},
+            format="json",
+        )
+        resp = self.client.get("/api/analytics/", self.params)
+        self.assertEqual(resp["X-Cache"], "MISS")
+        self.assertAlmostEqual(resp.data["summary"]["total_amount"], 100.0)
+
+        Payment.objects.create(property=self.property, year=2024, month=3, amount=Decimal("100"), paid_at=date(2024, 4, 1))
+        resp = self.client.get("/api/analytics/", self.params)
+        self.assertEqual(resp["X-Cache"], "MISS")
+        self.assertEqual(len(resp.data["payments"]), 1)
+
+        self.assertEqual(self.client.get("/api/analytics/", self.params)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            Tariff.objects.create(resource_type=Meter.GAS, value_per_unit=Decimal("7.00"), valid_from=date(2024, 1, 1))
+        self.assertEqual(self.client.get("/api/analytics/", self.params)["X-Cache"], "MISS")
+
+    def test_cache_is_scoped_per_owner(self):
+        self.client.get("/api/analytics/forecast/", {"property": self.property.id})
+        other = User.objects.create_user(username="neighbour", password="pass12345")
+        self.client.force_authenticate(other)
+        resp = self.client.get("/api/analytics/forecast/", {"property": self.property.id})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="poller", password="pass12345")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("5.00"), valid_from=date(2024, 1, 1))
+        self._post("10.000", "2024-03-01")
+
+    def _post(self, value, reading_date):
+        resp = self.client.post(
+            "/api/readings/", {"meter": self.meter.id, "value": value, "reading_date": reading_date}, format="json"
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+    def test_unchanged_poll_is_answered_with_304_and_one_query(self):
+        for path in ("/api/readings/", "/api/monthly-charges/", "/api/tariffs/", "/api/analytics/"):
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            # only the user lookup of the JWT authentication
+            with self.assertNumQueries(1):
+                second = self.client.get(path, HTTP_IF_NONE_MATCH=f'W/{first["ETag"]}')
+            self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED, path)
+            self.assertEqual(second.content, b"")
+            self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_changes_and_parameters_produce_new_tags(self):
+        readings = self.client.get("/api/readings/")["ETag"]
+        charges = self.client.get("/api/monthly-charges/")["ETag"]
+        tariffs = self.client.get("/api/tariffs/")["ETag"]
+        self.assertNotEqual(self.client.get("/api/readings/", {"meter": self.meter.id})["ETag"], readings)
+
+        self._post("30.000", "2024-03-31")
+        resp = self.client.get("/api/readings/", HTTP_IF_NONE_MATCH=readings)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 2)
+        self.assertEqual(self.client.get("/api/monthly-charges/", HTTP_IF_NONE_MATCH=charges).status_code, 200)
+        self.assertEqual(self.client.get("/api/tariffs/", HTTP_IF_NONE_MATCH=tariffs).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tariff.objects.create(resource_type=Meter.GAS, value_per_unit=Decimal("7.00"), valid_from=date(2024, 1, 1))
+        self.assertEqual(self.client.get("/api/tariffs/", HTTP_IF_NONE_MATCH=tariffs).status_code, 200)
+
+    @override_settings(CHARGE_PROCESSING="deferred")
+    def test_deferred_reading_changes_the_readings_tag(self):
+        readings = self.client.get("/api/readings/")["ETag"]
+        self._post("20.000", "2024-03-15")
+        self.assertEqual(self.client.get("/api/readings/", HTTP_IF_NONE_MATCH=readings).status_code, 200)
+
+    def test_tags_are_scoped_per_owner(self):
+        readings = self.client.get("/api/readings/")["ETag"]
+        other = User.objects.create_user(username="neighbour", password="pass12345")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(other).access_token}")
+        resp = self.client.get("/api/readings/", HTTP_IF_NONE_MATCH=readings)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, [])
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="lister", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.50"), valid_from=date(2024, 1, 1))
+        Tariff.objects.create(
+            resource_type=Meter.GAS,
+            value_per_unit=Decimal("7"),
+            valid_from=date(2023, 1, 1),
+            valid_to=date(2023, 12, 31),
+        )
+        for month in range(1, 6):
+            process_reading(
+                Reading.objects.create(
+                    meter=meter, value=Decimal(month * 10) + Decimal("0.125"), reading_date=date(2024, month, 28)
+                )
+            )
+        Payment.objects.create(
+            property=self.property,
+            year=2024,
+            month=2,
+            amount=Decimal("20"),
+            paid_at=date(2024, 3, 1),
+            comment="Оплата\u2028март",
+        )
+        Payment.objects.create(property=self.property, year=2024, month=3, amount=Decimal("5.5"), paid_at=date(2024, 4, 1))
+
+    def _expected(self, serializer_class, queryset):
+        return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+    def _assert_same_bytes(self):
+        charges = MonthlyCharge.objects.filter(property__owner=self.user).order_by("year", "month")
+        self.assertEqual(
+            self.client.get("/api/monthly-charges/").content, self._expected(MonthlyChargeSerializer, charges)
+        )
+        self.assertEqual(
+            self.client.get("/api/tariffs/").content, self._expected(TariffSerializer, Tariff.objects.all())
+        )
+        payments = Payment.objects.filter(property__owner=self.user)
+        self.assertEqual(self.client.get("/api/payments/").content, self._expected(PaymentSerializer, payments))
+
+        page = self.client.get("/api/monthly-charges/", {"page_size": 2})
+        self.assertEqual(
+            json.loads(page.content)["results"], json.loads(self._expected(MonthlyChargeSerializer, charges[:2]))
+        )
+        rest = self.client.get(page.data["next"])
+        self.assertEqual([row["month"] for row in rest.data["results"]], [4, 5])
+
+    def test_responses_match_model_serializer_output(self):
+        self.assertTrue(MonthlyCharge.objects.filter(property=self.property).exists())
+        self._assert_same_bytes()
+
+    def test_stdlib_fallback_matches_too(self):
+        with mock.patch("core.rendering.orjson", None):
+            self._assert_same_bytes()
+
+    def test_datetimes_use_local_timezone(self):
+        row = json.loads(self.client.get("/api/payments/").content)[0]
+        self.assertTrue(row["created_at"].endswith("+03:00"))
+        with timezone.override("UTC"):
+            row = json.loads(self.client.get("/api/payments/").content)[0]
+        self.assertTrue(row["created_at"].endswith("Z"))
+
+
+class TimeseriesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="charts", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        # 10 per day, a meter replacement, then 5 per day
+        for value, day in (("0", 1), ("100", 11), ("5", 13), ("45", 21)):
+            Reading.objects.create(meter=self.meter, value=Decimal(value), reading_date=date(2024, 1, day))
+
+    def _series(self, **params):
+        resp = self.client.get("/api/analytics/timeseries/", params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data["series"]
+
+    def test_cumulative_readings_are_interpolated_per_day(self):
+        (series,) = self._series(meter=self.meter.id)
+        self.assertEqual((series["resource_type"], series["unit"], series["days"]), (Meter.ELECTRICITY, "kWh", 20))
+        self.assertEqual(series["total_consumption"], 140.0)
+        values = [point["consumption"] for point in series["points"]]
+        self.assertEqual(values, [10.0] * 10 + [0.0] * 2 + [5.0] * 8)
+        self.assertEqual(series["points"][0]["date"], "2024-01-02")
+
+        (clipped,) = self._series(meter=self.meter.id, start="2024-01-10", end="2024-01-12")
+        self.assertEqual([point["consumption"] for point in clipped["points"]], [10.0, 10.0, 0.0])
+
+    def test_long_history_is_downsampled(self):
+        meter = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        rng = random.Random(3)
+        value = Decimal("0")
+        readings = []
+        for year in range(2019, 2024):
+            for month in range(1, 13):
+                value += Decimal(rng.randint(50, 300))
+                readings.append(Reading(meter=meter, value=value, reading_date=date(year, month, 28)))
+        Reading.objects.bulk_create(readings)
+
+        for method in ("lttb", "minmax"):
+            (series,) = self._series(meter=meter.id, points=200, method=method)
+            self.assertGreater(series["days"], 1700)
+            self.assertLessEqual(len(series["points"]), 200)
+            self.assertGreater(len(series["points"]), 150)
+            dates = [point["date"] for point in series["points"]]
+            self.assertEqual(dates, sorted(set(dates)))
+            self.assertAlmostEqual(series["total_consumption"], float(value - readings[0].value), places=2)
+        self.assertEqual(series["points"][0]["date"], "2019-01-29")
+
+    def test_downsampling_keeps_spikes(self):
+        values = [1.0] * 1000
+        values[437] = 50.0
+        self.assertIn(437, lttb(values, 50))
+        self.assertIn(437, minmax(values, 50))
+        self.assertEqual(lttb(values[:10], 50), list(range(10)))
+
+    def test_property_series_are_summed_per_resource(self):
+        second = Meter.objects.create(property=self.property, resource_type=Meter.ELECTRICITY, unit="kWh")
+        Reading.objects.create(meter=second, value=Decimal("0"), reading_date=date(2024, 1, 16))
+        Reading.objects.create(meter=second, value=Decimal("10"), reading_date=date(2024, 1, 26))
+        gas = Meter.objects.create(property=self.property, resource_type=Meter.GAS, unit="m3")
+        Reading.objects.create(meter=gas, value=Decimal("1"), reading_date=date(2024, 1, 1))
+
+        electricity, gas_series = self._series(property=self.property.id)
+        self.assertEqual(electricity["meters"], [self.meter.id, second.id])
+        self.assertEqual(electricity["days"], 25)
+        self.assertEqual(electricity["total_consumption"], 150.0)
+        self.assertEqual(electricity["points"][15]["consumption"], 6.0)
+        self.assertEqual((gas_series["resource_type"], gas_series["days"], gas_series["points"]), (Meter.GAS, 0, []))
+
+    def test_parameters_are_validated(self):
+        stranger = User.objects.create_user(username="stranger", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Адрес")
+        foreign_meter = Meter.objects.create(property=foreign, resource_type=Meter.GAS, unit="m3")
+        url = "/api/analytics/timeseries/"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"meter": foreign_meter.id}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(url, {"meter": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"meter": self.meter.id, "points": 2}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"meter": self.meter.id, "method": "avg"}).status_code, 400)
+
+
+class OwnerRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="rollup", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.flat = Property.objects.create(owner=self.user, name="Квартира", address="Адрес 1")
+        self.house = Property.objects.create(owner=self.user, name="Дом", address="Адрес 2")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2.00"), valid_from=date(2024, 1, 1))
+        for prop in (self.flat, self.house):
+            meter = Meter.objects.create(property=prop, resource_type=Meter.ELECTRICITY, unit="kWh")
+            Reading.objects.create(meter=meter, value=Decimal("0"), reading_date=date(2024, 1, 1))
+            for day, value in ((10, "10"), (20, "25")):
+                self.client.post(
+                    "/api/readings/",
+                    {"meter": meter.id, "value": value, "reading_date": f"2024-01-{day}"},
+                    format="json",
+                )
+
+    def _snapshot(self):
+        return {
+            "monthly": list(
+                OwnerMonthlyRollup.objects.filter(owner=self.user).values_list(
+                    "year", "month", "resource_type", "consumption", "amount", "properties_count"
+                )
+            ),
+            "payments": list(
+                OwnerPaymentRollup.objects.filter(owner=self.user).values_list("year", "month", "amount")
+            ),
+        }
+
+    def test_readings_maintain_monthly_rollup(self):
+        self.assertEqual(
+            self._snapshot()["monthly"],
+            [(2024, 1, Meter.ELECTRICITY, Decimal("50.000"), Decimal("100.00"), 2)],
+        )
+
+    def test_payment_writes_maintain_payment_rollup(self):
+        payment = Payment.objects.create(
+            property=self.flat, year=2024, month=1, amount=Decimal("40.00"), paid_at=date(2024, 2, 1)
+        )
+        Payment.objects.create(property=self.house, year=2024, month=1, amount=Decimal("60.00"), paid_at=date(2024, 2, 1))
+        self.assertEqual(self._snapshot()["payments"], [(2024, 1, Decimal("100.00"))])
+
+        payment.month = 2
+        payment.save()
+        self.assertEqual(self._snapshot()["payments"], [(2024, 1, Decimal("60.00")), (2024, 2, Decimal("40.00"))])
+
+        payment.delete()
+        self.assertEqual(self._snapshot()["payments"], [(2024, 1, Decimal("60.00"))])
+
+    def test_rebuild_command_matches_incremental_state(self):
+        Payment.objects.create(property=self.flat, year=2024, month=1, amount=Decimal("40.00"), paid_at=date(2024, 2, 1))
+        incremental = self._snapshot()
+        OwnerMonthlyRollup.objects.all().delete()
+        OwnerPaymentRollup.objects.all().delete()
+
+        call_command("rebuildrollups", owner=self.user.username, stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_bulk_ingest_counts_every_new_property(self):
+        items = []
+        for idx in range(5):
+            prop = Property.objects.create(owner=self.user, name=f"Объект {idx}", address="Адрес")
+            meter = Meter.objects.create(property=prop, resource_type=Meter.ELECTRICITY, unit="kWh")
+            Reading.objects.create(meter=meter, value=Decimal("0"), reading_date=date(2024, 2, 1))
+            items.append({"meter": meter.id, "value": "10", "reading_date": "2024-02-20"})
+            items.append({"meter": meter.id, "value": "30", "reading_date": "2024-03-20"})
+        resp = self.client.post("/api/readings/bulk/", items, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        incremental = self._snapshot()
+
+        rebuild_rollups([self.user.id])
+        self.assertEqual(incremental, self._snapshot())
+        self.assertIn((2024, 2, Meter.ELECTRICITY, Decimal("50.000"), Decimal("100.00"), 5), incremental["monthly"])
+
+    def test_property_delete_rebuilds_rollups(self):
+        self.house.delete()
+        self.assertEqual(
+            self._snapshot()["monthly"],
+            [(2024, 1, Meter.ELECTRICITY, Decimal("25.000"), Decimal("50.00"), 1)],
+        )
+
+
+class RollupMigrationTests(TransactionTestCase):
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([("core", "0002_composite_indexes")])
+        self.executor.loader.build_graph()
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migration_fills_rollups_of_existing_owners(self):
+        old = self.executor.loader.project_state([("core", "0002_composite_indexes")]).apps
+        owner = old.get_model("auth", "User").objects.create(username="legacy")
+        Property = old.get_model("core", "Property")
+        MonthlyCharge = old.get_model("core", "MonthlyCharge")
+        for name, amount in (("Квартира", "100.00"), ("Дом", "50.00")):
+            prop = Property.objects.create(owner_id=owner.id, name=name, address="Адрес")
+            MonthlyCharge.objects.create(
+                property=prop, year=2024, month=1, resource_type=Meter.GAS, consumption=Decimal("10"), amount=amount
+            )
+        old.get_model("core", "Payment").objects.create(
+            property=prop, year=2024, month=1, amount=Decimal("40.00"), paid_at=date(2024, 2, 1)
+        )
+
+        self.executor.migrate([("core", "0003_owner_rollups")])
+        self.assertEqual(
+            list(
+                OwnerMonthlyRollup.objects.values_list(
+                    "owner_id", "year", "month", "resource_type", "consumption", "amount", "properties_count"
+                )
+            ),
+            [(owner.id, 2024, 1, Meter.GAS, Decimal("20.000"), Decimal("150.00"), 2)],
+        )
+        self.assertEqual(
+            list(OwnerPaymentRollup.objects.values_list("owner_id", "year", "month", "amount")),
+            [(owner.id, 2024, 1, Decimal("40.00"))],
+        )
+
+
+class BatchedForecastTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="forecaster", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.properties = [
+            Property.objects.create(owner=self.user, name=f"Объект {idx}", address="Адрес") for idx in range(4)
+        ]
+        today = date.today()
+        for idx, prop in enumerate(self.properties[:3]):
+            for back in range(0, 6):
+                year, month = today.year, today.month - back
+                if month <= 0:
+                    year, month = year - 1, month + 12
+                for resource in (Meter.ELECTRICITY, Meter.GAS):
+                    MonthlyCharge.objects.create(
+                        property=prop,
+                        year=year,
+                        month=month,
+                        resource_type=resource,
+                        amount=Decimal(10 * (idx + 1) + back),
+                    )
+
+    def test_forecast_properties_uses_one_query(self):
+        ids = [prop.id for prop in self.properties]
+        with self.assertNumQueries(1):
+            forecasts = forecast_properties(ids)
+        # last three complete months: back = 1, 2, 3, two resources each
+        self.assertEqual(forecasts[ids[0]], Decimal("24"))
+        self.assertEqual(forecasts[ids[2]], Decimal("64"))
+        self.assertEqual(forecasts[ids[3]], Decimal("0"))
+        self.assertEqual(forecasts[ids[1]], forecast_property(self.properties[1]))
+
+    def test_forecast_action_accepts_property_list(self):
+        ids = [prop.id for prop in self.properties[:2]]
+        resp = self.client.get("/api/analytics/forecast/", {"properties": ",".join(map(str, ids))})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            resp.data["properties"],
+            [{"property": ids[0], "forecast_amount": 24.0}, {"property": ids[1], "forecast_amount": 44.0}],
+        )
+        self.assertAlmostEqual(resp.data["forecast_amount"], 34.0)
+
+        stranger = User.objects.create_user(username="stranger4", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Секрет")
+        resp = self.client.get("/api/analytics/forecast/", {"properties": f"{ids[0]},{foreign.id}"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SeasonalForecastTests(APITestCase):
+    today = date(2024, 1, 15)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="seasons", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.house = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.flat = Property.objects.create(owner=self.user, name="Квартира", address="Адрес")
+        charges = []
+        for year in (2021, 2022, 2023):
+            for month in range(1, 13):
+                t = (year - 2021) * 12 + month - 1
+                for prop, scale in ((self.house, 1), (self.flat, 2)):
+                    charges.append(
+                        MonthlyCharge(
+                            property=prop,
+                            year=year,
+                            month=month,
+                            resource_type=Meter.GAS,
+                            amount=Decimal(str(round(self._expected(t) * scale, 2))),
+                        )
+                    )
+        MonthlyCharge.objects.bulk_create(charges)
+
+    @staticmethod
+    def _expected(t):
+        month = t % 12 + 1
+        season = 1.5 if month in (12, 1, 2) else 0.6 if month in (6, 7, 8) else 1.0
+        return (100 + 2 * t) * season
+
+    def test_seasonal_profile_and_trend_are_recovered(self):
+        forecasts = seasonal_forecasts([self.house.id, self.flat.id], horizon=12, today=self.today)
+        months = forecasts[self.house.id]
+        self.assertEqual([(item["year"], item["month"]) for item in months[:2]], [(2024, 1), (2024, 2)])
+        for offset, item in enumerate(months):
+            self.assertAlmostEqual(item["amount"] / self._expected(36 + offset), 1, delta=0.05)
+            self.assertEqual(set(item["resources"]), {Meter.GAS})
+        self.assertGreater(months[0]["amount"], 2 * months[6]["amount"])
+        self.assertAlmostEqual(forecasts[self.flat.id][0]["amount"] / months[0]["amount"], 2, places=2)
+
+    def test_parameters_are_cached_and_refitted_per_property(self):
+        ids = [self.house.id, self.flat.id]
+        with self.assertNumQueries(1):
+            first = seasonal_forecasts(ids, horizon=3, today=self.today)
+        with self.assertNumQueries(0):
+            self.assertEqual(seasonal_forecasts(ids, horizon=3, today=self.today), first)
+
+        MonthlyCharge.objects.filter(property=self.flat, year=2023, month=12).delete()
+        MonthlyCharge.objects.create(
+            property=self.flat, year=2023, month=12, resource_type=Meter.GAS, amount=Decimal("10000")
+        )
+        with CaptureQueriesContext(connection) as captured:
+            refitted = seasonal_forecasts(ids, horizon=3, today=self.today)
+        self.assertEqual(len(captured), 1)
+        self.assertIn(f"IN ({self.flat.id})", captured[0]["sql"])
+        self.assertEqual(refitted[self.house.id], first[self.house.id])
+        self.assertGreater(refitted[self.flat.id][0]["amount"], first[self.flat.id][0]["amount"])
+
+    def test_processed_reading_resets_fitted_parameters(self):
+        seasonal_forecasts([self.house.id], today=self.today)
+        self.assertIsNotNone(cache.get(FORECAST_KEY.format(property_id=self.house.id)))
+        meter = Meter.objects.create(property=self.house, resource_type=Meter.GAS, unit="m3")
+        Tariff.objects.create(resource_type=Meter.GAS, value_per_unit=Decimal("7.00"), valid_from=date(2023, 1, 1))
+        for value, day in (("10", 1), ("20", 20)):
+            self.client.post(
+                "/api/readings/", {"meter": meter.id, "value": value, "reading_date": f"2023-11-{day:02d}"}, format="json"
+            )
+        self.assertIsNone(cache.get(FORECAST_KEY.format(property_id=self.house.id)))
+
+    def test_forecast_endpoint_serves_horizon(self):
+        resp = self.client.get("/api/analytics/forecast/", {"property": self.house.id, "horizon": 4})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["horizon"], 4)
+        self.assertEqual(len(resp.data["months"]), 4)
+        self.assertIn("forecast_amount", resp.data)
+
+        ids = f"{self.house.id},{self.flat.id}"
+        resp = self.client.get("/api/analytics/forecast/", {"properties": ids, "horizon": 2})
+        single = self.client.get("/api/analytics/forecast/", {"property": self.flat.id, "horizon": 2}).data["months"]
+        house = self.client.get("/api/analytics/forecast/", {"property": self.house.id, "horizon": 2}).data["months"]
+        self.assertAlmostEqual(resp.data["months"][0]["amount"], single[0]["amount"] + house[0]["amount"], places=2)
+
+        for horizon in ("0", "25", "x"):
+            resp = self.client.get("/api/analytics/forecast/", {"property": self.house.id, "horizon": horizon})
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_short_history_has_no_seasonality(self):
+        params = fit_series([(idx, 50.0 + (idx % 2)) for idx in range(8)])
+        self.assertEqual(params["factors"], [1.0] * 12)
+        self.assertAlmostEqual(predict(params, 8), 50.5, delta=0.5)
+        self.assertEqual(fit_series([(0, 10.0), (1, 30.0)])["slope"], 0.0)
+
+
+class SeedTestDataTests(TestCase):
+    options = {"users": 2, "properties_per_user": 2, "meters_per_property": 2, "months": 12, "seed": 3}
+
+    def _snapshot(self):
+        return {
+            "readings": sorted(
+                Reading.objects.values_list(
+                    "meter__property__owner__username",
+                    "meter__property__name",
+                    "meter__resource_type",
+                    "reading_date",
+                    "value",
+                )
+            ),
+            "charges": sorted(
+                MonthlyCharge.objects.values_list(
+                    "property__owner__username", "property__name", "year", "month", "resource_type", "amount"
+                )
+            ),
+            "payments": sorted(
+                Payment.objects.values_list("property__owner__username", "property__name", "year", "month", "amount")
+            ),
+            "rollups": sorted(
+                OwnerMonthlyRollup.objects.values_list(
+                    "owner__username", "year", "month", "resource_type", "amount", "properties_count"
+                )
+            ),
+        }
+
+    def test_fast_mode_matches_regular_mode(self):
+        call_command("seedtestdata", fast=True, stdout=StringIO(), **self.options)
+        fast = self._snapshot()
+        self.assertEqual(Property.objects.filter(owner__username="test2").count(), 2)
+        self.assertEqual(Meter.objects.filter(property__owner__username="test2").count(), 4)
+
+        User.objects.filter(username__startswith="test").delete()
+        call_command("seedtestdata", stdout=StringIO(), **self.options)
+        self.assertEqual(self._snapshot(), fast)
+
+    def test_fast_mode_is_idempotent(self):
+        call_command("seedtestdata", fast=True, stdout=StringIO(), **self.options)
+        first = self._snapshot()
+        call_command("seedtestdata", fast=True, stdout=StringIO(), **self.options)
+        self.assertEqual(self._snapshot(), first)
+
+
+class BenchApiTests(TestCase):
+    def _run(self, *args):
+        out = StringIO()
+        call_command(
+            "benchapi", "--sizes=1", "--months=12", "--requests=3", "--warmup=1", *args, stdout=out, stderr=StringIO()
+        )
+        return json.loads(out.getvalue())
+
+    def test_report_lists_endpoint_metrics(self):
+        report = self._run()
+        self.assertEqual(set(report["results"]["1"]), {"readings", "monthly-charges", "payments", "analytics", "forecast"})
+        readings = report["results"]["1"]["readings"]
+        self.assertLessEqual(readings["p50_ms"], readings["p99_ms"])
+        self.assertGreater(readings["queries"], 0)
+        self.assertGreater(readings["peak_memory_kb"], 0)
+        self.assertTrue(User.objects.get(username="bench1").properties.exists())
+
+    def test_regression_against_baseline_fails(self):
+        report = self._run("--endpoints=readings")
+        report["results"]["1"]["readings"].update(p95_ms=0.0001, queries=0)
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as handle:
+            json.dump(report, handle)
+        self.addCleanup(os.remove, handle.name)
+
+        with self.assertRaisesMessage(CommandError, "Регрессии"):
+            self._run("--endpoints=readings", f"--baseline={handle.name}")
+
+
+class RequestTimingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="timing", password="pass12345")
+        self.client.force_authenticate(self.user)
+        Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+
+    def test_server_timing_header_counts_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            resp = self.client.get("/api/properties/")
+        metrics = dict(part.strip().split(";", 1) for part in resp["Server-Timing"].split(","))
+        self.assertEqual(set(metrics), {"db", "app", "render", "total"})
+        self.assertIn(f'desc="{len(captured)} queries"', metrics["db"])
+
+    @override_settings(REQUEST_TIMING_LOG=True)
+    def test_log_line_names_view_and_action(self):
+        with self.assertLogs("core.timing", "INFO") as logs:
+            self.client.get("/api/analytics/forecast/", {"property": Property.objects.get().id})
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry["view"], entry["action"], entry["status"]), ("AnalyticsViewSet", "forecast", 200))
+        self.assertGreater(entry["queries"], 0)
+
+    @override_settings(SLOW_QUERY_MS=1e-9)
+    def test_slow_queries_are_logged_with_call_site(self):
+        with self.assertLogs("core.timing", "WARNING") as logs:
+            self.client.get("/api/analytics/forecast/", {"property": Property.objects.get().id})
+        self.assertTrue(any("core/services.py" in line and "core_monthlycharge" in line for line in logs.output))
+
+
 class PaymentValidationTests(APITestCase):
     def setUp(self):
         self.owner = User.objects.create_user(username="payer", password="pass12345")
@@ -198,3 +1664,231 @@ class PaymentValidationTests(APITestCase):
         )
         self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Payment.objects.filter(property=self.property, amount="750.00").exists())
+
+
+class AnomalyDetectionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="anomalies", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.property = Property.objects.create(owner=self.user, name="Дом", address="Адрес")
+        self.meter = Meter.objects.create(property=self.property, resource_type=Meter.COLD_WATER, unit="m3")
+        self.readings = self._history(self.meter, {(2024, 3): 400, (2024, 5): 0, (2024, 6): -50})
+
+    @staticmethod
+    def _history(meter, overrides):
+        value = Decimal("1000")
+        readings = []
+        for year in range(2021, 2025):
+            for month in range(1, 13 if year < 2024 else 7):
+                value += overrides.get((year, month), 100 + (year + month) % 5 * 2)
+                readings.append(Reading(meter=meter, value=value, reading_date=date(year, month, 25)))
+        return {(item.reading_date.year, item.reading_date.month): item for item in Reading.objects.bulk_create(readings)}
+
+    def test_spike_zero_and_negative_delta_are_found(self):
+        with CaptureQueriesContext(connection) as captured:
+            result = detect_anomalies()
+        self.assertEqual(sum("core_reading" in query["sql"] for query in captured), 1)
+        self.assertEqual(result["anomalies"], {Anomaly.SPIKE: 1, Anomaly.ZERO: 1, Anomaly.NEGATIVE: 1})
+        self.assertEqual(result["readings"], 42)
+
+        found = {item.kind: item for item in Anomaly.objects.all()}
+        spike = found[Anomaly.SPIKE]
+        self.assertEqual((spike.year, spike.month, spike.reading_id), (2024, 3, self.readings[(2024, 3)].id))
+        self.assertEqual(spike.consumption, Decimal("400"))
+        self.assertEqual(spike.baseline, Decimal("102"))
+        self.assertGreater(spike.score, 3.5)
+        self.assertEqual((found[Anomaly.ZERO].year, found[Anomaly.ZERO].month), (2024, 5))
+        negative = found[Anomaly.NEGATIVE]
+        self.assertEqual((negative.month, negative.consumption), (6, Decimal("-50")))
+        self.assertIsNone(negative.baseline)
+
+    def test_rerun_replaces_findings(self):
+        detect_anomalies()
+        detect_anomalies()
+        self.assertEqual(Anomaly.objects.count(), 3)
+        spike_id = Anomaly.objects.get(kind=Anomaly.SPIKE).id
+
+        detect_anomalies(since=(2024, 5))
+        self.assertEqual(Anomaly.objects.count(), 3)
+        self.assertTrue(Anomaly.objects.filter(id=spike_id).exists())
+
+        Anomaly.objects.filter(kind=Anomaly.ZERO).delete()
+        detect_anomalies(since=(2024, 6))
+        self.assertFalse(Anomaly.objects.filter(kind=Anomaly.ZERO).exists())
+
+    def test_endpoint_lists_only_own_findings(self):
+        stranger = User.objects.create_user(username="stranger-anomalies", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Адрес")
+        foreign_meter = Meter.objects.create(property=foreign, resource_type=Meter.GAS, unit="m3")
+        self._history(foreign_meter, {(2024, 2): 1000})
+        detect_anomalies()
+
+        resp = self.client.get("/api/anomalies/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["meter"] for item in resp.data], [self.meter.id] * 3)
+        self.assertEqual([(item["year"], item["month"]) for item in resp.data], [(2024, 6), (2024, 5), (2024, 3)])
+
+        resp = self.client.get("/api/anomalies/", {"kind": Anomaly.SPIKE, "property": self.property.id})
+        self.assertEqual([item["consumption"] for item in resp.data], ["400.000"])
+        resp = self.client.get("/api/anomalies/", {"page_size": 2})
+        self.assertEqual(len(resp.data["results"]), 2)
+        self.assertIsNotNone(resp.data["next"])
+
+    def test_command_limits_scan_to_owner(self):
+        stranger = User.objects.create_user(username="stranger-command", password="pass12345")
+        foreign = Property.objects.create(owner=stranger, name="Чужой", address="Адрес")
+        self._history(Meter.objects.create(property=foreign, resource_type=Meter.GAS, unit="m3"), {})
+
+        out = StringIO()
+        call_command("detectanomalies", "--owner=anomalies", stdout=out)
+        self.assertIn("Счётчиков: 1, показаний: 42", out.getvalue())
+        self.assertEqual(Anomaly.objects.count(), 3)
+
+        with self.assertRaisesMessage(CommandError, "не найден"):
+            call_command("detectanomalies", "--owner=nobody")
+
+
+class AsyncAnalyticsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="async", password="pass12345")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("5.00"), valid_from=date(2024, 1, 1))
+        Tariff.objects.create(resource_type=Meter.GAS, value_per_unit=Decimal("7.00"), valid_from=date(2024, 1, 1))
+        self.properties = []
+        for name, resource_type in (("Дом", Meter.ELECTRICITY), ("Дача", Meter.GAS)):
+            prop = Property.objects.create(owner=self.user, name=name, address="Адрес")
+            meter = Meter.objects.create(property=prop, resource_type=resource_type, unit="kWh")
+            for value, reading_date in (("10.000", "2024-01-31"), ("25.000", "2024-02-29"), ("45.500", "2024-03-31")):
+                self.client.post(
+                    "/api/readings/", {"meter": meter.id, "value": value, "reading_date": reading_date}, format="json"
+                )
+            self.properties.append(prop)
+        Payment.objects.create(property=prop, year=2024, month=3, amount=Decimal("50"), paid_at=date(2024, 4, 1))
+        self.params = {"start_year": 2024, "start_month": 1, "end_year": 2024, "end_month": 12}
+
+    def _async_get(self, params, **headers):
+        return async_to_sync(self.async_client.get)("/api/analytics/async/", params, headers=headers)
+
+    def test_payload_matches_sync_view(self):
+        selections = [{}, {"property": self.properties[0].id}, {"properties": f"{self.properties[1].id}"}]
+        for selection in selections:
+            params = {**self.params, **selection}
+            cache.clear()
+            fresh = self._async_get(params, Authorization=f"Bearer {self.token}")
+            self.assertEqual((fresh.status_code, fresh["X-Cache"]), (200, "MISS"))
+            cache.clear()
+            expected = self.client.get("/api/analytics/", params)
+            self.assertEqual(fresh.content, expected.content)
+        self.assertEqual(len(json.loads(fresh.content)["payments"]), 1)
+
+        foreign = Property.objects.create(owner=User.objects.create_user(username="other-async"), name="Чужой")
+        resp = self._async_get({"property": foreign.id}, Authorization=f"Bearer {self.token}")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cache_entries_and_etags_are_shared_with_sync_view(self):
+        first = self.client.get("/api/analytics/", self.params)
+        resp = self._async_get(self.params, Authorization=f"Bearer {self.token}")
+        self.assertEqual(resp["X-Cache"], "HIT")
+        self.assertEqual((resp["ETag"], resp.content), (first["ETag"], first.content))
+
+        resp = self._async_get(self.params, Authorization=f"Bearer {self.token}", If_None_Match=first["ETag"])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.content, b"")
+
+    def test_requires_valid_token(self):
+        resp = self._async_get(self.params)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("Bearer", resp["WWW-Authenticate"])
+        resp = self._async_get(self.params, Authorization="Bearer broken")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(resp.content)["code"], "token_not_valid")
+
+        resp = async_to_sync(self.async_client.post)("/api/analytics/async/")
+        self.assertEqual(resp.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_server_timing_counts_async_queries(self):
+        resp = self._async_get(self.params, Authorization=f"Bearer {self.token}")
+        metrics = dict(part.strip().split(";", 1) for part in resp["Server-Timing"].split(","))
+        queries = int(metrics["db"].split('desc="')[1].split()[0])
+        # user, properties, then sections, totals per property, payments, units and forecast
+        self.assertEqual(queries, 7)
+
+
+class BenchAsgiTests(TransactionTestCase):
+    def test_report_compares_handlers(self):
+        out = StringIO()
+        call_command(
+            "benchasgi",
+            "--size=1",
+            "--months=12",
+            "--requests=4",
+            "--warmup=1",
+            "--concurrency=2",
+            "--cold",
+            stdout=out,
+            stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report["results"]), ["wsgi", "asgi-sync", "asgi"])
+        for result in report["results"].values():
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["throughput_rps"], 0)
+
+        with self.assertRaisesMessage(CommandError, "Неизвестные режимы"):
+            call_command("benchasgi", "--modes=gunicorn")
+
+
+class DemoProvisioningTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=DEMO_USERNAME, password="pass12345")
+
+    def _charges(self):
+        return list(
+            MonthlyCharge.objects.filter(property__owner=self.user)
+            .order_by("property__name", "year", "month", "resource_type")
+            .values_list("property__name", "year", "month", "resource_type", "consumption", "amount")
+        )
+
+    def _rollups(self):
+        return list(
+            OwnerMonthlyRollup.objects.filter(owner=self.user)
+            .order_by("year", "month", "resource_type")
+            .values_list("year", "month", "resource_type", "consumption", "amount", "properties_count")
+        )
+
+    def test_login_provisions_demo_account(self):
+        login = self.client.post("/api/auth/login/", {"username": DEMO_USERNAME, "password": "pass12345"})
+        self.assertEqual(login.status_code, status.HTTP_200_OK)
+        self.assertEqual(Property.objects.filter(owner=self.user).count(), len(DEMO_SCENARIOS))
+        self.assertEqual(Meter.objects.filter(property__owner=self.user).count(), 9)
+        self.assertEqual(Reading.objects.filter(meter__property__owner=self.user).count(), 72)
+        self.assertTrue(self._charges())
+
+    def test_cloned_charges_and_rollups_match_recalculation(self):
+        ensure_demo_data(self.user)
+        charges, rollups = self._charges(), self._rollups()
+
+        call_command("recomputecharges", owner=DEMO_USERNAME, workers=1, stdout=StringIO())
+        rebuild_rollups([self.user.id])
+        self.assertEqual(self._charges(), charges)
+        self.assertEqual(self._rollups(), rollups)
+
+    def test_repeated_ensure_skips_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ensure_demo_data(self.user)
+        with self.assertNumQueries(0):
+            ensure_demo_data(self.user)
+        self.assertEqual(Property.objects.filter(owner=self.user).count(), len(DEMO_SCENARIOS))
+
+    def test_existing_account_is_not_cloned_again(self):
+        ensure_demo_data(self.user)
+        cache.clear()
+        ensure_demo_data(self.user)
+        self.assertEqual(Property.objects.filter(owner=self.user).count(), len(DEMO_SCENARIOS))
+
+    def test_other_users_get_no_demo_data(self):
+        other = User.objects.create_user(username="alice", password="pass12345")
+        ensure_demo_data(other)
+        self.assertFalse(Property.objects.filter(owner=other).exists())
@@ -0,0 +1,178 @@
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Optional, Sequence
+
+from .models import Meter, Reading
+
+try:
+    import numpy as np
+except ImportError:  # optional, the pure Python path gives the same numbers
+    np = None
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def daily_consumption(readings: Sequence[tuple[date, float]]) -> tuple[Optional[int], Sequence[float]]:
+    """Per-day consumption from cumulative readings of one meter sorted by date.
+
+    Returns the ordinal of the first day and the consumption of every day from
+    there on. The delta between two readings is spread evenly over the days
+    after the earlier one up to the later one, i.e. the cumulative value is
+    interpolated linearly. Negative deltas (meter replacement) count as zero,
+    as in charges; of several readings on one day the last one is used.
+    """
+
+    days: list[int] = []
+    values: list[float] = []
+    for reading_date, value in readings:
+        ordinal = reading_date.toordinal()
+        if days and days[-1] == ordinal:
+            values[-1] = value
+        else:
+            days.append(ordinal)
+            values.append(value)
+    if len(days) < 2:
+        return None, []
+
+    if np is not None:
+        spans = np.diff(np.asarray(days, dtype=np.int64))
+        rates = np.clip(np.diff(np.asarray(values, dtype=np.float64)), 0, None) / spans
+        return days[0] + 1, np.repeat(rates, spans)
+
+    series: list[float] = []
+    for (day, value), (next_day, next_value) in zip(zip(days, values), zip(days[1:], values[1:])):
+        span = next_day - day
+        series.extend([max(next_value - value, 0.0) / span] * span)
+    return days[0] + 1, series
+
+
+def combine(parts: Iterable[tuple[int, Sequence[float]]]) -> tuple[Optional[int], Sequence[float]]:
+    """Sum per-day series starting at different days into one."""
+
+    parts = [(start, values) for start, values in parts if start is not None and len(values)]
+    if not parts:
+        return None, []
+    first = min(start for start, _ in parts)
+    last = max(start + len(values) for start, values in parts)
+    if np is not None:
+        total = np.zeros(last - first)
+        for start, values in parts:
+            total[start - first : start - first + len(values)] += values
+        return first, total
+    total = [0.0] * (last - first)
+    for start, values in parts:
+        offset = start - first
+        for idx, value in enumerate(values):
+            total[offset + idx] += value
+    return first, total
+
+
+def lttb(values: Sequence[float], threshold: int) -> list[int]:
+    """Indices picked by Largest-Triangle-Three-Buckets from an evenly spaced series."""
+
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+    if np is not None:
+        values = np.asarray(values, dtype=np.float64)
+    every = (count - 2) / (threshold - 2)
+    picked = [0]
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        # the next bucket is represented by its average point
+        avg_x = (end + next_end - 1) / 2
+        prev, base = anchor, values[anchor]
+        if np is not None:
+            avg_y = float(values[end:next_end].mean())
+            candidates = np.arange(start, end)
+            areas = np.abs((prev - avg_x) * (values[start:end] - base) - (prev - candidates) * (avg_y - base))
+            anchor = start + int(areas.argmax())
+        else:
+            avg_y = sum(values[end:next_end]) / (next_end - end)
+            anchor = max(
+                range(start, end),
+                key=lambda idx: abs((prev - avg_x) * (values[idx] - base) - (prev - idx) * (avg_y - base)),
+            )
+        picked.append(anchor)
+    picked.append(count - 1)
+    return picked
+
+
+def minmax(values: Sequence[float], threshold: int) -> list[int]:
+    """Indices of the minimum and maximum of ``threshold // 2`` equal buckets, in order."""
+
+    count = len(values)
+    buckets = threshold // 2
+    if threshold >= count or buckets < 1:
+        return list(range(count))
+    if np is not None:
+        values = np.asarray(values, dtype=np.float64)
+    picked = []
+    for bucket in range(buckets):
+        start = bucket * count // buckets
+        end = (bucket + 1) * count // buckets
+        if np is not None:
+            low = start + int(values[start:end].argmin())
+            high = start + int(values[start:end].argmax())
+        else:
+            window = range(start, end)
+            low = min(window, key=values.__getitem__)
+            high = max(window, key=values.__getitem__)
+        picked.extend(sorted({low, high}))
+    return picked
+
+
+def consumption_timeseries(
+    meters: Iterable[Meter],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    points: int = DEFAULT_POINTS,
+    method: str = "lttb",
+) -> list[dict]:
+    """Daily consumption of ``meters`` summed per resource type and downsampled to ``points``.
+
+    Readings of all meters are fetched in one query; totals are computed from
+    the full daily series of the period, only the returned points are thinned out.
+    """
+
+    meters = {meter.id: meter for meter in meters}
+    rows = (
+        Reading.objects.filter(meter_id__in=meters)
+        .order_by("meter_id", "reading_date", "created_at", "id")
+        .values_list("meter_id", "reading_date", "value")
+    )
+    daily = {
+        meter_id: daily_consumption([(reading_date, float(value)) for _, reading_date, value in group])
+        for meter_id, group in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0])
+    }
+
+    pick = lttb if method == "lttb" else minmax
+    result = []
+    ordered = sorted(meters.values(), key=lambda meter: (meter.resource_type, meter.id))
+    for resource_type, group in groupby(ordered, key=lambda meter: meter.resource_type):
+        group = list(group)
+        first, values = combine(daily[meter.id] for meter in group if meter.id in daily)
+        if first is not None:
+            low = 0 if start is None else max(start.toordinal() - first, 0)
+            high = len(values) if end is None else max(min(end.toordinal() - first + 1, len(values)), low)
+            values = values[low:high]
+            first += low
+        result.append(
+            {
+                "resource_type": resource_type,
+                "unit": group[0].unit,
+                "meters": [meter.id for meter in group],
+                "days": len(values),
+                "total_consumption": round(float(np.sum(values) if np is not None else sum(values)), 3),
+                "points": [
+                    {"date": date.fromordinal(first + idx).isoformat(), "consumption": round(float(values[idx]), 3)}
+                    for idx in pick(values, points)
+                ],
+            }
+        )
+    return result
@@ -1,27 +1,60 @@
+import asyncio
+import io
 from datetime import date
+from decimal import Decimal
+from functools import partial
 
 from datetime import date
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.db.models import Q, Sum
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
+from .analytics import AnalyticsQuery, analytics_payload, analytics_sources
+from .caching import async_cached_response, cached_response, conditional_response
+from .demo import ensure_demo_data
+from .exports import EXPORT_RENDERERS, stream_export
+from .forecasting import MAX_HORIZON, merge_months, seasonal_forecasts
+from .imports import ImportFormatError, import_readings
+from .models import (
+    Anomaly,
+    Meter,
+    MonthlyCharge,
+    Payment,
+    Property,
+    Reading,
+    Tariff,
+)
+from .pagination import AnomalyPagination, MonthlyChargePagination, PaymentPagination, ReadingPagination
+from .rendering import FastJSONRenderer, FastListMixin
 from .serializers import (
+    AnomalySerializer,
     LoginSerializer,
     MeterSerializer,
     MonthlyChargeSerializer,
     PaymentSerializer,
     PropertySerializer,
+    ReadingBulkSerializer,
     ReadingSerializer,
     TariffSerializer,
     UserSerializer,
 )
-from .services import ensure_demo_data, forecast_property
+from .services import (
+    charge_queue_stats,
+    delete_reading,
+    forecast_properties,
+    with_charge_details,
+)
+from .timeseries import DEFAULT_POINTS, DOWNSAMPLING_METHODS, MAX_POINTS, consumption_timeseries
 
 
 class RegistrationView(generics.CreateAPIView):
@@ -67,13 +100,32 @@ class MeterViewSet(viewsets.ModelViewSet):
         return qs
 
 
-class TariffViewSet(viewsets.ModelViewSet):
+class TariffViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Tariff.objects.all()
     serializer_class = TariffSerializer
 
+    def list(self, request, *args, **kwargs):
+        # tariffs are shared by all users, only their version stamp matters
+        build = partial(super().list, request, *args, **kwargs)
+        return conditional_response(request, "tariffs", build, owner_scoped=False)
+
+
+READING_QUANT = Decimal("0.001")
+
+
+def _consumption_delta(row):
+    if row["previous_value"] is None:
+        return None
+    # SQLite hands the subquery annotation back unrounded, e.g. 3937.35800000000
+    row["previous_value"] = row["previous_value"].quantize(READING_QUANT)
+    if row["value"] <= row["previous_value"]:
+        return None
+    return (row["value"] - row["previous_value"]).quantize(READING_QUANT)
+
 
 class ReadingViewSet(viewsets.ModelViewSet):
     serializer_class = ReadingSerializer
+    pagination_class = ReadingPagination
 
     def get_queryset(self):
         qs = Reading.objects.filter(meter__property__owner=self.request.user)
@@ -83,11 +135,64 @@ class ReadingViewSet(viewsets.ModelViewSet):
             qs = qs.filter(meter__property_id=property_id)
         if meter_id:
             qs = qs.filter(meter_id=meter_id)
-        return qs
+        return with_charge_details(qs)
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(request, "readings", partial(super().list, request, *args, **kwargs))
+
+    def perform_destroy(self, instance):
+        delete_reading(instance)
+
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        return stream_export(
+            self.get_queryset(),
+            [
+                ("id", "id"),
+                ("property", "meter__property_id"),
+                ("meter", "meter_id"),
+                ("serial_number", "meter__serial_number"),
+                ("resource_type", "meter__resource_type"),
+                ("reading_date", "reading_date"),
+                ("value", "value"),
+                ("previous_value", "previous_value"),
+                ("created_at", "created_at"),
+            ],
+            request.accepted_renderer.format,
+            "readings",
+            extra=("consumption_delta", _consumption_delta),
+        )
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        serializer = ReadingBulkSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        readings = serializer.save()
+        return Response({"created": len(readings)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "Передайте CSV-файл в поле file"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = int(request.data.get("chunk_size") or 0) or None
+        except ValueError:
+            return Response({"detail": "chunk_size должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+        if chunk_size is not None and chunk_size <= 0:
+            return Response({"detail": "chunk_size должен быть положительным"}, status=status.HTTP_400_BAD_REQUEST)
+        # undecodable bytes end up in rejected rows instead of aborting a half-imported file
+        lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            report = import_readings(lines, owner=request.user, chunk_size=chunk_size)
+        except ImportFormatError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
 
 
-class MonthlyChargeViewSet(viewsets.ReadOnlyModelViewSet):
+class MonthlyChargeViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = MonthlyChargeSerializer
+    pagination_class = MonthlyChargePagination
 
     def get_queryset(self):
         qs = MonthlyCharge.objects.filter(property__owner=self.request.user)
@@ -102,173 +207,260 @@ class MonthlyChargeViewSet(viewsets.ReadOnlyModelViewSet):
             qs = qs.filter(month=month)
         return qs.order_by("year", "month")
 
+    def list(self, request, *args, **kwargs):
+        return conditional_response(request, "monthly-charges", partial(super().list, request, *args, **kwargs))
 
-class PaymentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["get"])
+    def pending(self, request):
+        return Response(charge_queue_stats(request.user.id))
+
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        return stream_export(
+            self.get_queryset(),
+            [
+                ("id", "id"),
+                ("property", "property_id"),
+                ("property_name", "property__name"),
+                ("year", "year"),
+                ("month", "month"),
+                ("resource_type", "resource_type"),
+                ("consumption", "consumption"),
+                ("amount", "amount"),
+                ("generated_at", "generated_at"),
+            ],
+            request.accepted_renderer.format,
+            "monthly-charges",
+        )
+
+
+class PaymentViewSet(FastListMixin, viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
+
+    def get_queryset(self):
+        qs = Payment.objects.filter(property__owner=self.request.user)
+        property_id = self.request.query_params.get("property")
+        year = self.request.query_params.get("year")
+        month = self.request.query_params.get("month")
+        if property_id:
+            qs = qs.filter(property_id=property_id)
+        if year:
+            qs = qs.filter(year=year)
+        if month:
+            qs = qs.filter(month=month)
+        return qs
+
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        return stream_export(
+            self.get_queryset(),
+            [
+                ("id", "id"),
+                ("property", "property_id"),
+                ("property_name", "property__name"),
+                ("year", "year"),
+                ("month", "month"),
+                ("amount", "amount"),
+                ("paid_at", "paid_at"),
+                ("comment", "comment"),
+                ("created_at", "created_at"),
+            ],
+            request.accepted_renderer.format,
+            "payments",
+        )
+
+
+class AnomalyViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = AnomalySerializer
+    pagination_class = AnomalyPagination
 
     def get_queryset(self):
-        return Payment.objects.filter(property__owner=self.request.user)
+        qs = Anomaly.objects.filter(meter__property__owner=self.request.user)
+        property_id = self.request.query_params.get("property")
+        meter_id = self.request.query_params.get("meter")
+        kind = self.request.query_params.get("kind")
+        year = self.request.query_params.get("year")
+        if property_id:
+            qs = qs.filter(meter__property_id=property_id)
+        if meter_id:
+            qs = qs.filter(meter_id=meter_id)
+        if kind:
+            qs = qs.filter(kind=kind)
+        if year:
+            qs = qs.filter(year=year)
+        return qs
 
 
 class AnalyticsViewSet(viewsets.ViewSet):
     def list(self, request):
-        property_id = request.query_params.get("property")
-        properties_param = request.query_params.get("properties")
-        resource_type = request.query_params.get("resource_type")
-        start_year = int(request.query_params.get("start_year", date.today().year - 1))
-        start_month = int(request.query_params.get("start_month", 1))
-        end_year = int(request.query_params.get("end_year", date.today().year))
-        end_month = int(request.query_params.get("end_month", 12))
-
-        props_qs = Property.objects.filter(owner=request.user)
-        selected_ids = []
-        if properties_param:
-            selected_ids = [int(p) for p in properties_param.split(",") if p]
-        elif property_id:
-            selected_ids = [int(property_id)]
+        return conditional_response(
+            request, "analytics", lambda: cached_response(request, "analytics", lambda: self._build_analytics(request))
+        )
+
+    @action(detail=False, methods=["get"])
+    def forecast(self, request):
+        return conditional_response(
+            request, "forecast", lambda: cached_response(request, "forecast", lambda: self._build_forecast(request))
+        )
+
+    @action(detail=False, methods=["get"])
+    def timeseries(self, request):
+        build = partial(self._build_timeseries, request)
+        return conditional_response(request, "timeseries", lambda: cached_response(request, "timeseries", build))
 
-        if selected_ids:
-            props_qs = props_qs.filter(id__in=selected_ids)
-        props = list(props_qs)
+    def _build_analytics(self, request):
+        query = AnalyticsQuery.from_params(request.query_params)
+        props = list(query.properties(request.user))
         if not props:
             return Response({"detail": "Нет доступных объектов для аналитики"}, status=status.HTTP_400_BAD_REQUEST)
 
-        charges = (
-            MonthlyCharge.objects.filter(property__in=props)
-            .filter((Q(year__gt=start_year) | Q(year=start_year, month__gte=start_month)))
-            .filter(Q(year__lt=end_year) | Q(year=end_year, month__lte=end_month))
+        sources = analytics_sources(request.user, query, props)
+        by_property = sources["by_property"]
+        return Response(
+            analytics_payload(
+                query,
+                props,
+                sources["sections"],
+                None if by_property is None else list(by_property),
+                list(sources["payments"]),
+                sources["units"],
+                forecast_properties([p.id for p in props]),
+            )
         )
 
-        if resource_type:
-            charges = charges.filter(resource_type=resource_type)
-
-        monthly_map = {}
-        resource_totals = {}
-        monthly_by_resource = {}
-
-        for charge in charges.order_by("year", "month"):
-            key = f"{charge.year}-{charge.month:02d}"
-            monthly_map.setdefault(
-                key,
-                {
-                    "month": key,
-                    "items": [],
-                    "total_amount": 0,
-                    "total_consumption": 0,
-                    "cumulative_amount": 0,
-                },
-            )
-            monthly_map[key]["items"].append(
-                {
-                    "property": charge.property_id,
-                    "resource_type": charge.resource_type,
-                    "consumption": float(charge.consumption),
-                    "amount": float(charge.amount),
-                }
-            )
-            monthly_map[key]["total_amount"] += float(charge.amount)
-            monthly_map[key]["total_consumption"] += float(charge.consumption)
+    def _build_forecast(self, request):
+        property_id = request.query_params.get("property")
+        properties_param = request.query_params.get("properties")
+        try:
+            horizon = int(request.query_params.get("horizon", 1))
+        except ValueError:
+            horizon = 0
+        if not 1 <= horizon <= MAX_HORIZON:
+            return Response({"detail": f"horizon: от 1 до {MAX_HORIZON}"}, status=status.HTTP_400_BAD_REQUEST)
+        if properties_param:
+            try:
+                selected_ids = {int(p) for p in properties_param.split(",") if p}
+            except ValueError:
+                return Response(
+                    {"detail": "properties must be a comma-separated list of ids"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        elif property_id:
+            selected_ids = {property_id}
+        else:
+            return Response({"detail": "property param required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            resource_totals.setdefault(
-                charge.resource_type,
-                {"total_consumption": 0.0, "total_amount": 0.0},
-            )
-            resource_totals[charge.resource_type]["total_consumption"] += float(charge.consumption)
-            resource_totals[charge.resource_type]["total_amount"] += float(charge.amount)
+        owned = list(
+            Property.objects.filter(id__in=selected_ids, owner=request.user).order_by("id").values_list("id", flat=True)
+        )
+        if not owned or len(owned) != len(selected_ids):
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
-            monthly_by_resource.setdefault(key, {})
-            monthly_by_resource[key].setdefault(
-                charge.resource_type, {"consumption": 0.0, "amount": 0.0}
+        forecasts = forecast_properties(owned)
+        seasonal = seasonal_forecasts(owned, horizon)
+        if not properties_param:
+            return Response(
+                {"forecast_amount": float(forecasts[owned[0]]), "horizon": horizon, "months": seasonal[owned[0]]}
             )
-            monthly_by_resource[key][charge.resource_type]["consumption"] += float(
-                charge.consumption
+        return Response(
+            {
+                "forecast_amount": float(sum(forecasts.values()) / len(owned)),
+                "properties": [
+                    {"property": prop_id, "forecast_amount": float(forecasts[prop_id])} for prop_id in owned
+                ],
+                "horizon": horizon,
+                "months": merge_months(seasonal),
+            }
+        )
+
+    def _build_timeseries(self, request):
+        params = request.query_params
+        method = params.get("method", "lttb")
+        if method not in DOWNSAMPLING_METHODS:
+            return Response(
+                {"detail": f"method: одно из {', '.join(DOWNSAMPLING_METHODS)}"}, status=status.HTTP_400_BAD_REQUEST
             )
-            monthly_by_resource[key][charge.resource_type]["amount"] += float(
-                charge.amount
+        try:
+            meter_id = int(params["meter"]) if params.get("meter") else None
+            property_id = int(params["property"]) if params.get("property") else None
+            points = int(params.get("points", DEFAULT_POINTS))
+            start = date.fromisoformat(params["start"]) if params.get("start") else None
+            end = date.fromisoformat(params["end"]) if params.get("end") else None
+        except ValueError:
+            return Response(
+                {"detail": "meter, property и points — целые числа, start и end — даты YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        if not 3 <= points <= MAX_POINTS:
+            return Response({"detail": f"points: от 3 до {MAX_POINTS}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        meters = Meter.objects.filter(property__owner=request.user)
+        if meter_id is not None:
+            meters = meters.filter(id=meter_id)
+        elif property_id is not None:
+            meters = meters.filter(property_id=property_id)
+        else:
+            return Response({"detail": "Нужен параметр meter или property"}, status=status.HTTP_400_BAD_REQUEST)
+        if params.get("resource_type"):
+            meters = meters.filter(resource_type=params["resource_type"])
+        meters = list(meters)
+        if not meters:
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
-        monthly = list(sorted(monthly_map.values(), key=lambda item: item["month"]))
-        running = 0
-        for m in monthly:
-            running += m["total_amount"]
-            m["cumulative_amount"] = running
-
-        by_property = (
-            charges.values("property__id", "property__name")
-            .annotate(total_amount=Sum("amount"), total_consumption=Sum("consumption"))
-            .order_by("property__id")
+        return Response(
+            {
+                "meter": meter_id,
+                "property": property_id if meter_id is None else meters[0].property_id,
+                "start": start,
+                "end": end,
+                "method": method,
+                "points": points,
+                "series": consumption_timeseries(meters, start, end, points, method),
+            }
         )
 
-        totals_amount = sum(item["total_amount"] for item in by_property)
-        totals_consumption = sum(item["total_consumption"] for item in by_property)
-        peak_month_by_amount = max(monthly, key=lambda m: m["total_amount"], default=None)
 
-        days_count = len(monthly) * 30 or 1
-        average_daily_amount = totals_amount / days_count
+async def _fetch(queryset):
+    if queryset is None:
+        return None
+    return [row async for row in queryset.aiterator(chunk_size=2000)]
 
-        forecast_value = float(sum(forecast_property(p) for p in props) / len(props))
 
-        payments = (
-            Payment.objects.filter(property__in=props)
-            .values("year", "month")
-            .annotate(total=Sum("amount"))
-        )
+def _unauthorized(exc, authentication):
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = HttpResponse(
+        FastJSONRenderer().render(data), status=status.HTTP_401_UNAUTHORIZED, content_type="application/json"
+    )
+    response["WWW-Authenticate"] = authentication.authenticate_header(None)
+    return response
 
-        units_map = {
-            item["resource_type"]: item["unit"]
-            for item in Meter.objects.filter(property__in=props)
-            .values("resource_type", "unit")
-            .distinct()
-        }
 
-        return Response(
-            {
-                "period": {
-                    "start_year": start_year,
-                    "start_month": start_month,
-                    "end_year": end_year,
-                    "end_month": end_month,
-                },
-                "monthly": monthly,
-                "monthly_by_resource": [
-                    {
-                        "month": month,
-                        "resource_type": resource,
-                        "consumption": values["consumption"],
-                        "amount": values["amount"],
-                    }
-                    for month, data in sorted(monthly_by_resource.items())
-                    for resource, values in data.items()
-                ],
-                "summary": {
-                    "total_amount": float(totals_amount),
-                    "total_consumption": float(totals_consumption),
-                    "average_daily_amount": float(average_daily_amount),
-                    "peak_month": peak_month_by_amount["month"] if peak_month_by_amount else None,
-                    "resources": [
-                        {
-                            "resource_type": resource,
-                            "total_consumption": values["total_consumption"],
-                            "total_amount": values["total_amount"],
-                            "unit": units_map.get(resource, ""),
-                        }
-                        for resource, values in resource_totals.items()
-                    ],
-                },
-                "comparison": list(by_property),
-                "payments": list(payments),
-                "forecast_amount": forecast_value,
-            }
+@require_GET
+async def async_analytics(request):
+    authentication = JWTAuthentication()
+    try:
+        authenticated = await sync_to_async(authentication.authenticate)(request)
+    except AuthenticationFailed as exc:
+        return _unauthorized(exc, authentication)
+    if authenticated is None:
+        return _unauthorized(NotAuthenticated(), authentication)
+    request.user = authenticated[0]
+
+    async def build():
+        query = AnalyticsQuery.from_params(request.GET)
+        props = [p async for p in query.properties(request.user)]
+        if not props:
+            return status.HTTP_400_BAD_REQUEST, {"detail": "Нет доступных объектов для аналитики"}
+
+        sources = analytics_sources(request.user, query, props)
+        sections, by_property, payments, units, forecasts = await asyncio.gather(
+            _fetch(sources["sections"]),
+            _fetch(sources["by_property"]),
+            _fetch(sources["payments"]),
+            _fetch(sources["units"]),
+            sync_to_async(forecast_properties)([p.id for p in props]),
         )
+        return status.HTTP_200_OK, analytics_payload(query, props, sections, by_property, payments, units, forecasts)
 
-    @action(detail=False, methods=["get"])
-    def forecast(self, request):
-        property_id = request.query_params.get("property")
-        if not property_id:
-            return Response({"detail": "property param required"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            prop = Property.objects.get(id=property_id, owner=request.user)
-        except Property.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
-        forecast_value = float(forecast_property(prop))
-        return Response({"forecast_amount": forecast_value})
+    return await async_cached_response(request, "analytics", build)